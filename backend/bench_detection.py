@@ -0,0 +1,95 @@
+import argparse
+import os
+import time
+
+import face_recognition
+
+from gallery import GalleryMatcher
+from recognition import detect_faces, encode_faces, effective_detection_scale, MIN_FACE_SIZE
+
+# ======================================
+# 🔹 Detection Scale Benchmark
+# ======================================
+# Usage: python bench_detection.py --images known_faces --scales 1.0 0.75 0.5 0.35 0.25
+#
+# Walks a folder of photos laid out like known_faces/<person>/<photo>.jpg and,
+# for each detection scale, reports the mean per-frame detection time and how
+# often the downscaled pipeline recognizes the same person as the
+# full-resolution one (leave-one-out against the other photos).
+
+
+def load_images(root):
+    images = []
+    for person in sorted(os.listdir(root)):
+        folder = os.path.join(root, person)
+        if not os.path.isdir(folder):
+            continue
+        for filename in sorted(os.listdir(folder)):
+            if filename.lower().endswith((".jpg", ".jpeg", ".png")):
+                images.append((person.lower(), face_recognition.load_image_file(os.path.join(folder, filename))))
+    return images
+
+
+def run_scale(images, scale, min_face_size):
+    """
+    Detection time per frame and the first encoding (or None) for every image.
+    """
+    total = 0.0
+    encodings = []
+    for _, rgb in images:
+        start = time.perf_counter()
+        boxes = detect_faces(rgb, scale=scale, min_face_size=min_face_size)
+        total += time.perf_counter() - start
+        encs = encode_faces(rgb, boxes[:1])
+        encodings.append(encs[0] if encs else None)
+    return total / len(images), encodings
+
+
+def leave_one_out_names(images, reference, probes):
+    """
+    Recognized name for each probe against a gallery of every other image's reference encoding.
+    """
+    names = []
+    for i, probe in enumerate(probes):
+        if probe is None:
+            names.append(None)
+            continue
+        others = [(n, e) for j, ((n, _), e) in enumerate(zip(images, reference)) if j != i and e is not None]
+        gallery = GalleryMatcher([e for _, e in others], [n for n, _ in others], [None] * len(others))
+        match = gallery.best_match(probe)
+        names.append(match.name if match else None)
+    return names
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-frame detection time and match agreement by detection scale.")
+    parser.add_argument("--images", default="known_faces")
+    parser.add_argument("--scales", type=float, nargs="+", default=[1.0, 0.75, 0.5, 0.35, 0.25])
+    parser.add_argument("--min-face-size", type=int, default=MIN_FACE_SIZE)
+    args = parser.parse_args()
+
+    images = load_images(args.images)
+    if not images:
+        print(f"⚠️ No images found under {args.images}")
+        return
+
+    full_time, full_encodings = run_scale(images, 1.0, args.min_face_size)
+    full_names = leave_one_out_names(images, full_encodings, full_encodings)
+
+    print(f"📊 {len(images)} frames, min face size {args.min_face_size}px")
+    print(f"{'scale':>6}{'effective':>11}{'ms/frame':>11}{'speedup':>9}{'found':>8}{'agreement':>11}")
+    for scale in args.scales:
+        if scale >= 1.0:
+            per_frame, encodings = full_time, full_encodings
+        else:
+            per_frame, encodings = run_scale(images, scale, args.min_face_size)
+        names = leave_one_out_names(images, full_encodings, encodings)
+        found = sum(e is not None for e in encodings)
+        agree = sum(a == b for a, b in zip(names, full_names))
+        print(f"{scale:>6.2f}{effective_detection_scale(scale, args.min_face_size):>11.2f}"
+              f"{per_frame * 1000:>11.1f}{full_time / per_frame:>9.2f}"
+              f"{found:>8}{agree / len(images):>11.3f}")
+
+
+if __name__ == "__main__":
+    main()
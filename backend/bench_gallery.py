@@ -0,0 +1,88 @@
+import argparse
+import time
+
+import numpy as np
+
+from gallery import GalleryMatcher, INDEX_BRUTE, INDEX_IVF, ENCODING_DIM
+
+# ======================================
+# 🔹 Brute Force vs IVF Gallery Benchmark
+# ======================================
+# Usage: python bench_gallery.py --sizes 10000 100000 --nprobe 4 8 16 32
+#
+# Builds synthetic galleries shaped like dlib encodings (one ~unit-norm vector
+# per person), queries them with noisy copies of enrolled faces and reports
+# recall@1 of the IVF index against the exact brute-force answer, plus the
+# per-query latency of both.
+
+
+def synthetic_gallery(n, rng):
+    """
+    n random identities whose encodings sit about 1.0 apart, like real face embeddings.
+    """
+    return rng.normal(0.0, 1.0 / np.sqrt(ENCODING_DIM), size=(n, ENCODING_DIM)).astype(np.float32)
+
+
+def synthetic_probes(gallery, count, noise, rng):
+    """
+    Noisy re-captures of randomly chosen enrolled people.
+    """
+    picks = rng.integers(0, len(gallery), size=count)
+    jitter = rng.normal(0.0, noise / np.sqrt(ENCODING_DIM), size=(count, ENCODING_DIM))
+    return (gallery[picks] + jitter).astype(np.float32)
+
+
+def time_queries(matcher, probes):
+    """
+    Mean seconds per single-probe query (kiosk frames arrive one at a time) and the results.
+    """
+    results = []
+    start = time.perf_counter()
+    for probe in probes:
+        results.append(matcher.best_match(probe))
+    return (time.perf_counter() - start) / len(probes), results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare IVF gallery lookups against brute force.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 50000, 100000])
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[2, 4, 8, 16, 32])
+    parser.add_argument("--nlist", type=int, default=None, help="IVF clusters (default 4*sqrt(N))")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--noise", type=float, default=0.35, help="Probe distance from its enrolled encoding")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+
+    for n in args.sizes:
+        gallery = synthetic_gallery(n, rng)
+        probes = synthetic_probes(gallery, args.queries, args.noise, rng)
+        names = [f"emp{i}" for i in range(n)]
+
+        brute = GalleryMatcher(gallery, names, names, index=INDEX_BRUTE)
+        brute_latency, truth = time_queries(brute, probes)
+
+        print(f"\n📊 Gallery size: {n}")
+        print(f"{'mode':<18}{'recall@1':>10}{'ms/query':>12}{'speedup':>10}")
+        print(f"{'brute':<18}{1.0:>10.3f}{brute_latency * 1000:>12.3f}{1.0:>10.2f}")
+
+        build_start = time.perf_counter()
+        ivf = GalleryMatcher(gallery, names, names, index=INDEX_IVF, nlist=args.nlist)
+        build_time = time.perf_counter() - build_start
+
+        for nprobe in args.nprobe:
+            ivf.index.nprobe = nprobe
+            latency, found = time_queries(ivf, probes)
+            hits = sum(
+                (a.index if a else None) == (b.index if b else None)
+                for a, b in zip(found, truth)
+            )
+            label = f"ivf nprobe={nprobe}"
+            print(f"{label:<18}{hits / len(truth):>10.3f}{latency * 1000:>12.3f}{brute_latency / latency:>10.2f}")
+
+        print(f"(IVF build: {build_time:.2f}s, nlist={ivf.index.nlist})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+import argparse
+import datetime
+import random
+import time
+
+import pytz
+
+from reports import build_attendance_report
+
+# ======================================
+# 🔹 Attendance Report Benchmark
+# ======================================
+# Usage: python bench_reports.py [--headcounts 200 2000 5000] [--days 30 90]
+#
+# Builds synthetic employees and logs (about 80% attendance on weekdays) and
+# times build_attendance_report for each range and headcount. For small
+# inputs it also runs the previous endpoint's loop (a standalone copy, sharing
+# no code with reports.py) and checks both produce identical rows, every field.
+# "now" falls inside the ranges so past, today and future rows are all compared.
+
+BEIRUT_TZ = pytz.timezone("Asia/Beirut")
+LEGACY_MAX_WORK = 5e7  # Skip the legacy scan beyond days x employees x logs comparisons
+
+
+def synthetic_data(headcount, start_date, days, seed=0):
+    rng = random.Random(seed)
+    employees, logs = [], []
+    for e in range(headcount):
+        weekly = {}
+        if e % 4 == 0:  # Some custom schedules
+            weekly["Friday"] = {"active": True, "start": "08:00", "end": "13:00"}
+            weekly["Saturday"] = {"active": e % 8 == 0, "start": "10:00", "end": "14:00"}
+        employees.append({"_id": f"emp{e:05d}", "name": f"Employee {e}", "department": f"Dept {e % 12}",
+                          "schedule": {"weekly": weekly}})
+        for d in range(days):
+            day = start_date + datetime.timedelta(days=d)
+            if day.weekday() < 5 and rng.random() < 0.8:
+                check_in = BEIRUT_TZ.localize(datetime.datetime.combine(day, datetime.time(8, 30))
+                                              + datetime.timedelta(minutes=rng.randint(0, 60)))
+                name = f"Employee {e}" if rng.random() < 0.9 else f" employee {e} "  # Case/space variants
+                logs.append({"employee_name": name, "date": day.strftime("%Y-%m-%d"),
+                             "check_in": check_in.astimezone(pytz.utc).replace(tzinfo=None)})
+    rng.shuffle(logs)
+    return employees, logs
+
+
+def legacy_report(employees, logs, start_date, end_date, now, tz):
+    """
+    The former /attendance/by_date loop, kept verbatim apart from the Flask/Mongo
+    plumbing: a next(...) scan over every log for every (day, employee).
+    """
+    report = []
+    for i in range((end_date - start_date).days + 1):
+        current_date = start_date + datetime.timedelta(days=i)
+        current_date_str = current_date.strftime("%Y-%m-%d")
+        day_name = current_date.strftime("%A")
+
+        for emp in employees:
+            emp_name_db = emp.get("name", "").strip()
+            emp_log = next((x for x in logs if
+                            x.get("employee_name", "").strip().lower() == emp_name_db.lower() and
+                            x.get("date") == current_date_str), None)
+
+            check_in_val = None
+            if emp_log:
+                check_in_val = emp_log.get("check_in") or emp_log.get("checkin") or emp_log.get("timestamp")
+
+            status = "Unknown"
+            check_in_time = None
+            minutes_late = 0
+            minutes_early = 0
+
+            schedule = emp.get("schedule", {}).get("weekly", {})
+            default_day = {"active": True, "start": "09:00", "end": "17:00"}
+            if day_name in ["Saturday", "Sunday"]: default_day["active"] = False
+            day_config = schedule.get(day_name, default_day)
+            shift_start_str = day_config.get("start", "09:00")
+
+            if check_in_val:
+                status = "Present"
+                try:
+                    if isinstance(check_in_val, str):
+                        dt = datetime.datetime.fromisoformat(check_in_val.replace("Z", "+00:00"))
+                    else:
+                        dt = check_in_val
+
+                    if dt.tzinfo is None:
+                        check_in_time = pytz.utc.localize(dt).astimezone(tz)
+                    else:
+                        check_in_time = dt.astimezone(tz)
+
+                    sh_h, sh_m = map(int, shift_start_str.split(":"))
+                    shift_start_dt = tz.localize(datetime.datetime.combine(current_date, datetime.time(sh_h, sh_m)))
+
+                    if check_in_time > shift_start_dt:
+                        diff = (check_in_time - shift_start_dt).total_seconds() / 60
+                        minutes_late = int(diff) if diff > 5 else 0
+                    else:
+                        minutes_early = int((shift_start_dt - check_in_time).total_seconds() / 60)
+
+                except Exception as e:
+                    print(f"⚠️ Time Calc Error for {emp_name_db}: {e}")
+            else:
+                is_today = current_date == now.date()
+                if current_date > now.date():
+                    status = "Scheduled"
+                elif not day_config.get("active", True):
+                    status = "Off Day"
+                else:
+                    if is_today:
+                        sh_h, sh_m = map(int, shift_start_str.split(":"))
+                        shift_start_dt = tz.localize(datetime.datetime.combine(current_date, datetime.time(sh_h, sh_m)))
+                        status = "Absent" if now > shift_start_dt else "Scheduled"
+                    else:
+                        status = "Absent"
+
+            report.append({
+                "id": f"{str(emp['_id'])}_{current_date_str}",
+                "date": current_date_str,
+                "name": emp_name_db,
+                "department": emp.get("department", "Unassigned"),
+                "status": status,
+                "shift": f"{shift_start_str} - {day_config.get('end', '17:00')}",
+                "check_in": check_in_time.isoformat() if check_in_time else None,
+                "minutes_late": minutes_late,
+                "minutes_early": minutes_early
+            })
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time the /attendance/by_date report engine.")
+    parser.add_argument("--headcounts", type=int, nargs="+", default=[200, 2000, 5000])
+    parser.add_argument("--days", type=int, nargs="+", default=[30, 90], help="Range lengths (month, quarter)")
+    args = parser.parse_args()
+
+    start_date = datetime.date(2025, 1, 1)
+    now = BEIRUT_TZ.localize(datetime.datetime(2025, 1, 21, 9, 30))  # Mid-range, mid-morning
+
+    print(f"{'days':>5}{'employees':>11}{'logs':>9}{'rows':>10}{'ms':>10}{'µs/row':>9}{'legacy ms':>11}{'match':>7}")
+    for days in args.days:
+        end_date = start_date + datetime.timedelta(days=days - 1)
+        for headcount in args.headcounts:
+            employees, logs = synthetic_data(headcount, start_date, days)
+
+            t0 = time.perf_counter()
+            report = build_attendance_report(employees, logs, start_date, end_date, now, BEIRUT_TZ)
+            elapsed = time.perf_counter() - t0
+
+            legacy_ms, match = "skipped", "-"
+            if days * headcount * len(logs) <= LEGACY_MAX_WORK:
+                t0 = time.perf_counter()
+                legacy = legacy_report(employees, logs, start_date, end_date, now, BEIRUT_TZ)
+                legacy_ms = f"{(time.perf_counter() - t0) * 1000:.0f}"
+                match = "yes" if report == legacy else "NO"
+
+            print(f"{days:>5}{headcount:>11}{len(logs):>9}{len(report):>10}{elapsed * 1000:>10.0f}"
+                  f"{elapsed * 1e6 / len(report):>9.2f}{legacy_ms:>11}{match:>7}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+import argparse
+import base64
+import json
+import time
+
+import cv2
+import numpy as np
+
+# ======================================
+# 🔹 Upload Format Benchmark
+# ======================================
+# Usage: python bench_upload.py [--image frame.jpg] [--runs 200]
+#
+# Compares the legacy JSON data-URL upload with the raw JPEG body: bytes on the
+# wire, and server-side time from request body to decoded RGB frame.
+
+
+def synthetic_frame(width=640, height=480, seed=0):
+    """
+    A kiosk-like 640x480 frame (smooth background + texture) when no photo is given.
+    """
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width]
+    base = np.stack([x * 255 // width, y * 255 // height, (x + y) * 255 // (width + height)], axis=-1)
+    noise = rng.integers(0, 40, size=(height, width, 3))
+    return np.clip(base + noise, 0, 255).astype(np.uint8)
+
+
+def decode_json_body(body):
+    """
+    What process_face did for every frame: JSON parse, split the data URL, base64 decode, copy, imdecode.
+    """
+    data = json.loads(body)
+    image_bytes = base64.b64decode(data["image"].split(",")[1])
+    frame = cv2.imdecode(np.frombuffer(image_bytes, np.uint8), cv2.IMREAD_COLOR)
+    return cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+
+
+def decode_raw_body(body):
+    """
+    The binary path: imdecode straight from the request body buffer.
+    """
+    frame = cv2.imdecode(np.frombuffer(body, np.uint8), cv2.IMREAD_COLOR)
+    return cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+
+
+def time_decode(decode, body, runs):
+    start = time.perf_counter()
+    for _ in range(runs):
+        decode(body)
+    return (time.perf_counter() - start) / runs
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bytes on the wire and decode latency: JSON data URL vs raw JPEG.")
+    parser.add_argument("--image", help="JPEG/PNG frame to use (default: synthetic 640x480)")
+    parser.add_argument("--quality", type=int, default=90, help="JPEG quality, like toDataURL(..., 0.9)")
+    parser.add_argument("--runs", type=int, default=200)
+    args = parser.parse_args()
+
+    frame = cv2.imread(args.image) if args.image else synthetic_frame()
+    ok, jpeg = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, args.quality])
+    if not ok:
+        raise SystemExit("Could not encode the frame as JPEG")
+
+    raw_body = jpeg.tobytes()
+    json_body = json.dumps({"image": "data:image/jpeg;base64," + base64.b64encode(raw_body).decode("ascii")}).encode()
+
+    json_time = time_decode(decode_json_body, json_body, args.runs)
+    raw_time = time_decode(decode_raw_body, raw_body, args.runs)
+
+    print(f"📊 Frame {frame.shape[1]}x{frame.shape[0]}, JPEG quality {args.quality}, {args.runs} runs")
+    print(f"{'format':<14}{'bytes':>10}{'ms/decode':>12}")
+    print(f"{'json dataurl':<14}{len(json_body):>10}{json_time * 1000:>12.3f}")
+    print(f"{'raw jpeg':<14}{len(raw_body):>10}{raw_time * 1000:>12.3f}")
+    print(f"Payload saved: {100.0 * (1 - len(raw_body) / len(json_body)):.1f}%  "
+          f"Decode time saved: {100.0 * (1 - raw_time / json_time):.1f}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+import argparse
+import sys
+
+from pymongo import MongoClient
+
+from db_indexes import HOT_QUERIES, MissingUniqueIndex, ensure_indexes, missing_unique_indexes
+
+# ======================================
+# 🔹 Query Plan Check
+# ======================================
+# Usage: python check_indexes.py [--uri mongodb://localhost:27017] [--db attendance_system] [--ensure]
+#
+# Runs explain() on every hot query in db_indexes.HOT_QUERIES and prints the
+# winning plan's stages. Exits with status 1 if any of them scans the whole
+# collection (COLLSCAN) or a unique index is missing, so it can gate a deploy.
+
+
+def plan_stages(plan):
+    """
+    Every "stage" name in an explain() plan tree (classic and SBE layouts).
+    """
+    stages = []
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            stages.append(plan["stage"])
+        for value in plan.values():
+            stages.extend(plan_stages(value))
+    elif isinstance(plan, list):
+        for value in plan:
+            stages.extend(plan_stages(value))
+    return stages
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fail if a hot attendance query does a collection scan.")
+    parser.add_argument("--uri", default="mongodb://localhost:27017")
+    parser.add_argument("--db", default="attendance_system")
+    parser.add_argument("--ensure", action="store_true", help="Create the indexes before checking")
+    args = parser.parse_args()
+
+    db = MongoClient(args.uri)[args.db]
+    if args.ensure:
+        try:
+            ensure_indexes(db)
+        except MissingUniqueIndex as e:
+            print(f"❌ {e}")
+
+    scans = 0
+    for description, collection, query, sort in HOT_QUERIES:
+        cursor = db[collection].find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        winning = cursor.explain().get("queryPlanner", {}).get("winningPlan", {})
+        stages = plan_stages(winning)
+        collscan = "COLLSCAN" in stages
+        scans += collscan
+        print(f"{'❌' if collscan else '✅'} {description:<36} {collection:<18} {' <- '.join(stages)}")
+
+    missing = missing_unique_indexes(db)
+    for name in missing:
+        print(f"❌ unique index {name} is missing: duplicate check-ins are not prevented")
+
+    if scans:
+        print(f"{scans} hot quer{'y' if scans == 1 else 'ies'} without an index. Run with --ensure or check the index build warnings.")
+    if scans or missing:
+        sys.exit(1)
+    print("All hot queries use an index and every unique index is in place.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+import threading  # Shared by all request threads
+
+# ======================================
+# 🔹 Today's Attendance State (write-through cache)
+# ======================================
+_MISSING = object()
+
+
+class DayStateCache:
+    """
+    Today's attendance_logs document per employee (None = no log yet), so the
+    attendance decision needs no read once a person has been seen today.
+    The cache only saves reads: every write is guarded in Mongo, and a guard
+    miss (another worker or kiosk got there first) refreshes the entry. Edits
+    made by another worker are not seen here, so a refusal decided from a
+    cached entry is confirmed against Mongo before it is returned.
+    It empties itself when the (Beirut) date changes.
+    """
+
+    def __init__(self):
+        self._date = None
+        self._docs = {}
+        self._lock = threading.Lock()
+
+    def _roll(self, today_str):
+        if today_str != self._date:
+            self._date = today_str
+            self._docs = {}
+
+    def get_many(self, today_str, names, load):
+        """
+        ({name: doc or None} for names, set of names just loaded): load(today_str,
+        missing_names) -> docs is called once for the names not cached yet.
+        """
+        with self._lock:
+            self._roll(today_str)
+            found = {name: self._docs.get(name, _MISSING) for name in names}
+        missing = [name for name, doc in found.items() if doc is _MISSING]
+        if missing:
+            loaded = {d["employee_name"]: d for d in load(today_str, missing)}
+            with self._lock:
+                self._roll(today_str)
+                for name in missing:
+                    found[name] = self._docs[name] = loaded.get(name)
+        return found, set(missing)
+
+    def put(self, today_str, name, doc):
+        with self._lock:
+            self._roll(today_str)
+            self._docs[name] = doc
+
+    def peek(self, today_str, name):
+        """
+        The cached log for name (never loads), or None.
+        """
+        with self._lock:
+            return self._docs.get(name) if today_str == self._date else None
+
+    def outbox_done(self, date_str, name, pushed_ids):
+        """
+        Mirror a finished sync round on the cached log: drop the pushed outbox
+        entries and mark it synced if nothing else is waiting (as in Mongo).
+        """
+        with self._lock:
+            doc = self._docs.get(name) if date_str == self._date else None
+            if doc is None:
+                return
+            outbox = [e for e in doc.get("sync_outbox") or [] if e.get("id") not in pushed_ids]
+            self._docs[name] = {**doc, "sync_outbox": outbox, "sync_status": "queued" if outbox else "synced"}
+
+    def invalidate(self, name=None, date_str=None):
+        """
+        Forget one employee (or everyone) after an edit made outside the kiosk path.
+        """
+        with self._lock:
+            if date_str is not None and date_str != self._date:
+                return
+            if name is None:
+                self._docs = {}
+            else:
+                self._docs.pop(name, None)
+
+    def __len__(self):
+        return len(self._docs)
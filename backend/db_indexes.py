@@ -0,0 +1,93 @@
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import OperationFailure
+
+# ======================================
+# 🔹 Index Definitions
+# ======================================
+# (collection, keys, options). Named explicitly so re-running is a no-op and
+# check_indexes.py can report them by name.
+INDEXES = [
+    # One log per employee per day; also serves every (employee_name, date) lookup
+    ("attendance_logs", [("employee_name", ASCENDING), ("date", ASCENDING)],
+     {"name": "employee_date_unique", "unique": True}),
+    # Today's board, report and filter date ranges
+    ("attendance_logs", [("date", ASCENDING)],
+     {"name": "date"}),
+    # Sync backlog: only pending logs are indexed, so the index stays tiny
+    ("attendance_logs", [("sync_status", ASCENDING)],
+     {"name": "sync_pending", "partialFilterExpression": {"sync_status": "pending"}}),
+    # Salesforce outbox: logs with entries still to push, claimed oldest day first
+    ("attendance_logs", [("sync_status", ASCENDING), ("date", ASCENDING)],
+     {"name": "sync_queued", "partialFilterExpression": {"sync_status": "queued"}}),
+    # Sync dead letters, newest day first (GET /sync/dead_letters)
+    ("attendance_logs", [("sync_status", ASCENDING), ("date", DESCENDING)],
+     {"name": "sync_dead_letter", "partialFilterExpression": {"sync_status": "dead_letter"}}),
+    ("employees", [("name", ASCENDING)],
+     {"name": "name_unique", "unique": True}),
+    ("employee_changes", [("version", ASCENDING)],
+     {"name": "version_unique", "unique": True}),
+]
+
+
+class MissingUniqueIndex(Exception):
+    """
+    A unique index could not be built (usually duplicates already in the data).
+    The attendance writes rely on these for their race protection, so the server
+    must not run without them.
+    """
+
+
+def ensure_indexes(db):
+    """
+    Create every index in INDEXES (idempotent). A plain index that cannot be
+    built is reported and skipped so the server still starts; a unique one
+    raises MissingUniqueIndex once the rest have been created.
+    Returns the names that failed.
+    """
+    failed = []
+    unique_failed = []
+    for collection, keys, options in INDEXES:
+        try:
+            db[collection].create_index(keys, **options)
+        except OperationFailure as e:
+            print(f"⚠️ Index {collection}.{options['name']} not created: {e}")
+            failed.append(options["name"])
+            if options.get("unique"):
+                unique_failed.append(f"{collection}.{options['name']}")
+    if unique_failed:
+        raise MissingUniqueIndex(f"Unique index(es) not built: {', '.join(unique_failed)}. Remove the duplicates and restart.")
+    return failed
+
+
+def missing_unique_indexes(db):
+    """
+    "collection.name" of every unique index in INDEXES that the database does not have.
+    """
+    missing = []
+    for collection, _, options in INDEXES:
+        if options.get("unique") and options["name"] not in db[collection].index_information():
+            missing.append(f"{collection}.{options['name']}")
+    return missing
+
+
+# ======================================
+# 🔹 Hot Queries (checked by check_indexes.py)
+# ======================================
+# (description, collection, filter, sort) with representative values.
+HOT_QUERIES = [
+    ("day log by employee", "attendance_logs", {"employee_name": "probe", "date": "2000-01-01"}, None),
+    ("day logs for several employees", "attendance_logs",
+     {"employee_name": {"$in": ["probe-a", "probe-b"]}, "date": "2000-01-01"}, None),
+    ("today's logs", "attendance_logs", {"date": "2000-01-01"}, None),
+    ("logs in a date range", "attendance_logs", {"date": {"$gte": "2000-01-01", "$lte": "2000-01-31"}}, None),
+    ("filter/export: logs in a date range, by date", "attendance_logs",
+     {"date": {"$gte": "2000-01-01", "$lte": "2000-12-31"}}, [("date", ASCENDING)]),
+    ("filter/export: one employee's logs in a date range, by date", "attendance_logs",
+     {"employee_name": "probe", "date": {"$gte": "2000-01-01", "$lte": "2000-12-31"}}, [("date", ASCENDING)]),
+    ("pending sync backlog", "attendance_logs", {"sync_status": "pending"}, None),
+    ("outbox: queued logs, oldest first", "attendance_logs", {"sync_status": "queued"}, [("date", ASCENDING)]),
+    ("sync dead letters", "attendance_logs", {"sync_status": "dead_letter"}, [("date", DESCENDING)]),
+    ("employee by name", "employees", {"name": "probe"}, None),
+    ("employees by names", "employees", {"name": {"$in": ["probe-a", "probe-b"]}}, None),
+    ("employee changes since a version", "employee_changes", {"version": {"$gt": 0}}, [("version", ASCENDING)]),
+]
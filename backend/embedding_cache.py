@@ -0,0 +1,108 @@
+import threading  # One cache shared by all request threads
+import time  # TTL expiry
+from collections import OrderedDict  # LRU order
+
+# ======================================
+# 🔹 Embedding Cache Settings
+# ======================================
+EMBED_CACHE_TTL_SECONDS = 3.0     # A kiosk repeats frames every 1-2s; older crops are re-encoded
+EMBED_CACHE_PER_CAMERA = 8        # Faces remembered per camera (multi-face frames)
+EMBED_CACHE_MAX_CAMERAS = 64      # Least recently used camera dropped beyond this
+EMBED_HASH_MAX_DISTANCE = 5       # dHash bits (of 64) two crops may differ by and still count as the same face
+EMBED_MIN_IOU = 0.5               # ...and the face must be at roughly the same spot in the frame
+# Memory bound: MAX_CAMERAS * PER_CAMERA entries of one 128-d float32 encoding (~0.5 KB) each
+
+
+class CacheEntry:
+    __slots__ = ("hash", "box", "encoding", "match", "generation", "expires")
+
+    def __init__(self, hash_, box, encoding, match, generation, expires):
+        self.hash = hash_
+        self.box = box
+        self.encoding = encoding
+        self.match = match            # Match or None (encoded but not recognized)
+        self.generation = generation  # Gallery generation the match was computed against
+        self.expires = expires
+
+
+class EmbeddingCache:
+    """
+    Short-lived per-camera memory of recent face crops: crop hash -> encoding and
+    match result. A repeat frame of the same person reuses the encoding (skipping
+    the dlib encoder) and, if the gallery has not changed since, the match too.
+    """
+
+    def __init__(self, ttl=EMBED_CACHE_TTL_SECONDS, per_camera=EMBED_CACHE_PER_CAMERA,
+                 max_cameras=EMBED_CACHE_MAX_CAMERAS):
+        self.ttl = ttl
+        self.per_camera = per_camera
+        self.max_cameras = max_cameras
+        self._cameras = OrderedDict()  # camera_id -> OrderedDict(hash -> CacheEntry)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.match_reuses = 0   # Hits whose match result was still valid for the current gallery
+        self.evictions = 0
+        self.expirations = 0
+
+    def candidates(self, camera_id):
+        """
+        Live entries for a camera as {hash: entry}. The entries are handed out by
+        reference, so a hit stays usable even if it is evicted mid-request.
+        """
+        now = time.time()
+        with self._lock:
+            entries = self._cameras.get(camera_id)
+            if not entries:
+                return {}
+            for h in [h for h, e in entries.items() if e.expires <= now]:
+                del entries[h]
+                self.expirations += 1
+            return dict(entries)
+
+    def record(self, hits, misses, match_reuses):
+        with self._lock:
+            self.hits += hits
+            self.misses += misses
+            self.match_reuses += match_reuses
+
+    def store(self, camera_id, hash_, box, encoding, match, generation, expires=None):
+        entry = CacheEntry(hash_, box, encoding, match, generation, expires or time.time() + self.ttl)
+        with self._lock:
+            entries = self._cameras.get(camera_id)
+            if entries is None:
+                entries = self._cameras[camera_id] = OrderedDict()
+                if len(self._cameras) > self.max_cameras:
+                    _, dropped = self._cameras.popitem(last=False)
+                    self.evictions += len(dropped)
+            self._cameras.move_to_end(camera_id)
+            entries.pop(hash_, None)
+            entries[hash_] = entry
+            while len(entries) > self.per_camera:
+                entries.popitem(last=False)
+                self.evictions += 1
+
+    def touch(self, camera_id, hash_):
+        """
+        Mark an entry as recently used (LRU) without extending its TTL.
+        """
+        with self._lock:
+            entries = self._cameras.get(camera_id)
+            if entries is not None and hash_ in entries:
+                entries.move_to_end(hash_)
+                self._cameras.move_to_end(camera_id)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "match_reuses": self.match_reuses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "cameras": len(self._cameras),
+                "entries": sum(len(e) for e in self._cameras.values()),
+                "max_entries": self.max_cameras * self.per_camera,
+            }
@@ -0,0 +1,67 @@
+import threading  # Serializes directory writers
+
+# ======================================
+# 🔹 Employee Directory (in-process cache)
+# ======================================
+# Everything but the face data: what the dashboards, schedules, reports and
+# the remote handoff read on every request.
+DIRECTORY_FIELDS = {"_id": 1, "name": 1, "OwnerId": 1, "department": 1, "schedule": 1}
+
+
+class EmployeeDirectory:
+    """
+    Employee documents (DIRECTORY_FIELDS only) by name, plus the employee-change
+    version they reflect. Kept current the same way as the face gallery: local
+    writes update it directly and the change log replays everyone else's.
+
+    Copy-on-write like GalleryStore: readers take one dict and never see a
+    half-applied change. Documents are shared, so callers must not mutate them.
+    Iteration order is load order (Mongo natural order), new employees last.
+    """
+
+    def __init__(self, version=-1):
+        self._state = ({}, version)  # (name -> document, version) swapped as one tuple
+        self._write_lock = threading.Lock()
+
+    @property
+    def version(self):
+        return self._state[1]
+
+    def __len__(self):
+        return len(self._state[0])
+
+    def get(self, name):
+        return self._state[0].get(name)
+
+    def all(self):
+        return list(self._state[0].values())
+
+    def names(self):
+        return sorted(self._state[0])
+
+    def replace(self, docs, version):
+        entries = {doc["name"]: doc for doc in docs}
+        with self._write_lock:
+            self._state = (entries, version)
+
+    def apply(self, names, docs, version=None):
+        """
+        Refresh names from docs ({name: document}); a name with no document was
+        deleted. version=None keeps the current version (a local write whose
+        change entry every process, this one included, replays later).
+        """
+        with self._write_lock:
+            entries, current = self._state
+            entries = dict(entries)
+            for name in names:
+                if name in docs:
+                    entries[name] = docs[name]
+                else:
+                    entries.pop(name, None)
+            self._state = (entries, current if version is None else version)
+
+    def upsert(self, doc):
+        self.apply([doc["name"]], {doc["name"]: doc})
+
+    def remove(self, name):
+        self.apply([name], {})
@@ -0,0 +1,650 @@
+import numpy as np  # NumPy for the vectorized distance computations
+import os  # Snapshot files
+import json  # Snapshot identity table
+import glob  # Finding snapshot files
+import pickle  # Legacy records store one pickled (averaged) encoding
+import threading  # Serializes gallery writers
+from collections import namedtuple
+
+# ======================================
+# 🔹 Gallery Matcher Settings
+# ======================================
+MATCH_THRESHOLD = 0.45  # A probe matches only if its distance is strictly below this value
+ENCODING_DIM = 128      # face_recognition (dlib ResNet) encodings are 128-d
+
+# One recognition result: who it is, how far away, and which identity won
+Match = namedtuple("Match", ["name", "owner_id", "distance", "index"])
+
+# ======================================
+# 🔹 Multi-Template Settings
+# ======================================
+REDUCE_MIN = "min"    # Identity distance = closest of its templates (same decision as the old single-encoding loop)
+REDUCE_TOP2 = "top2"  # Identity distance = mean of its two closest templates (more robust to one lucky template)
+
+MAX_TEMPLATES_PER_IDENTITY = 8  # Caps memory and scan cost per person no matter how many photos are enrolled
+TEMPLATE_DTYPE = "<f4"          # Stored templates: little-endian float32, 512 bytes per template
+
+
+# ======================================
+# 🔹 Template Storage Helpers
+# ======================================
+def encode_templates(templates):
+    """
+    Pack a (T, 128) template array into compact raw float32 bytes for MongoDB.
+    """
+    return np.asarray(templates, dtype=TEMPLATE_DTYPE).reshape(-1, ENCODING_DIM).tobytes()
+
+
+def decode_templates(blob):
+    """
+    Unpack bytes written by encode_templates back into a (T, 128) float32 array.
+    """
+    return np.frombuffer(blob, dtype=TEMPLATE_DTYPE).reshape(-1, ENCODING_DIM).astype(np.float32)
+
+
+def templates_from_document(emp):
+    """
+    Templates of one employee document: the binary face_templates field, or the
+    legacy pickled averaged face_encoding as a single template.
+    """
+    if emp.get("face_templates"):
+        return decode_templates(emp["face_templates"])
+    return np.asarray(pickle.loads(emp["face_encoding"]), dtype=np.float32).reshape(1, ENCODING_DIM)
+
+
+def select_templates(encodings, max_templates=MAX_TEMPLATES_PER_IDENTITY):
+    """
+    Keep at most max_templates encodings, chosen to cover the spread of the
+    enrollment photos (farthest-point sampling, seeded with the most typical one).
+    """
+    encodings = np.asarray(encodings, dtype=np.float32).reshape(-1, ENCODING_DIM)
+    if len(encodings) <= max_templates:
+        return encodings
+
+    center = encodings.mean(axis=0)
+    chosen = [int(np.argmin(np.linalg.norm(encodings - center, axis=1)))]
+    nearest = np.linalg.norm(encodings - encodings[chosen[0]], axis=1)
+    while len(chosen) < max_templates:
+        pick = int(np.argmax(nearest))  # The photo least covered by what is already kept
+        chosen.append(pick)
+        nearest = np.minimum(nearest, np.linalg.norm(encodings - encodings[pick], axis=1))
+    return encodings[sorted(chosen)]
+
+# ======================================
+# 🔹 ANN (IVF) Index Settings
+# ======================================
+INDEX_BRUTE = "brute"      # Exact scan of the whole matrix
+INDEX_IVF = "ivf"          # Inverted-file index: scan only the closest clusters, then re-rank exactly
+INDEX_AUTO = "auto"        # IVF only once the gallery is big enough for it to pay off
+
+IVF_AUTO_MIN_ROWS = 20000  # Below this a brute-force scan is already fast enough
+IVF_DEFAULT_NPROBE = 8     # Clusters scanned per query: the recall/latency knob
+IVF_TRAIN_ITERS = 10       # k-means iterations when building the index
+IVF_TRAIN_SAMPLE = 64      # Training rows per cluster (caps k-means cost on huge galleries)
+IVF_CHUNK_ROWS = 8192      # Rows per assignment chunk (bounds temporary memory)
+
+
+def _sq_dists(a, b, b_sq_norms):
+    """
+    Squared euclidean distances between the rows of a and b, shape (len(a), len(b)).
+    """
+    sq = np.einsum("ij,ij->i", a, a)[:, None] + b_sq_norms[None, :] - 2.0 * (a @ b.T)
+    np.maximum(sq, 0.0, out=sq)
+    return sq
+
+
+def _nearest_centroids(rows, centroids, centroid_sq):
+    """
+    Index of the closest centroid for every row, computed in chunks.
+    """
+    out = np.empty(len(rows), dtype=np.int32)
+    for start in range(0, len(rows), IVF_CHUNK_ROWS):
+        chunk = rows[start:start + IVF_CHUNK_ROWS]
+        out[start:start + len(chunk)] = np.argmin(_sq_dists(chunk, centroids, centroid_sq), axis=1)
+    return out
+
+
+# ======================================
+# 🔹 IVF Approximate Nearest-Neighbour Index
+# ======================================
+class IVFIndex:
+    """
+    Inverted-file index over a gallery matrix.
+
+    Rows are clustered with k-means; a query looks at the nprobe closest
+    clusters only and the caller re-ranks that shortlist with exact distances.
+    Raising nprobe trades latency for recall (nprobe == nlist is exact).
+    """
+
+    def __init__(self, matrix, nlist=None, nprobe=IVF_DEFAULT_NPROBE, seed=0):
+        n = len(matrix)
+        if nlist is None:
+            nlist = int(4 * np.sqrt(n))  # Usual IVF rule of thumb
+        self.nlist = max(1, min(nlist, n))
+        self.nprobe = nprobe
+
+        rng = np.random.default_rng(seed)
+        sample_size = min(n, self.nlist * IVF_TRAIN_SAMPLE)
+        sample = matrix[rng.choice(n, sample_size, replace=False)] if sample_size < n else matrix
+
+        # Plain Lloyd's k-means on the training sample
+        centroids = sample[rng.choice(len(sample), self.nlist, replace=False)].copy()
+        for _ in range(IVF_TRAIN_ITERS):
+            centroid_sq = np.einsum("ij,ij->i", centroids, centroids)
+            assign = _nearest_centroids(sample, centroids, centroid_sq)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assign, sample)
+            counts = np.bincount(assign, minlength=self.nlist)
+            filled = counts > 0
+            centroids[filled] = sums[filled] / counts[filled, None]  # Empty clusters keep their old centroid
+
+        self.centroids = np.ascontiguousarray(centroids, dtype=np.float32)
+        self.centroid_sq = np.einsum("ij,ij->i", self.centroids, self.centroids)
+        self._build_lists(_nearest_centroids(matrix, self.centroids, self.centroid_sq))
+
+    def _build_lists(self, assign):
+        # Inverted lists stored CSR-style: rows of cluster c are list_rows[offsets[c]:offsets[c + 1]]
+        self.assign = assign
+        self.list_rows = np.argsort(assign, kind="stable").astype(np.int64)
+        self.offsets = np.zeros(self.nlist + 1, dtype=np.int64)
+        np.cumsum(np.bincount(assign, minlength=self.nlist), out=self.offsets[1:])
+
+    @classmethod
+    def from_trained(cls, centroids, assign, nprobe=IVF_DEFAULT_NPROBE):
+        """
+        Rebuild an index from saved centroids and row assignments (no k-means).
+        """
+        index = cls.__new__(cls)
+        index.nlist, index.nprobe = len(centroids), nprobe
+        index.centroids = np.ascontiguousarray(centroids, dtype=np.float32)
+        index.centroid_sq = np.einsum("ij,ij->i", index.centroids, index.centroids)
+        index._build_lists(np.asarray(assign, dtype=np.int32))
+        return index
+
+    def edited(self, start, end, block):
+        """
+        A new index for a gallery whose rows start:end were replaced by block,
+        without re-training: other rows keep their cluster, block rows join
+        their nearest centroid.
+        """
+        added = _nearest_centroids(block, self.centroids, self.centroid_sq)
+        assign = np.concatenate([self.assign[:start], added, self.assign[end:]])
+        return IVFIndex.from_trained(self.centroids, assign, self.nprobe)
+
+    def candidates(self, probes, nprobe=None):
+        """
+        Shortlist of gallery rows (sorted) for each probe: the members of its nprobe closest clusters.
+        """
+        nprobe = min(nprobe or self.nprobe, self.nlist)
+        sq = _sq_dists(probes, self.centroids, self.centroid_sq)
+        if nprobe < self.nlist:
+            probe_lists = np.argpartition(sq, nprobe - 1, axis=1)[:, :nprobe]
+        else:
+            probe_lists = np.broadcast_to(np.arange(self.nlist), sq.shape)
+
+        shortlists = []
+        for lists in probe_lists:
+            rows = [self.list_rows[self.offsets[c]:self.offsets[c + 1]] for c in lists]
+            shortlists.append(np.sort(np.concatenate(rows)))  # Sorted so ties still go to the earliest row
+        return shortlists
+
+
+# ======================================
+# 🔹 Vectorized Gallery Matcher
+# ======================================
+class GalleryMatcher:
+    """
+    Holds every enrollment template in one contiguous float32 matrix, grouped by
+    identity, with parallel name / OwnerId arrays. Best-match and top-k queries
+    for one or many probes use a single vectorized distance computation over all
+    templates, then reduce the template distances per identity (min or top-2 mean).
+
+    Policy matches the old per-employee loop in process_face:
+    - a match needs distance < threshold (strict),
+    - on equal distances the earliest identity wins.
+    """
+
+    def __init__(self, templates, names, owner_ids, threshold=MATCH_THRESHOLD, reduce=REDUCE_MIN,
+                 index=INDEX_BRUTE, nprobe=IVF_DEFAULT_NPROBE, nlist=None,
+                 max_templates=MAX_TEMPLATES_PER_IDENTITY):
+        if not (len(templates) == len(names) == len(owner_ids)):
+            raise ValueError("templates, names and owner_ids must have the same length")
+
+        # Each identity may be one 128-d encoding or a (T, 128) stack of templates
+        blocks = []
+        for tpl in templates:
+            tpl = np.asarray(tpl, dtype=np.float32).reshape(-1, ENCODING_DIM)
+            if len(tpl) == 0:
+                raise ValueError("every identity needs at least one template")
+            blocks.append(select_templates(tpl, max_templates))
+
+        if blocks:
+            matrix = np.concatenate(blocks)
+        else:
+            matrix = np.empty((0, ENCODING_DIM), dtype=np.float32)
+
+        starts = np.zeros(len(blocks) + 1, dtype=np.int64)
+        np.cumsum([len(b) for b in blocks], out=starts[1:])
+
+        self.max_templates = max_templates
+        self._setup(matrix, starts, names, owner_ids, threshold, reduce, index, nprobe, nlist)
+
+    def _setup(self, matrix, starts, names, owner_ids, threshold, reduce, index, nprobe, nlist, ivf=None):
+        self.matrix = np.ascontiguousarray(matrix, dtype=np.float32)     # (T, 128), rows grouped by identity
+        self.sq_norms = np.einsum("ij,ij->i", self.matrix, self.matrix)  # ||g||^2 per row, reused by every query
+        self.starts = np.asarray(starts, dtype=np.int64)                 # Identity i owns rows starts[i]:starts[i + 1]
+        self.row_identity = np.repeat(np.arange(len(self.starts) - 1), np.diff(self.starts))
+        self.names = np.asarray(names, dtype=object)
+        self.owner_ids = np.asarray(owner_ids, dtype=object)
+        self.positions = {name: i for i, name in enumerate(self.names)}  # name -> identity number
+        self.threshold = threshold
+        self.reduce = reduce
+        self.index_mode, self.nprobe, self.nlist = index, nprobe, nlist
+
+        # Optional ANN index over template rows; None means every query is an exact brute-force scan
+        use_ivf = index == INDEX_IVF or (index == INDEX_AUTO and len(self.matrix) >= IVF_AUTO_MIN_ROWS)
+        if use_ivf and ivf is None and len(self.matrix):
+            ivf = IVFIndex(self.matrix, nlist=nlist, nprobe=nprobe)
+        self.index = ivf if use_ivf else None
+
+    @classmethod
+    def from_documents(cls, docs, **kwargs):
+        """
+        Build a matcher from employee documents ({"name", "face_templates" or "face_encoding", "OwnerId"}).
+        Extra keyword arguments (threshold, reduce, index, nprobe...) go to the constructor.
+        """
+        templates, names, owner_ids = [], [], []
+        for emp in docs:
+            templates.append(templates_from_document(emp))
+            names.append(emp["name"])
+            owner_ids.append(emp.get("OwnerId"))
+        return cls(templates, names, owner_ids, **kwargs)
+
+    def __len__(self):
+        return len(self.names)
+
+    @property
+    def template_count(self):
+        return len(self.matrix)
+
+    # --------------------------------------
+    # Copy-on-write edits
+    # --------------------------------------
+    def with_identity(self, name, owner_id, templates):
+        """
+        A new matcher with this identity added, or its templates replaced if the
+        name is already enrolled. The current matcher is left untouched, so
+        readers holding it never see a half-edited gallery.
+        """
+        block = select_templates(np.asarray(templates, dtype=np.float32), self.max_templates)
+        if len(block) == 0:
+            raise ValueError("every identity needs at least one template")
+
+        pos = self.positions.get(name)
+        if pos is None:
+            pos = len(self.names)
+            names = np.append(self.names, np.array([name], dtype=object))
+            owner_ids = np.append(self.owner_ids, np.array([owner_id], dtype=object))
+        else:
+            names, owner_ids = self.names.copy(), self.owner_ids.copy()
+            owner_ids[pos] = owner_id
+        return self._edited(pos, block, names, owner_ids)
+
+    def without_identity(self, name):
+        """
+        A new matcher without this identity (the same matcher if it is not enrolled).
+        """
+        pos = self.positions.get(name)
+        if pos is None:
+            return self
+        names = np.delete(self.names, pos)
+        owner_ids = np.delete(self.owner_ids, pos)
+        return self._edited(pos, np.empty((0, ENCODING_DIM), dtype=np.float32), names, owner_ids)
+
+    def _edited(self, pos, block, names, owner_ids):
+        """
+        Replace identity pos's rows with block (empty block = removal) in a fresh copy.
+        Identity order is preserved, so the earliest-identity tie-break is stable across edits.
+        """
+        start = self.starts[pos] if pos < len(self.starts) - 1 else len(self.matrix)
+        end = self.starts[pos + 1] if pos < len(self.starts) - 1 else len(self.matrix)
+        matrix = np.concatenate([self.matrix[:start], block, self.matrix[end:]])
+
+        counts = np.diff(self.starts).tolist()
+        if pos < len(counts):
+            counts[pos:pos + 1] = [len(block)] if len(block) else []
+        else:
+            counts.append(len(block))
+        starts = np.zeros(len(counts) + 1, dtype=np.int64)
+        np.cumsum(counts, out=starts[1:])
+
+        # Reuse the trained IVF centroids; only the edited rows get (re-)assigned
+        ivf = self.index.edited(start, end, block) if self.index is not None else None
+
+        edited = GalleryMatcher.__new__(GalleryMatcher)
+        edited.max_templates = self.max_templates
+        edited._setup(matrix, starts, names, owner_ids, self.threshold, self.reduce,
+                      self.index_mode, self.nprobe, self.nlist, ivf=ivf)
+        return edited
+
+    # --------------------------------------
+    # Distances
+    # --------------------------------------
+    def template_distances(self, probes):
+        """
+        Euclidean distances between every probe and every template row, shape (P, T).
+        Uses ||p||^2 + ||g||^2 - 2 p.g so the whole gallery is one matrix product.
+        """
+        probes = self._as_probe_matrix(probes)
+        cross = probes @ self.matrix.T
+        sq = np.einsum("ij,ij->i", probes, probes)[:, None] + self.sq_norms[None, :] - 2.0 * cross
+        np.maximum(sq, 0.0, out=sq)  # Clamp tiny negatives from float rounding
+        return np.sqrt(sq, out=sq)
+
+    def distances(self, probes):
+        """
+        Per-identity distances for every probe, shape (P, N), after the template reduction.
+        """
+        return self._reduce(self.template_distances(probes), self.starts[:-1], self.row_identity)
+
+    def _reduce(self, row_dists, group_starts, row_group):
+        """
+        Collapse (P, rows) template distances into (P, groups) identity distances.
+        Rows of one group are contiguous, so np.minimum.reduceat does it in one pass.
+        """
+        best = np.minimum.reduceat(row_dists, group_starts, axis=1)
+        if self.reduce == REDUCE_TOP2:
+            # Mask each group's best row and take the min again to get the runner-up
+            masked = np.where(row_dists == best[:, row_group], np.inf, row_dists)
+            second = np.minimum.reduceat(masked, group_starts, axis=1)
+            best = np.where(np.isfinite(second), (best + second) / 2.0, best)  # Single-template identities keep their min
+        return best
+
+    def _exact_distances(self, probe, rows):
+        """
+        Distances recomputed directly (no expansion) so the final threshold
+        decision is not affected by the cancellation error of the fast path.
+        """
+        diff = self.matrix[rows] - np.asarray(probe, dtype=np.float32)[None, :]
+        return np.sqrt(np.einsum("ij,ij->i", diff, diff, dtype=np.float64))
+
+    def _identity_rows(self, identities):
+        """
+        All template rows of the given identities, plus where each identity's rows start.
+        """
+        counts = self.starts[identities + 1] - self.starts[identities]
+        group_starts = np.zeros(len(identities), dtype=np.int64)
+        np.cumsum(counts[:-1], out=group_starts[1:])
+        offsets = np.arange(counts.sum()) - np.repeat(group_starts, counts)
+        rows = np.repeat(self.starts[identities], counts) + offsets
+        return rows, group_starts, np.repeat(np.arange(len(identities)), counts)
+
+    def _exact_identity_distances(self, probe, identities):
+        """
+        Exact reduced distance from one probe to each of the given identities.
+        """
+        rows, group_starts, row_group = self._identity_rows(identities)
+        exact = self._exact_distances(probe, rows)[None, :]
+        return self._reduce(exact, group_starts, row_group)[0]
+
+    @staticmethod
+    def _as_probe_matrix(probes):
+        probes = np.asarray(probes, dtype=np.float32)
+        if probes.ndim == 1:
+            probes = probes[None, :]
+        return probes
+
+    # --------------------------------------
+    # Queries
+    # --------------------------------------
+    def best_match(self, probe):
+        """
+        Best gallery match for a single probe, or None if nothing is under the threshold.
+        """
+        return self.best_matches([probe])[0]
+
+    def best_matches(self, probes):
+        """
+        Best match (or None) for each probe, computed with one distance matrix.
+        """
+        probes = self._as_probe_matrix(probes)
+        if len(self.names) == 0 or len(probes) == 0:
+            return [None] * len(probes)
+
+        if self.index is not None:
+            return [self._ann_top(probes[p], rows, 1, True) for p, rows in enumerate(self.index.candidates(probes))]
+
+        best_ids = np.argmin(self.distances(probes), axis=1)  # argmin keeps the first identity on ties, like the old loop
+
+        results = []
+        for p, ident in enumerate(best_ids):
+            dist = float(self._exact_identity_distances(probes[p], np.array([ident]))[0])
+            if dist < self.threshold:
+                results.append(self._match(ident, dist))
+            else:
+                results.append(None)
+        return results
+
+    def _ann_top(self, probe, rows, k, best_only):
+        """
+        Re-rank an IVF shortlist exactly: every identity that owns a shortlisted
+        template is scored over all of its templates.
+        """
+        if len(rows) == 0:
+            return None if best_only else []
+        identities = np.unique(self.row_identity[rows])  # Sorted, so ties still go to the earliest identity
+        exact = self._exact_identity_distances(probe, identities)
+        if best_only:
+            i = int(np.argmin(exact))
+            return self._match(identities[i], float(exact[i])) if exact[i] < self.threshold else None
+        order = np.lexsort((identities, exact))[:k]
+        return [self._match(identities[i], float(exact[i])) for i in order]
+
+    def top_k(self, probes, k=5):
+        """
+        The k nearest identities for each probe, closest first (no threshold applied).
+        Returns a list of Match lists, one per probe.
+        """
+        probes = self._as_probe_matrix(probes)
+        k = min(k, len(self.names))
+        if k == 0:
+            return [[] for _ in range(len(probes))]
+
+        if self.index is not None:
+            return [self._ann_top(probes[p], rows, k, False) for p, rows in enumerate(self.index.candidates(probes))]
+
+        dists = self.distances(probes)
+        if k < len(self.names):
+            part = np.argpartition(dists, k - 1, axis=1)[:, :k]  # O(N) selection, then sort only k
+        else:
+            part = np.broadcast_to(np.arange(len(self.names)), dists.shape)
+
+        results = []
+        for p in range(len(probes)):
+            identities = np.sort(part[p])
+            exact = self._exact_identity_distances(probes[p], identities)
+            # Stable sort on (distance, identity) keeps the earliest identity first on ties
+            order = np.lexsort((identities, exact))
+            results.append([self._match(identities[i], float(exact[i])) for i in order])
+        return results
+
+    def _match(self, ident, dist):
+        ident = int(ident)
+        return Match(self.names[ident], self.owner_ids[ident], dist, ident)
+
+
+# ======================================
+# 🔹 Versioned Gallery Store
+# ======================================
+class GalleryStore:
+    """
+    Holds the live GalleryMatcher and the employee-change version it reflects.
+
+    Writers build an edited copy and publish it with one reference swap under a
+    lock; readers call snapshot() once per request and keep using that matcher,
+    so recognition never observes a half-built gallery.
+    """
+
+    def __init__(self, matcher, version=0):
+        # (matcher, version, generation) swapped as one tuple so they always agree;
+        # generation bumps on every publish, including local edits that keep the version
+        self._state = (matcher, version, 0)
+        self._write_lock = threading.Lock()
+
+    def snapshot(self):
+        return self._state[0]
+
+    def snapshot_with_generation(self):
+        """
+        (matcher, generation): lets caches of match results tell whether the gallery changed since.
+        """
+        matcher, _, generation = self._state
+        return matcher, generation
+
+    @property
+    def version(self):
+        return self._state[1]
+
+    def _publish(self, matcher, version):
+        _, current, generation = self._state
+        self._state = (matcher, current if version is None else version, generation + 1)
+
+    def upsert(self, name, owner_id, templates, version=None):
+        with self._write_lock:
+            self._publish(self._state[0].with_identity(name, owner_id, templates), version)
+
+    def remove(self, name, version=None):
+        with self._write_lock:
+            self._publish(self._state[0].without_identity(name), version)
+
+    def apply(self, edit, version):
+        """
+        Apply edit(matcher) -> matcher and move to version in one publish.
+        """
+        with self._write_lock:
+            self._publish(edit(self._state[0]), version)
+
+    def replace(self, matcher, version):
+        with self._write_lock:
+            self._publish(matcher, version)
+
+    def advance(self, version):
+        """
+        Move to version without touching the matcher (a change with no face data,
+        e.g. a schedule edit), so match caches keyed on the generation stay valid.
+        """
+        with self._write_lock:
+            matcher, _, generation = self._state
+            self._state = (matcher, version, generation)
+
+
+# ======================================
+# 🔹 Memory-Mapped Gallery Snapshot
+# ======================================
+# On-disk layout (all files carry the employee change version they reflect):
+#   gallery-v{version}.npy   raw (T, 128) float32 template matrix, memory-mapped read-only
+#   gallery-v{version}.ivf.npz  optional IVF centroids + row assignments
+#   gallery-v{version}.json  identity table: names, OwnerIds, template row starts
+# The .json is written last, so its presence marks a complete snapshot.
+SNAPSHOT_FORMAT = 1
+SNAPSHOT_KEEP = 2  # Older snapshots kept around for processes that still have them mapped
+
+
+def _snapshot_path(directory, version, suffix):
+    return os.path.join(directory, f"gallery-v{version}{suffix}")
+
+
+def _write_atomic(path, write):
+    tmp = f"{path}.tmp{os.getpid()}"
+    with open(tmp, "wb") as f:
+        write(f)
+    os.replace(tmp, path)
+
+
+def save_snapshot(matcher, directory, version):
+    """
+    Write matcher as a versioned snapshot. Safe with several processes writing
+    the same version: every file lands via an atomic rename.
+    """
+    os.makedirs(directory, exist_ok=True)
+
+    _write_atomic(_snapshot_path(directory, version, ".npy"),
+                  lambda f: np.save(f, np.ascontiguousarray(matcher.matrix, dtype=TEMPLATE_DTYPE)))
+    if matcher.index is not None:
+        _write_atomic(_snapshot_path(directory, version, ".ivf.npz"),
+                      lambda f: np.savez(f, centroids=matcher.index.centroids, assign=matcher.index.assign))
+
+    table = {
+        "format": SNAPSHOT_FORMAT,
+        "version": version,
+        "rows": int(matcher.template_count),
+        "dim": ENCODING_DIM,
+        "starts": matcher.starts.tolist(),
+        "names": [str(n) for n in matcher.names],
+        "owner_ids": [o if o is None else str(o) for o in matcher.owner_ids],
+        "ivf": matcher.index is not None,
+    }
+    _write_atomic(_snapshot_path(directory, version, ".json"), lambda f: f.write(json.dumps(table).encode("utf-8")))
+
+    _prune_snapshots(directory)
+
+
+def _snapshot_versions(directory):
+    versions = []
+    for path in glob.glob(os.path.join(directory, "gallery-v*.json")):
+        try:
+            versions.append(int(os.path.basename(path)[len("gallery-v"):-len(".json")]))
+        except ValueError:
+            continue
+    return sorted(versions)
+
+
+def _prune_snapshots(directory):
+    for version in _snapshot_versions(directory)[:-SNAPSHOT_KEEP]:
+        for suffix in (".json", ".npy", ".ivf.npz"):  # Table first, so a half-pruned snapshot is never "complete"
+            try:
+                os.remove(_snapshot_path(directory, version, suffix))
+            except OSError:
+                pass  # Missing, or still mapped by a process on a platform that forbids deleting it
+
+
+def latest_snapshot_version(directory):
+    versions = _snapshot_versions(directory)
+    return versions[-1] if versions else None
+
+
+def load_snapshot(directory, version=None, threshold=MATCH_THRESHOLD, reduce=REDUCE_MIN,
+                  index=INDEX_BRUTE, nprobe=IVF_DEFAULT_NPROBE, nlist=None):
+    """
+    Memory-map a snapshot (the newest one if version is None).
+    Returns (matcher, version), or (None, None) if there is no usable snapshot.
+    """
+    if version is None:
+        version = latest_snapshot_version(directory)
+    if version is None:
+        return None, None
+
+    try:
+        with open(_snapshot_path(directory, version, ".json"), "rb") as f:
+            table = json.loads(f.read().decode("utf-8"))
+        if table.get("format") != SNAPSHOT_FORMAT or table.get("dim") != ENCODING_DIM:
+            return None, None
+
+        # mmap_mode="r": pages are shared through the OS page cache by every process mapping this file
+        matrix = np.load(_snapshot_path(directory, version, ".npy"), mmap_mode="r")
+        if matrix.shape != (table["rows"], ENCODING_DIM):
+            return None, None
+
+        ivf = None
+        ivf_path = _snapshot_path(directory, version, ".ivf.npz")
+        if table.get("ivf") and index != INDEX_BRUTE and os.path.exists(ivf_path):
+            with np.load(ivf_path) as saved:
+                ivf = IVFIndex.from_trained(saved["centroids"], saved["assign"], nprobe)
+    except (OSError, ValueError, KeyError):
+        return None, None
+
+    matcher = GalleryMatcher.__new__(GalleryMatcher)
+    matcher.max_templates = MAX_TEMPLATES_PER_IDENTITY
+    matcher._setup(matrix, table["starts"], table["names"], table["owner_ids"],
+                   threshold, reduce, index, nprobe, nlist, ivf=ivf)
+    return matcher, version
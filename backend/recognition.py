@@ -0,0 +1,160 @@
+import cv2  # OpenCV for decoding and resizing frames
+import numpy as np  # NumPy buffers for image bytes
+import face_recognition  # dlib HOG detector + ResNet encoder
+from tracking import associate, iou  # IoU association for streaming cameras and cached faces
+
+# ======================================
+# 🔹 Detection Settings
+# ======================================
+DETECTION_SCALE = 0.5   # Detect on a copy resized by this factor (HOG cost grows with pixel count)
+MIN_FACE_SIZE = 80      # Smallest face (px, full resolution) the kiosk must still find
+HOG_MIN_FACE = 40       # Smallest face dlib's HOG finds with one upsample (80px window / 2)
+DETECTION_MODEL = "hog"
+
+
+# ======================================
+# 🔹 Frame Decoding
+# ======================================
+def decode_image(image_bytes):
+    """
+    Decode JPEG/PNG bytes into an RGB frame, or None if the bytes are not an image.
+    """
+    frame = cv2.imdecode(np.frombuffer(image_bytes, np.uint8), cv2.IMREAD_COLOR)
+    if frame is None:
+        return None
+    return cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+
+
+# ======================================
+# 🔹 Downscaled Detection, Full-Resolution Encoding
+# ======================================
+def effective_detection_scale(scale=DETECTION_SCALE, min_face_size=MIN_FACE_SIZE):
+    """
+    The scale actually used for detection: never so small that a min_face_size
+    face shrinks below what HOG can see, and never above 1.
+    """
+    return min(1.0, max(scale, HOG_MIN_FACE / float(min_face_size)))
+
+
+def detect_faces(rgb_frame, scale=DETECTION_SCALE, min_face_size=MIN_FACE_SIZE, model=DETECTION_MODEL):
+    """
+    Face boxes (top, right, bottom, left) in full-resolution coordinates,
+    found on a downscaled copy of the frame.
+    """
+    s = effective_detection_scale(scale, min_face_size)
+    if s >= 1.0:
+        return face_recognition.face_locations(rgb_frame, model=model)
+
+    small = cv2.resize(rgb_frame, None, fx=s, fy=s, interpolation=cv2.INTER_AREA)
+    height, width = rgb_frame.shape[:2]
+
+    boxes = []
+    for top, right, bottom, left in face_recognition.face_locations(small, model=model):
+        boxes.append((
+            max(0, int(round(top / s))),
+            min(width, int(round(right / s))),
+            min(height, int(round(bottom / s))),
+            max(0, int(round(left / s))),
+        ))
+    return boxes
+
+
+def encode_faces(rgb_frame, boxes):
+    """
+    128-d encodings for the given boxes, computed on the original full-resolution
+    frame so landmarks and embeddings keep their accuracy.
+    """
+    if not boxes:
+        return []
+    return face_recognition.face_encodings(rgb_frame, boxes)
+
+
+# ======================================
+# 🔹 Whole-Frame Pipeline
+# ======================================
+def analyze_frame(image_bytes, max_faces=None):
+    """
+    Decode, detect and encode one frame.
+    Returns (boxes, encodings); boxes is None if the bytes could not be decoded.
+    max_faces limits how many detected faces get the (expensive) encoder.
+    """
+    rgb_frame = decode_image(image_bytes)
+    if rgb_frame is None:
+        return None, []
+
+    boxes = detect_faces(rgb_frame)
+    if max_faces:
+        boxes = boxes[:max_faces]
+    return boxes, encode_faces(rgb_frame, boxes)
+
+
+def analyze_tracked_frame(image_bytes, prev_boxes, due):
+    """
+    Streaming variant: detect every face, link each box to last frame's tracks
+    and run the encoder only for new faces or tracks flagged as due.
+    Returns (boxes, assignment, {box_index: encoding}); boxes is None if undecodable.
+    """
+    rgb_frame = decode_image(image_bytes)
+    if rgb_frame is None:
+        return None, [], {}
+
+    boxes = detect_faces(rgb_frame)
+    assignment = associate(prev_boxes, boxes)
+    to_encode = [i for i, prev in enumerate(assignment) if prev < 0 or due[prev]]
+    encodings = encode_faces(rgb_frame, [boxes[i] for i in to_encode])
+    return boxes, assignment, dict(zip(to_encode, encodings))
+
+
+# ======================================
+# 🔹 Face Crop Hashing (embedding cache)
+# ======================================
+HASH_SIZE = 8  # dHash grid: 8x8 horizontal gradients = 64-bit hash
+
+
+def face_hash(rgb_frame, box):
+    """
+    64-bit difference hash of a face crop: grayscale, shrink to 9x8, one bit per
+    "left pixel brighter than right". Stable under JPEG noise and small box jitter.
+    """
+    top, right, bottom, left = box
+    crop = rgb_frame[top:bottom, left:right]
+    if crop.size == 0:
+        return 0
+    gray = cv2.cvtColor(crop, cv2.COLOR_RGB2GRAY)
+    small = cv2.resize(gray, (HASH_SIZE + 1, HASH_SIZE), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    return int(sum(1 << i for i, bit in enumerate(bits) if bit))
+
+
+def hamming(a, b):
+    return bin(a ^ b).count("1")
+
+
+def analyze_frame_cached(image_bytes, max_faces, known, max_distance, min_iou):
+    """
+    analyze_frame for a camera with recently seen faces. known is a list of
+    (hash, box) for the camera's cached faces; a detected face whose crop hash is
+    within max_distance bits of one at roughly the same spot (IoU >= min_iou)
+    skips the encoder.
+    Returns (boxes, hashes, {box_index: encoding}, {box_index: cached hash});
+    boxes is None if the bytes could not be decoded.
+    """
+    rgb_frame = decode_image(image_bytes)
+    if rgb_frame is None:
+        return None, [], {}, {}
+
+    boxes = detect_faces(rgb_frame)
+    if max_faces:
+        boxes = boxes[:max_faces]
+    hashes = [face_hash(rgb_frame, box) for box in boxes]
+
+    hits = {}
+    for i, (box, h) in enumerate(zip(boxes, hashes)):
+        close = [(hamming(h, kh), kh) for kh, kbox in known
+                 if iou(box, kbox) >= min_iou and hamming(h, kh) <= max_distance]
+        if close:
+            hits[i] = min(close)[1]
+
+    to_encode = [i for i in range(len(boxes)) if i not in hits]
+    encodings = encode_faces(rgb_frame, [boxes[i] for i in to_encode])
+    return boxes, hashes, dict(zip(to_encode, encodings)), hits
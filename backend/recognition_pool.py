@@ -0,0 +1,159 @@
+import os  # CPU count for the default pool size
+import threading  # Bounded in-flight queue
+import multiprocessing  # Detect whether we are the parent or a pool worker
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+# ======================================
+# 🔹 Recognition Pool Settings
+# ======================================
+RECOGNITION_POOL_SIZE = os.cpu_count() or 2           # Worker processes (0 = analyze frames in the request thread)
+RECOGNITION_QUEUE_DEPTH = 4 * RECOGNITION_POOL_SIZE   # Frames running or waiting before requests get "busy"
+RECOGNITION_QUEUE_WAIT_SECONDS = 2.0                  # How long a request waits for a free slot before giving up
+RECOGNITION_TIMEOUT_SECONDS = 30.0                    # Upper bound on one frame's analysis
+# Workers never fork from the (multi-threaded) server process: forkserver forks them from a
+# clean single-threaded helper, spawn starts fresh interpreters where forkserver is unavailable
+RECOGNITION_START_METHOD = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+
+class PoolBusy(Exception):
+    """
+    Raised when the in-flight queue is full; the endpoint answers 503 so the kiosk retries.
+    """
+
+
+# ======================================
+# 🔹 Worker Process Side
+# ======================================
+def _init_worker():
+    """
+    Runs once per worker process: importing recognition loads the dlib HOG
+    detector, landmark model and ResNet encoder, and a dummy frame warms them up.
+    """
+    import recognition
+    recognition.detect_faces(np.zeros((120, 160, 3), dtype=np.uint8))
+
+
+def _analyze(image_bytes, max_faces):
+    """
+    Decode + detect + encode inside the worker. Compressed JPEG bytes cross the
+    pipe (tens of KB) instead of the decoded frame (about 1 MB at 640x480).
+    """
+    import recognition
+    boxes, encodings = recognition.analyze_frame(image_bytes, max_faces=max_faces)
+    # float32 halves what goes back through the pipe; the gallery matrix is float32 anyway
+    return boxes, [np.asarray(e, dtype=np.float32) for e in encodings]
+
+
+def _analyze_tracked(image_bytes, prev_boxes, due):
+    import recognition
+    boxes, assignment, encodings = recognition.analyze_tracked_frame(image_bytes, prev_boxes, due)
+    return boxes, assignment, {i: np.asarray(e, dtype=np.float32) for i, e in encodings.items()}
+
+
+def _analyze_cached(image_bytes, max_faces, known, max_distance, min_iou):
+    import recognition
+    boxes, hashes, encodings, hits = recognition.analyze_frame_cached(image_bytes, max_faces, known, max_distance, min_iou)
+    return boxes, hashes, {i: np.asarray(e, dtype=np.float32) for i, e in encodings.items()}, hits
+
+
+def _noop():
+    return os.getpid()
+
+
+# ======================================
+# 🔹 Request Side
+# ======================================
+class RecognitionPool:
+    """
+    Long-lived pool of recognition processes. Request handlers only orchestrate:
+    they hand over frame bytes and get back (boxes, encodings); matching against
+    the gallery stays in the server process, which owns the live gallery snapshot.
+    """
+
+    def __init__(self, size=RECOGNITION_POOL_SIZE, queue_depth=RECOGNITION_QUEUE_DEPTH):
+        self.size = size
+        self.queue_depth = queue_depth
+        self._slots = threading.BoundedSemaphore(queue_depth)
+        self._executor = None
+        self._start_lock = threading.Lock()
+
+    def start(self):
+        """
+        Start every worker now (and load its models) instead of on the first request.
+        """
+        with self._start_lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.size, initializer=_init_worker,
+                    mp_context=multiprocessing.get_context(RECOGNITION_START_METHOD)
+                )
+                warm = [self._executor.submit(_noop) for _ in range(self.size)]
+                pids = {f.result() for f in warm}
+                print(f"✅ Recognition pool ready: {len(pids)} worker process(es), queue depth {self.queue_depth}.")
+        return self
+
+    def submit(self, image_bytes, max_faces=None):
+        """
+        Queue one frame. Raises PoolBusy if the queue stays full for RECOGNITION_QUEUE_WAIT_SECONDS.
+        """
+        return self._submit(_analyze, image_bytes, max_faces)
+
+    def _submit(self, fn, *args):
+        if self._executor is None:
+            self.start()
+        if not self._slots.acquire(timeout=RECOGNITION_QUEUE_WAIT_SECONDS):
+            raise PoolBusy("Recognition queue is full")
+        try:
+            future = self._executor.submit(fn, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def analyze_tracked(self, image_bytes, prev_boxes, due):
+        """
+        Streaming frame: detect, associate with the given tracks, encode only new/due faces.
+        """
+        return self._submit(_analyze_tracked, image_bytes, prev_boxes, due).result(timeout=RECOGNITION_TIMEOUT_SECONDS)
+
+    def analyze_cached(self, image_bytes, max_faces, known, max_distance, min_iou):
+        """
+        Kiosk frame with an embedding cache: faces matching a known crop hash skip the encoder.
+        """
+        return self._submit(_analyze_cached, image_bytes, max_faces, known, max_distance, min_iou).result(
+            timeout=RECOGNITION_TIMEOUT_SECONDS)
+
+    def analyze(self, image_bytes, max_faces=None):
+        return self.submit(image_bytes, max_faces).result(timeout=RECOGNITION_TIMEOUT_SECONDS)
+
+    def analyze_many(self, frames_bytes, max_faces=None):
+        """
+        Analyze several frames in parallel; results keep the input order.
+        """
+        futures = []
+        try:
+            for image_bytes in frames_bytes:
+                futures.append(self.submit(image_bytes, max_faces))
+        except PoolBusy:
+            for future in futures:
+                future.cancel()
+            raise
+        return [f.result(timeout=RECOGNITION_TIMEOUT_SECONDS) for f in futures]
+
+    def shutdown(self):
+        with self._start_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+
+def is_pool_worker():
+    """
+    True inside a pool worker (where a nested pool must never be started).
+    While a forkserver/spawn child is still importing the parent's main script
+    (as __mp_main__) this is not set yet; server.py checks its __name__ for that.
+    """
+    return multiprocessing.parent_process() is not None
@@ -3,6 +3,7 @@ import os
 import pickle
 from pymongo import MongoClient
 import numpy as np
+from gallery import select_templates, encode_templates
 
 # ======================================
 # 🔹 MongoDB Setup
@@ -83,16 +84,19 @@ for employee_name in os.listdir(KNOWN_FACES_DIR):
         print(f"⚠️ No valid faces found for {name}, skipping.")
         continue
 
-    # Create average encoding
+    # Keep every photo as a template (capped), plus the legacy average encoding
+    templates = select_templates(all_encodings)
     mean_encoding = np.mean(all_encodings, axis=0)
 
     # Insert with Default Schedule AND Department
     employees_col.insert_one({
         "name": name,
         "face_encoding": pickle.dumps(mean_encoding),
+        "face_templates": encode_templates(templates),
+        "template_count": len(templates),
         "OwnerId": owner_id,
         "department": department,   # <--- NEW FIELD ADDED HERE
         "schedule": DEFAULT_SCHEDULE 
     })
 
-    print(f"✅ Registered {name} | Dept: {department}")
\ No newline at end of file
+    print(f"✅ Registered {name} | Dept: {department} | Templates: {len(templates)}")
\ No newline at end of file
@@ -0,0 +1,261 @@
+import datetime
+
+import pytz
+
+# ======================================
+# 🔹 Attendance Report Engine
+# ======================================
+# Pure functions (no Flask, no Mongo) so the report can be benchmarked and
+# reused: the endpoint fetches employees + logs and hands them over.
+WEEKDAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+DEFAULT_START, DEFAULT_END = "09:00", "17:00"
+LATE_GRACE_MINUTES = 5  # Arriving up to 5 minutes after shift start is not counted as late
+
+
+def normalize_name(name):
+    return (name or "").strip().lower()
+
+
+def index_logs(logs):
+    """
+    (normalized employee name, date) -> log. Case/whitespace-insensitive, so
+    "Samir" and "samir " find the same log; the first log of a pair wins.
+    """
+    index = {}
+    for log in logs:
+        index.setdefault((normalize_name(log.get("employee_name")), log.get("date")), log)
+    return index
+
+
+def parse_hhmm(value):
+    """
+    (hour, minute) from "HH:MM", or None if the schedule value is malformed.
+    """
+    try:
+        h, m = map(int, value.split(":"))
+        return h, m
+    except (AttributeError, ValueError):
+        return None
+
+
+def weekly_shifts(employee):
+    """
+    The employee's shift for each weekday (Monday=0), resolved once:
+    (active, start_str, end_str, (hour, minute) of start or None).
+    Days missing from the schedule default to 09:00-17:00, off on weekends.
+    """
+    schedule = (employee.get("schedule") or {}).get("weekly", {})
+    shifts = []
+    for weekday, day_name in enumerate(WEEKDAYS):
+        default_day = {"active": weekday < 5, "start": DEFAULT_START, "end": DEFAULT_END}
+        day_config = schedule.get(day_name, default_day)
+        start_str = day_config.get("start", DEFAULT_START)
+        shifts.append((day_config.get("active", True), start_str, day_config.get("end", DEFAULT_END), parse_hhmm(start_str)))
+    return shifts
+
+
+def log_check_in(log, tz):
+    """
+    The log's check-in as an aware datetime in tz (supports the older
+    "checkin" / "timestamp" field names and ISO strings), or None.
+    """
+    value = log.get("check_in") or log.get("checkin") or log.get("timestamp")
+    if not value:
+        return None
+    if isinstance(value, str):
+        value = datetime.datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if value.tzinfo is None:
+        return pytz.utc.localize(value).astimezone(tz)
+    return value.astimezone(tz)
+
+
+def build_attendance_report(employees, logs, start_date, end_date, now, tz):
+    """
+    One row per (day, employee) between start_date and end_date (inclusive),
+    days in order and employees in the given order.
+    Logs are looked up in a (name, date) hash index and each employee's weekly
+    schedule is resolved once, so the work is linear in rows + logs.
+    """
+    log_index = index_logs(logs)
+    people = []
+    for emp in employees:
+        name = emp.get("name", "").strip()
+        people.append((emp, name, normalize_name(name), str(emp["_id"]), weekly_shifts(emp)))
+    today = now.date()
+    shift_starts = {}  # (date, (h, m)) -> aware datetime; most employees share a few shift starts
+
+    def shift_start(current_date, start_hm):
+        key = (current_date, start_hm)
+        if key not in shift_starts:
+            shift_starts[key] = tz.localize(datetime.datetime.combine(current_date, datetime.time(*start_hm)))
+        return shift_starts[key]
+
+    report = []
+    for i in range((end_date - start_date).days + 1):
+        current_date = start_date + datetime.timedelta(days=i)
+        current_date_str = current_date.strftime("%Y-%m-%d")
+        weekday = current_date.weekday()
+
+        for emp, name, key, emp_id, shifts in people:
+            active, start_str, end_str, start_hm = shifts[weekday]
+            emp_log = log_index.get((key, current_date_str))
+
+            status = "Unknown"
+            check_in_time = None
+            minutes_late = 0
+            minutes_early = 0
+
+            check_in_val = emp_log and (emp_log.get("check_in") or emp_log.get("checkin") or emp_log.get("timestamp"))
+            if check_in_val:
+                status = "Present"
+                try:
+                    check_in_time = log_check_in(emp_log, tz)
+                    if start_hm is None:
+                        raise ValueError(f"bad shift start {start_str!r}")
+                    shift_start_dt = shift_start(current_date, start_hm)
+
+                    # Calculate Lateness
+                    if check_in_time > shift_start_dt:
+                        diff = (check_in_time - shift_start_dt).total_seconds() / 60
+                        minutes_late = int(diff) if diff > LATE_GRACE_MINUTES else 0
+                    else:
+                        minutes_early = int((shift_start_dt - check_in_time).total_seconds() / 60)
+                except Exception as e:
+                    print(f"⚠️ Time Calc Error for {name}: {e}")
+            else:
+                # Absent Logic
+                if current_date > today:
+                    status = "Scheduled"
+                elif not active:
+                    status = "Off Day"
+                elif current_date == today and start_hm is not None:
+                    status = "Absent" if now > shift_start(current_date, start_hm) else "Scheduled"
+                else:
+                    status = "Absent"
+
+            report.append({
+                "id": f"{emp_id}_{current_date_str}",
+                "date": current_date_str,
+                "name": name,
+                "department": emp.get("department", "Unassigned"),
+                "status": status,
+                "shift": f"{start_str} - {end_str}",
+                "check_in": check_in_time.isoformat() if check_in_time else None,
+                "minutes_late": minutes_late,
+                "minutes_early": minutes_early
+            })
+
+    return report
+
+
+# ======================================
+# 🔹 Filter / Export Rows (/attendance/filter, /attendance/export)
+# ======================================
+WEEKEND = ("Saturday", "Sunday")
+EXPORT_CSV_HEADER = ["Staff Member", "Date", "Clock In", "Clock Out", "Break Start", "Break End",
+                     "Worked Method", "Remote Status", "Holiday/Off"]
+
+
+def format_log_time(val, tz):
+    """
+    A stored log time as an ISO string in tz (naive datetimes are UTC);
+    strings are passed through as stored.
+    """
+    if not val:
+        return None
+    try:
+        if isinstance(val, datetime.datetime):
+            if val.tzinfo is None:
+                val = pytz.utc.localize(val)
+            return val.astimezone(tz).isoformat()
+        return val
+    except Exception:
+        return None
+
+
+def filter_row(emp, current_date, day_name, log, tz):
+    """
+    One /attendance/filter summary row: the employee's day config plus how the day was worked.
+    """
+    schedule = (emp.get("schedule") or {}).get("weekly", {})
+    day_cfg = schedule.get(day_name, {"active": True, "is_remote": False})
+    # Default off if weekend and not in schedule
+    if day_name in WEEKEND and day_name not in schedule:
+        day_cfg = {"active": False, "is_remote": False}
+
+    is_active = day_cfg.get("active", True)
+    is_remote_sched = day_cfg.get("is_remote", False)
+
+    worked_method = "Absent"
+    if not is_active:
+        worked_method = "OFF"
+    elif log:
+        # Source metadata saved during check-in/out ('check_in_source', or the older 'source')
+        log_source = log.get("check_in_source") or log.get("source") or ""
+        if "continue_working_from_home" in log_source or "remote" in log_source:
+            worked_method = "Continued From Home"
+        elif log.get("check_in"):
+            worked_method = "Office"
+    elif is_remote_sched:
+        worked_method = "Scheduled Remote Day"
+
+    log = log or {}
+    return {
+        "employee_name": emp.get("name"),
+        "date": current_date,
+        "check_in": format_log_time(log.get("check_in"), tz),
+        "check_out": format_log_time(log.get("check_out"), tz),
+        "break_in": format_log_time(log.get("break_in"), tz),
+        "break_out": format_log_time(log.get("break_out"), tz),
+        "is_remote_today": is_remote_sched or (worked_method == "Continued From Home"),
+        "is_off_today": not is_active,
+        "worked_method": worked_method,
+    }
+
+
+def iter_filter_rows(employees, logs, start_date, end_date, tz, after_name=None):
+    """
+    Yield filter rows day by day, employees in the given order, for
+    start_date..end_date (inclusive). logs must be sorted by date (a Mongo
+    cursor is fine): only the current day's logs are held, so memory is bounded
+    by headcount whatever the range. after_name skips the first day's rows up to
+    and including that employee (employees must then be sorted by name).
+    """
+    logs = iter(logs)
+    pending = next(logs, None)
+    for i in range((end_date - start_date).days + 1):
+        day = start_date + datetime.timedelta(days=i)
+        current_date = day.strftime("%Y-%m-%d")
+        day_name = WEEKDAYS[day.weekday()]
+
+        day_logs = {}
+        while pending is not None and (pending.get("date") or "") <= current_date:
+            if pending.get("date") == current_date:
+                day_logs[pending.get("employee_name")] = pending
+            pending = next(logs, None)
+
+        for emp in employees:
+            if i == 0 and after_name is not None and emp.get("name") <= after_name:
+                continue
+            yield filter_row(emp, current_date, day_name, day_logs.get(emp.get("name")), tz)
+
+
+def export_csv_row(row, tz):
+    """
+    One filter row as the export spreadsheet columns (times as HH:MM in tz).
+    """
+    def clock(value):
+        if not value:
+            return ""
+        try:
+            return datetime.datetime.fromisoformat(value).astimezone(tz).strftime("%H:%M")
+        except (TypeError, ValueError):
+            return value
+
+    return [
+        row["employee_name"], row["date"],
+        clock(row["check_in"]), clock(row["check_out"]), clock(row["break_in"]), clock(row["break_out"]),
+        row["worked_method"],
+        "Yes" if row["is_remote_today"] else "No",
+        "Yes" if row["is_off_today"] else "No",
+    ]
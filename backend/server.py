@@ -1,23 +1,38 @@
-from flask import Flask, request, jsonify  # Import Flask to create backend app, handle HTTP requests, and return JSON responses
+from flask import Flask, request, jsonify, Response, stream_with_context  # Import Flask to create backend app, handle HTTP requests, and return JSON responses
 from flask_cors import CORS  # Enable Cross-Origin Resource Sharing so React frontend can communicate with Flask backend
 import cv2  # OpenCV library for image processing (used with face recognition)
 import numpy as np  # NumPy library for array manipulation (used for images and face encodings)
 import base64  # Base64 encoding/decoding to send image data as strings
 import face_recognition  # Library for detecting and recognizing faces
-from pymongo import MongoClient  # MongoDB client for connecting and interacting with MongoDB database
+from pymongo import MongoClient, ReturnDocument, UpdateOne  # MongoDB client for connecting and interacting with MongoDB database
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+from db_indexes import ensure_indexes  # Index bootstrap (python check_indexes.py verifies the plans)
 import pickle  # Python module to serialize/deserialize Python objects (used for storing face encodings)
 import datetime  # Python module to work with dates and times
-import requests  # Library to make HTTP requests (used for Salesforce JWT auth)
-from simple_salesforce import Salesforce  # Library to connect and interact with Salesforce REST API
-import jwt  # Library for creating JSON Web Tokens (used for Salesforce authentication)
+from sf_client import SalesforceClient, is_availability_error  # Shared Salesforce connection: pooled HTTP session, JWT auth, token refresh
+from sf_reconcile import reconcile_logs, InvalidSyncRecord  # Bulk SOQL + composite writes for the sync backlog
+from reports import build_attendance_report, iter_filter_rows, export_csv_row, EXPORT_CSV_HEADER  # Report engine + filter/export rows
 import time  # Time utilities for delays, timestamps, and token expiration
 import pytz  # Timezone handling library (used to convert timestamps to Beirut time)
 import threading  # Python threading module to run background sync tasks
 from bson.objectid import ObjectId
 import traceback # Ensure this is imported
 import json # Added for logging
+import csv  # Streaming CSV export
+import io  # Per-chunk export buffer
+import itertools  # Paging the filter row generator
 from bson import ObjectId
-import socket  # <--- THIS WAS MISSING
+from sf_health import CircuitBreaker, CircuitOpen, run_health_monitor  # Salesforce online/offline state without per-request probes
+import os  # Paths for the on-disk gallery snapshot
+import struct  # Length prefixes in the live-feed frame stream
+from tracking import TrackerRegistry  # Per-camera face tracks for the live feed
+from day_state import DayStateCache  # Today's attendance logs, write-through
+from employee_directory import EmployeeDirectory, DIRECTORY_FIELDS  # Names, OwnerIds, departments, schedules in memory
+from embedding_cache import EmbeddingCache, EMBED_HASH_MAX_DISTANCE, EMBED_MIN_IOU  # Repeat kiosk frames skip the encoder
+from recognition import analyze_frame, analyze_tracked_frame, analyze_frame_cached  # Decode + downscaled HOG detection + full-resolution encoding
+from concurrent.futures import ThreadPoolExecutor  # Parallel frame analysis when the process pool is disabled
+from recognition_pool import RecognitionPool, PoolBusy, RECOGNITION_POOL_SIZE, is_pool_worker  # CPU-bound recognition in worker processes
+from gallery import GalleryMatcher, GalleryStore, INDEX_AUTO, REDUCE_MIN, select_templates, encode_templates, templates_from_document, load_snapshot, save_snapshot  # Vectorized face gallery (one matrix instead of a Python loop)
 # ======================================
 # 🔹 Flask App Setup
 # ======================================
@@ -27,107 +42,121 @@ CORS(app)  # Enable Cross-Origin Resource Sharing so frontend React app can call
 # ======================================
 # 🔹 MongoDB Setup
 # ======================================
-client = MongoClient("mongodb://localhost:27017")  # Connect to local MongoDB server
+# A forkserver/spawn recognition worker re-imports this script as __mp_main__: it must not
+# connect, build indexes, load the gallery or start threads (see start_server_services)
+WORKER_IMPORT = __name__ == "__mp_main__"
+
+client = MongoClient("mongodb://localhost:27017", connect=False)  # Local MongoDB server; connects on first use
 db = client["attendance_system"]  # Select the "attendance_system" database
 employees_col = db["employees"]  # Collection to store employee info (names, face encodings, Salesforce IDs)
 logs_col = db["attendance_logs"]  # Collection to store daily attendance logs
+meta_col = db["meta"]  # Small counters shared by every server process (e.g. the employee change version)
+employee_changes_col = db["employee_changes"]  # Ordered log of employee adds/removes so other processes can catch up
+
+day_state = DayStateCache()  # Today's attendance log per employee, kept in step with every kiosk write
 
 # ======================================
 # 🔹 Load Known Faces from MongoDB
 # ======================================
-known_face_encodings = []  # List to store face encodings for all employees
-known_face_names = []  # List to store names corresponding to each face encoding
-known_face_owner_ids = []  # List to store Salesforce OwnerIds corresponding to each employee
+GALLERY_INDEX_MODE = INDEX_AUTO   # "brute" = exact scan, "ivf" = ANN index, "auto" = IVF once the gallery is large
+GALLERY_IVF_NPROBE = 8            # IVF clusters scanned per lookup: raise for recall, lower for latency
+GALLERY_TEMPLATE_REDUCE = REDUCE_MIN  # How an employee's templates combine into one distance: "min" or "top2"
+
+def build_face_gallery(docs):
+    """
+    Build the in-memory gallery matcher with the configured lookup mode.
+    """
+    return GalleryMatcher.from_documents(
+        docs, reduce=GALLERY_TEMPLATE_REDUCE, index=GALLERY_INDEX_MODE, nprobe=GALLERY_IVF_NPROBE
+    )
 
-for emp in employees_col.find({}):  # Iterate over every employee document in MongoDB
-    encoding = pickle.loads(emp["face_encoding"])  # Deserialize face encoding bytes back into numpy array
-    known_face_encodings.append(encoding)  # Add this encoding to the known faces list
-    known_face_names.append(emp["name"])  # Add the employee's name to the known names list
-    known_face_owner_ids.append(emp.get("OwnerId"))  # Add Salesforce OwnerId to the list (or None if not present)
+GALLERY_FACE_FIELDS = {"name": 1, "OwnerId": 1, "face_templates": 1, "face_encoding": 1}  # Only what the matcher needs
+GALLERY_SNAPSHOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "gallery_snapshot")  # mmap'd by every worker on this host
+GALLERY_POLL_SECONDS = 2          # How often each process checks the shared version stamp for changes
+GALLERY_GAP_MAX_POLLS = 5         # Polls to wait for a missing change entry before falling back to a full reload
+
+def get_employees_version():
+    """
+    Current employee change version stamp stored in MongoDB (0 if nothing was ever published).
+    """
+    doc = meta_col.find_one({"_id": "employees"}, {"version": 1})
+    return doc["version"] if doc else 0
+
+def publish_employee_change(op, name):
+    """
+    Bump the shared version stamp and log which employee changed, so every
+    other server process can apply just that change on its next poll.
+    op is "upsert", "remove", or "meta" (department/schedule only: no face data).
+    """
+    version = meta_col.find_one_and_update(
+        {"_id": "employees"}, {"$inc": {"version": 1}},
+        upsert=True, return_document=ReturnDocument.AFTER
+    )["version"]
+    employee_changes_col.insert_one({
+        "version": version, "op": op, "name": name,
+        "ts": datetime.datetime.now(datetime.timezone.utc)
+    })
+    return version
 
-print(f"✅ Loaded {len(known_face_encodings)} known faces from MongoDB.")  # Log total number of loaded faces
+gallery_store = GalleryStore(build_face_gallery([]), -1)  # Filled by load_face_gallery() once the module is loaded
+employee_directory = EmployeeDirectory()  # Filled by load_employee_directory(); read by every endpoint that needs employee metadata
 
 # ======================================
 # 🔹 Salesforce JWT Authentication Setup
 # ======================================
 SF_CLIENT_ID = "secret for company privacy"  # Salesforce connected app client ID
-SF_LOGIN_URL = "https://login.salesforce.com"  # Salesforce login URL for JWT auth
+SF_LOGIN_URL = os.environ.get("SF_LOGIN_URL", "https://login.salesforce.com")  # Salesforce login URL for JWT auth (override for sandboxes)
 SF_USERNAME = "salesforce@samir"  # Salesforce user to authenticate as
 PRIVATE_KEY_FILE = "server.key"  # Path to private key used to sign JWT for Salesforce
-
-sf_access_token = None  # Placeholder variable to store Salesforce access token after authentication
-sf_instance_url = None  # Placeholder variable to store Salesforce instance URL
+SF_SESSION_SECONDS = int(os.environ.get("SF_SESSION_SECONDS", 2 * 60 * 60))  # Org session timeout; token is refreshed before it
 
 BEIRUT_TZ = pytz.timezone("Asia/Beirut")  # Set timezone to Beirut for all timestamps
 
-# Lock and flag for background sync thread to prevent multiple threads from running at the same time
-sync_lock = threading.Lock()  # Thread lock to synchronize background operations
-sync_thread_started = False  # Boolean flag to track whether background sync thread has been started
-
 # ======================================
-# 🔹 Salesforce Authentication Function
+# 🔹 Salesforce Connection (shared, pooled, auto-refreshing)
 # ======================================
-def authenticate_with_jwt():
+sf_client = SalesforceClient(SF_CLIENT_ID, SF_USERNAME, SF_LOGIN_URL, PRIVATE_KEY_FILE, session_seconds=SF_SESSION_SECONDS)
+
+def get_sf_connection():
     """
-    Authenticate with Salesforce using JWT and store access token & instance URL.
+    Returns the shared Salesforce connection object, refreshing the token first if it is about to expire.
     """
-    global sf_access_token, sf_instance_url  # Use global variables to store token and instance URL
-
-    with open(PRIVATE_KEY_FILE, "r") as f:  # Open private key file for reading
-        private_key = f.read()  # Read private key as a string
-
-    # Create JWT payload with issuer, subject, audience, and expiration
-    payload = {
-        "iss": SF_CLIENT_ID,  # Issuer: Salesforce client ID
-        "sub": SF_USERNAME,  # Subject: Salesforce username
-        "aud": SF_LOGIN_URL,  # Audience: Salesforce login URL
-        "exp": int(time.time()) + 300  # Expiration: 5 minutes from now
-    }
-
-    # Encode JWT using RS256 algorithm with private key
-    encoded_jwt = jwt.encode(payload, private_key, algorithm="RS256")
+    return sf_client.connection()
 
-    # Send JWT to Salesforce OAuth2 endpoint to obtain access token
-    response = requests.post(
-        f"{SF_LOGIN_URL}/services/oauth2/token",
-        data={
-            "grant_type": "urn:ietf:params:oauth:grant-type:jwt-bearer",  # JWT bearer grant type
-            "assertion": encoded_jwt  # JWT assertion
-        }
-    ).json()  # Convert response to JSON
-
-    if "access_token" not in response:  # Check if authentication failed
-        raise Exception(f"❌ JWT Authentication failed: {response}")  # Raise error if no token received
+def sf_call(fn):
+    """
+    Run fn(sf) on the shared connection; a 401 refreshes the token and retries once.
+    """
+    return sf_client.call(fn)
 
-    sf_access_token = response["access_token"]  # Store access token in global variable
-    sf_instance_url = response["instance_url"]  # Store Salesforce instance URL
-    print("✅ Salesforce JWT authentication successful!")  # Log success message
 # ======================================
-# 🔹 Get Salesforce Connection Helper
+# 🔹 Check Salesforce Online Status
 # ======================================
-def get_sf_connection():
+# Salesforce health is tracked by a circuit breaker fed by real sync calls and
+# a background probe, so request handlers never wait on a connectivity check.
+sf_breaker = CircuitBreaker(on_recover=lambda: sync_wakeup.set())  # Recovery flushes the sync backlog right away
+SF_PROBE_TIMEOUT_SECONDS = 5  # A blackholed connection fails the probe instead of hanging the monitor
+
+def probe_salesforce():
     """
-    Returns Salesforce connection object. Authenticates first if token is missing.
+    Health probe for the monitor thread: a trivial query against Salesforce itself.
+    A timeout raises, which the monitor records as a failure.
     """
-    global sf_access_token
-    if not sf_access_token:  # If no access token exists, authenticate first
-        authenticate_with_jwt()
+    sf_call(lambda sf: sf.query("SELECT Id FROM Daily_Report__c LIMIT 1", timeout=SF_PROBE_TIMEOUT_SECONDS))
+    return True
 
-    return Salesforce(instance_url=sf_instance_url, session_id=sf_access_token)  # Return Salesforce API object
+def sf_call_guarded(fn):
+    """
+    sf_call for request handlers: raises CircuitOpen at once while Salesforce is
+    offline, and feeds outages back to the breaker.
+    """
+    return sf_breaker.call(lambda: sf_call(fn), is_availability_error)
 
-# ======================================
-# 🔹 Check Salesforce Online Status
-# ======================================
 def is_salesforce_online():
     """
-    Returns True if Salesforce is reachable, otherwise False.
+    Returns True if Salesforce is currently considered reachable (no network I/O).
     """
-    try:
-        sf = get_sf_connection()  # Get Salesforce connection
-        sf.query("SELECT Id FROM Daily_Report__c LIMIT 1")  # Run simple query to test connectivity
-        return True  # Connection successful
-    except:
-        return False  # Any exception means Salesforce is unreachable
+    return sf_breaker.online
 
 @app.route('/<action>', methods=['POST', 'OPTIONS'])
 def handle_action(action):
@@ -143,339 +172,1038 @@ def handle_action(action):
     
     # 3. Live feed or invalid
     if action == "live_feed":
-        return process_live_feed() # Ensure this function exists elsewhere
+        return process_live_feed()
 
     return jsonify({"status": "error", "message": "Invalid Endpoint"}), 404
 
 COOLDOWN_AFTER_CHECKIN_SECONDS = 600   # 10 minutes before allowing auto checkout
 MIN_DEBOUNCE_SECONDS = 8               # short anti-bounce while face stays in frame
 
-recent_action_cache = {}               # { owner_id: {"ts": datetime_utc} }
-recent_cache_lock = threading.Lock() 
+MULTI_FACE_DEFAULT = False             # Requests opt in with {"multi_face": true}
+MULTI_FACE_MAX = 8                     # Faces encoded per frame in multi-face mode (bounds encoder cost)
+
+recent_action_cache = {}               # { (owner_id, action): {"ts": monotonic, "response": (payload, code)} }
+recent_cache_lock = threading.Lock()
+debounce_stats = {"suppressed": 0, "evicted": 0, "last_sweep": 0.0}
+
+def debounce_key(name, owner_id, action):
+    return (owner_id or name, action)
+
+def debounced_response(name, owner_id, action, now, today_str):
+    """
+    The response recorded for this person and action within the last
+    MIN_DEBOUNCE_SECONDS, marked "debounced", or None. An accepted action's
+    status is re-read from the log ("queued" may have become "synced" since).
+    Per process only: with several workers a repeat can still reach the
+    database, where the day-log guards keep it from being applied twice.
+    """
+    with recent_cache_lock:
+        entry = recent_action_cache.get(debounce_key(name, owner_id, action))
+        if entry is None or now - entry["ts"] >= MIN_DEBOUNCE_SECONDS:
+            return None
+        debounce_stats["suppressed"] += 1
+        payload, code = entry["response"]
+    if payload.get("status") in SYNC_RESPONSE_STATUSES:
+        payload = {**payload, "status": log_sync_status(today_str, name)}
+    return {**payload, "debounced": True}, code
+
+def remember_response(name, owner_id, action, response, now):
+    with recent_cache_lock:
+        recent_action_cache[debounce_key(name, owner_id, action)] = {"ts": now, "response": response}
+        # Sweep stale entries at most once per window so the cache only holds people seen recently
+        if now - debounce_stats["last_sweep"] >= MIN_DEBOUNCE_SECONDS:
+            stale = [k for k, v in recent_action_cache.items() if now - v["ts"] >= MIN_DEBOUNCE_SECONDS]
+            for k in stale:
+                del recent_action_cache[k]
+            debounce_stats["evicted"] += len(stale)
+            debounce_stats["last_sweep"] = now
+
+# ======================================
+# 🔹 Attendance State Machine
+# ======================================
+SYNC_RESPONSE_STATUSES = ("queued", "synced")  # Kiosk statuses for an accepted action
+
+def log_sync_status(today_str, name):
+    """
+    "synced" once today's log has nothing left in its Salesforce outbox, else "queued".
+    Read from this process's day state, so a sync finished by another worker shows as "queued".
+    """
+    doc = day_state.peek(today_str, name) or {}
+    return "synced" if doc.get("sync_status") == "synced" else "queued"
+
+SF_SUCCESS_MESSAGES = {
+    "checkin": "Welcome!", "checkout": "Goodbye!",
+    "breakin": "Enjoy your break!", "breakout": "Welcome back!",
+    "switch_remote": "Remote Mode Enabled"
+}
+
+def decide_attendance(name, action, daily, timestamp_beirut):
+    """
+    Pure decision step: resolve "auto" and apply the restriction guards against
+    today's log (or None). Returns (final_action, None) when a write should
+    happen, or (None, (response_dict, http_status)) when the request is refused.
+    """
+    final_action = action
+
+    if action == "auto":
+        if not daily or not daily.get("check_in"):
+            final_action = "checkin"
+        elif not daily.get("check_out"):
+            last_in = daily["check_in"]
+            if last_in.tzinfo is None:
+                last_in = pytz.utc.localize(last_in).astimezone(BEIRUT_TZ)
+            
+            elapsed = (timestamp_beirut - last_in).total_seconds()
+            
+            if elapsed < COOLDOWN_AFTER_CHECKIN_SECONDS:
+                remaining = int(COOLDOWN_AFTER_CHECKIN_SECONDS - elapsed)
+                return None, ({
+                    "status": "cooldown_wait", 
+                    "name": name, 
+                    "message": f"Locked: Try again in {remaining}s."
+                }, 200)
+            final_action = "checkout"
+        else:
+             return None, ({"status": "already_done", "name": name, "message": "Attendance complete today."}, 200)
+
+    # --- RESTRICTION GUARDS ---
+    
+    # Check In Guard
+    if final_action == "checkin" and daily and daily.get("check_in"):
+        return None, ({"status": "already_done", "name": name, "message": "Already checked in."}, 200)
+    
+    # Check Out / Remote Guard (NEW: Added check for previous check-in)
+    if final_action in ["checkout", "switch_remote"]:
+        if not daily or not daily.get("check_in"):
+            return None, ({"status": "error", "message": "Must Check In first!"}, 200)
+        if daily.get("check_out"):
+            return None, ({"status": "already_done", "name": name, "message": "Already checked out."}, 200)
+    
+    # Break In Guards
+    if final_action == "breakin":
+        if not daily or not daily.get("check_in"):
+             return None, ({"status": "error", "message": "Must Check In first!"}, 200)
+        if daily.get("check_out"):
+             return None, ({"status": "already_done", "name": name, "message": "Already checked out."}, 200)
+        if daily.get("break_in"):
+             return None, ({"status": "already_done", "name": name, "message": "Already started your break today."}, 200)
+
+    # Break Out Guards
+    if final_action == "breakout":
+        if not daily or not daily.get("check_in"):
+             return None, ({"status": "error", "message": "Must Check In first!"}, 200)
+        if not daily.get("break_in"):
+             return None, ({"status": "error", "message": "You haven't started a break yet!"}, 200)
+        if daily.get("break_out"):
+             return None, ({"status": "already_done", "name": name, "message": "Already ended your break today."}, 200)
+
+    return final_action, None
+
+def attendance_updates(name, final_action, daily, timestamp_beirut):
+    """
+    The $set fields for an accepted action, plus the scheduled checkout time
+    for switch_remote (None otherwise).
+    """
+    updates = {}
+    scheduled_checkout_dt = None
+
+    if final_action == "checkin":
+        updates["check_in"] = timestamp_beirut
+        updates["check_in_source"] = "office"
+    elif final_action == "breakin":
+        updates["break_in"] = timestamp_beirut
+    elif final_action == "breakout":
+        updates["break_out"] = timestamp_beirut
+    elif final_action == "checkout":
+        updates["check_out"] = timestamp_beirut
+        updates["check_in_source"] = "office"
+    elif final_action == "switch_remote":
+        # Remote Handoff Logic
+        emp = employee_directory.get(name) or {}
+        sched = emp.get("schedule", {}).get("weekly", {}).get(timestamp_beirut.strftime("%A"), {"end": "17:00"})
+        try:
+            h, m = map(int, sched.get("end", "17:00").split(":"))
+            scheduled_checkout_dt = timestamp_beirut.replace(hour=h, minute=m, second=0, microsecond=0)
+            updates["check_out"] = max(scheduled_checkout_dt, timestamp_beirut)
+        except:
+            updates["check_out"] = timestamp_beirut.replace(hour=17, minute=0)
+        updates["check_in_source"] = "continue_working_from_home"
+
+    # (Break Out auto-fill on checkout is applied inside the atomic write, see attendance_write)
+
+    updates["sync_status"] = "queued"  # The Salesforce push rides in the log's sync_outbox
+    return updates, scheduled_checkout_dt
+
+# Guards re-checked by Mongo at write time, so two kiosks (or workers) acting
+# on the same stale state cannot both apply: the loser matches nothing.
+ATTENDANCE_WRITE_GUARDS = {
+    "checkin": {"check_in": None},
+    "breakin": {"check_in": {"$ne": None}, "check_out": None, "break_in": None},
+    "breakout": {"check_in": {"$ne": None}, "break_in": {"$ne": None}, "break_out": None},
+    "checkout": {"check_in": {"$ne": None}, "check_out": None},
+    "switch_remote": {"check_in": {"$ne": None}, "check_out": None},
+}
+ATTENDANCE_WRITE_ATTEMPTS = 3  # Decide + write retries after a guard miss before giving up
+
+class AttendanceConflict(Exception):
+    """
+    The guarded write matched nothing: today's log changed since it was read.
+    """
+
+def attendance_write_op(name, owner_id, today_str, final_action, updates, entry):
+    """
+    (filter, update, upsert) persisting one accepted action atomically. A
+    check-in upserts the day document; the other actions only update an
+    existing one. Checkout / switch_remote also close an open break
+    (break_out = check_out) in the same update. The Salesforce outbox entry is
+    appended in that same write, so an accepted action can never lose its sync,
+    and its id is kept in write_ids (never drained) as proof the write landed.
+    """
+    query = {"employee_name": name, "date": today_str, **ATTENDANCE_WRITE_GUARDS[final_action]}
+
+    if final_action == "checkin":
+        on_insert = {
+            "employee_name": name, "OwnerId": owner_id, "date": today_str,
+            "break_in": None, "break_out": None, "check_out": None
+        }
+        update = {"$set": updates, "$setOnInsert": on_insert, "$push": {"sync_outbox": entry, "write_ids": entry["id"]}}
+    elif final_action in ["checkout", "switch_remote"]:
+        # Update pipeline: break_out is filled from the stored break_in/break_out, not from a cached read
+        update = [{"$set": {
+            **{key: {"$literal": value} for key, value in updates.items()},
+            "break_out": {"$cond": [
+                {"$and": [{"$ne": [{"$ifNull": ["$break_in", None]}, None]},
+                          {"$eq": [{"$ifNull": ["$break_out", None]}, None]}]},
+                {"$literal": updates["check_out"]},
+                "$break_out"
+            ]},
+            "sync_outbox": {"$concatArrays": [{"$ifNull": ["$sync_outbox", []]}, {"$literal": [entry]}]},
+            "write_ids": {"$concatArrays": [{"$ifNull": ["$write_ids", []]}, [entry["id"]]]}
+        }}]
+    else:
+        update = {"$set": updates, "$push": {"sync_outbox": entry, "write_ids": entry["id"]}}
+    return query, update, final_action == "checkin"
+
+def written_log(before, name, owner_id, today_str, final_action, updates, entry):
+    """
+    Today's log after an accepted write, given the log before it (None for a new check-in).
+    """
+    if before is None:
+        before = {"employee_name": name, "OwnerId": owner_id, "date": today_str,
+                  "check_in": None, "break_in": None, "break_out": None, "check_out": None}
+    after = {**before, **updates, "sync_outbox": (before.get("sync_outbox") or []) + [entry],
+             "write_ids": (before.get("write_ids") or []) + [entry["id"]]}
+    if final_action in ["checkout", "switch_remote"] and before.get("break_in") and not before.get("break_out"):
+        updates["break_out"] = after["break_out"] = updates["check_out"]  # Synced to Salesforce with the checkout
+    return after
+
+def attendance_write(name, owner_id, today_str, final_action, updates, entry):
+    """
+    Persist one accepted action in a single round trip and return today's log
+    as it is now. Raises AttendanceConflict when the guards no longer hold (the
+    unique (employee_name, date) index turns a second check-in's upsert into a
+    DuplicateKeyError).
+    """
+    query, update, upsert = attendance_write_op(name, owner_id, today_str, final_action, updates, entry)
+    try:
+        before = logs_col.find_one_and_update(query, update, upsert=upsert, return_document=ReturnDocument.BEFORE)
+    except DuplicateKeyError:
+        raise AttendanceConflict(name)
+
+    if before is None and final_action != "checkin":
+        raise AttendanceConflict(name)
+    return written_log(before, name, owner_id, today_str, final_action, updates, entry)
+
+def reload_day_log(today_str, name):
+    daily = logs_col.find_one({"employee_name": name, "date": today_str})
+    day_state.put(today_str, name, daily)
+    return daily
+
+def apply_attendance(name, owner_id, action, daily, today_str, timestamp_beirut, fresh=False):
+    """
+    Decide and persist one person's action against today's log (daily, possibly
+    cached; fresh=True if it was just read from Mongo). On a guard miss the log
+    is re-read and the decision re-made.
+    Returns ((final_action, updates, scheduled_checkout_dt), None) or (None, (payload, code)).
+    """
+    final_action, refusal = decide_attendance(name, action, daily, timestamp_beirut)
+    if refusal and not fresh:
+        # The cached log may predate an edit or delete made on another worker: confirm with Mongo
+        daily = reload_day_log(today_str, name)
+        final_action, refusal = decide_attendance(name, action, daily, timestamp_beirut)
+
+    for attempt in range(ATTENDANCE_WRITE_ATTEMPTS):
+        if attempt:
+            final_action, refusal = decide_attendance(name, action, daily, timestamp_beirut)
+        if refusal:
+            return None, refusal
+        updates, scheduled_checkout_dt = attendance_updates(name, final_action, daily, timestamp_beirut)
+        entry = outbox_entry(final_action, timestamp_beirut)
+        try:
+            day_state.put(today_str, name, attendance_write(name, owner_id, today_str, final_action, updates, entry))
+            return (final_action, updates, scheduled_checkout_dt), None
+        except AttendanceConflict:
+            daily = reload_day_log(today_str, name)
+
+    return None, ({"status": "error", "message": "Attendance is being updated elsewhere, please retry."}, 409)
+
+def load_day_logs(today_str, names):
+    return logs_col.find({"employee_name": {"$in": names}, "date": today_str})
+
+def apply_attendance_many(people, action, dailies, loaded, today_str, timestamp_beirut):
+    """
+    apply_attendance for several people (a multi-face frame): cached refusals
+    are confirmed with one query and every accepted action goes out in one
+    unordered bulk_write of the same guarded updates. Anyone whose guard no
+    longer held falls back to apply_attendance (re-read + retry).
+    dailies / loaded come from day_state.get_many. Returns [(applied, refusal)] in people order.
+    """
+    if len(people) == 1:
+        name, owner_id = people[0]
+        return [apply_attendance(name, owner_id, action, dailies.get(name), today_str, timestamp_beirut,
+                                 fresh=name in loaded)]
+
+    decisions = [decide_attendance(name, action, dailies.get(name), timestamp_beirut) for name, _ in people]
+    stale = [i for i, (_, refusal) in enumerate(decisions) if refusal and people[i][0] not in loaded]
+    if stale:
+        # Cached logs may predate an edit made on another worker: confirm those refusals with one query
+        docs = {d["employee_name"]: d for d in load_day_logs(today_str, [people[i][0] for i in stale])}
+        for i in stale:
+            name = people[i][0]
+            dailies[name] = docs.get(name)
+            day_state.put(today_str, name, dailies[name])
+            decisions[i] = decide_attendance(name, action, dailies[name], timestamp_beirut)
+
+    results = [None] * len(people)
+    writes = []
+    for i, ((name, owner_id), (final_action, refusal)) in enumerate(zip(people, decisions)):
+        if refusal:
+            results[i] = (None, refusal)
+            continue
+        updates, scheduled_checkout_dt = attendance_updates(name, final_action, dailies.get(name), timestamp_beirut)
+        entry = outbox_entry(final_action, timestamp_beirut)
+        writes.append((i, name, owner_id, final_action, updates, scheduled_checkout_dt, entry))
+    if not writes:
+        return results
+
+    ops = []
+    for i, name, owner_id, final_action, updates, _, entry in writes:
+        query, update, upsert = attendance_write_op(name, owner_id, today_str, final_action, updates, entry)
+        ops.append(UpdateOne(query, update, upsert=upsert))
+    try:
+        result = logs_col.bulk_write(ops, ordered=False)
+        landed = result.matched_count + result.upserted_count  # Each op matches at most one day log
+    except BulkWriteError:
+        landed = None  # A duplicate check-in upsert; the other ops still ran
+
+    if landed == len(ops):
+        for i, name, owner_id, final_action, updates, scheduled_checkout_dt, entry in writes:
+            day_state.put(today_str, name, written_log(dailies.get(name), name, owner_id, today_str, final_action, updates, entry))
+            results[i] = ((final_action, updates, scheduled_checkout_dt), None)
+        return results
+
+    # Some guards missed: an op landed iff its write id is on the log (the outbox
+    # entry itself may already have been pushed and dropped by the sync scheduler)
+    docs = {d["employee_name"]: d for d in load_day_logs(today_str, [w[1] for w in writes])}
+    for i, name, owner_id, final_action, updates, scheduled_checkout_dt, entry in writes:
+        doc = docs.get(name)
+        day_state.put(today_str, name, doc)
+        if doc and entry["id"] in (doc.get("write_ids") or []):
+            results[i] = ((final_action, updates, scheduled_checkout_dt), None)
+        else:
+            results[i] = apply_attendance(name, owner_id, action, doc, today_str, timestamp_beirut, fresh=True)
+    return results
+
+# ======================================
+# 🔹 Salesforce Outbox (sync off the request path)
+# ======================================
+# Every accepted action appends an entry to its day log's sync_outbox array in
+# the same atomic write, and the log goes to sync_status "queued". The sync
+# scheduler leases queued logs in batches and runs each batch through the bulk
+# reconciler (chunked SOQL + composite writes, see sf_reconcile.py), which
+# brings Daily_Report__c up to date with the log as a whole. The entries a
+# round covered are then dropped; the log becomes "synced" when nothing newer
+# was appended meanwhile, otherwise it stays queued for the next round.
+OUTBOX_LEASE_SECONDS = 60  # A claimed log is left to one worker (process) for this long
+OUTBOX_BATCH = 200         # Queued logs leased and reconciled per round
+
+# Per-record retry policy (outbox logs and pending logs alike): a failing record
+# is retried after an exponential backoff, and parked as "dead_letter" after
+# SYNC_MAX_ATTEMPTS so it stops costing API calls on every pass.
+SYNC_BACKOFF_BASE_SECONDS = 30
+SYNC_BACKOFF_MAX_SECONDS = 60 * 60
+SYNC_MAX_ATTEMPTS = 8
+SYNC_IDLE_SECONDS = 15  # Scheduler wake-up when nothing was enqueued (picks up records whose backoff ended)
+SYNC_SUCCESS_FIELDS = {"sync_attempts": 0, "sync_error": None, "next_sync_at": None}
+
+sync_wakeup = threading.Event()  # Set when new sync work is enqueued or Salesforce comes back
+
+def sf_time(ts):
+    """
+    Salesforce time string for a datetime or ISO string (naive values from Mongo are UTC).
+    """
+    if not ts:
+        return None
+    if isinstance(ts, str):
+        ts = datetime.datetime.fromisoformat(ts.replace("Z", "+00:00"))
+    if ts.tzinfo is None:
+        ts = pytz.utc.localize(ts)
+    return ts.astimezone(BEIRUT_TZ).strftime("%H:%M:%S.000Z")
+
+def outbox_entry(final_action, timestamp_beirut):
+    """
+    What the outbox keeps per action: the reconciler pushes the log's own fields,
+    so the entry only says which action is still unsent and when it happened.
+    """
+    return {"id": ObjectId(), "action": final_action, "ts": timestamp_beirut}
+
+def claim_queued_logs(now, limit=OUTBOX_BATCH):
+    """
+    Lease up to limit due queued logs, oldest day first (the lease is
+    next_sync_at pushed OUTBOX_LEASE_SECONDS ahead, stamped with this claim's
+    token). Three indexed round trips; logs another process leased in between
+    are simply not returned.
+    """
+    due = {"sync_status": "queued", "$or": [{"next_sync_at": None}, {"next_sync_at": {"$lte": now}}]}
+    ids = [doc["_id"] for doc in logs_col.find(due, {"_id": 1}).sort("date", 1).limit(limit)]
+    if not ids:
+        return []
+    token = ObjectId()
+    logs_col.update_many({"_id": {"$in": ids}, **due}, {"$set": {
+        "next_sync_at": now + datetime.timedelta(seconds=OUTBOX_LEASE_SECONDS), "sync_lease": token
+    }})
+    return list(logs_col.find({"_id": {"$in": ids}, "sync_lease": token}))
+
+def claimed(log, status):
+    """
+    Filter for writing a sync outcome back: the log must still be in status and,
+    for a leased queued log, still under this claim's lease. A claimer whose
+    lease ran out (and was taken over) leaves the log to the new one.
+    """
+    return {"_id": log["_id"], "sync_status": status, "sync_lease": log.get("sync_lease")}
+
+def outbox_done_op(log, now):
+    """
+    Drop the entries this round pushed (anything appended since stays queued)
+    and mark the log synced once its outbox is empty.
+    """
+    pushed = [entry["id"] for entry in log.get("sync_outbox") or []]
+    return UpdateOne(claimed(log, "queued"), [
+        {"$set": {"sync_outbox": {"$filter": {
+            "input": {"$ifNull": ["$sync_outbox", []]},
+            "cond": {"$not": [{"$in": ["$$this.id", {"$literal": pushed}]}]}
+        }}}},
+        {"$set": {
+            "sync_status": {"$cond": [{"$eq": [{"$size": "$sync_outbox"}, 0]}, "synced", "queued"]},
+            "last_sync_attempt": now, **SYNC_SUCCESS_FIELDS
+        }}
+    ])
+
+def sync_failure_fields(log, error, now, counted=True):
+    """
+    $set fields after a failed push: next retry time with exponential backoff,
+    or dead_letter once the record used up its attempts (at once for a record
+    that can never sync). counted=False for Salesforce availability errors:
+    not this record's fault, so they do not use up its attempts.
+    """
+    if isinstance(error, InvalidSyncRecord):
+        attempts = SYNC_MAX_ATTEMPTS
+    else:
+        attempts = (log.get("sync_attempts") or 0) + (1 if counted else 0)
+    fields = {"sync_attempts": attempts, "sync_error": str(error), "last_sync_attempt": now}
+    if attempts >= SYNC_MAX_ATTEMPTS:
+        fields["sync_status"] = "dead_letter"
+        fields["next_sync_at"] = None
+        print(f"☠️ Sync dead-lettered for {log.get('employee_name')} on {log.get('date')} after {attempts} attempts: {error}")
+    else:
+        delay = min(SYNC_BACKOFF_MAX_SECONDS, SYNC_BACKOFF_BASE_SECONDS * 2 ** max(0, attempts - 1))
+        fields["next_sync_at"] = now + datetime.timedelta(seconds=delay)
+    return fields
+
+def reconcile_batch(logs, status, now):
+    """
+    Run claimed logs (sync_status "queued" or legacy "pending") through the bulk
+    reconciler and write every log's outcome (synced, or backoff / dead letter)
+    back in one bulk_write. Returns the number of logs synced.
+    Only Salesforce availability errors count toward the circuit breaker; a
+    batch that Salesforce refused for its content is split in halves until the
+    offending log is isolated, so one bad record cannot hold up the rest.
+    """
+    try:
+        outcomes = reconcile_logs(sf_call, logs, sf_time)
+    except Exception as e:
+        if is_availability_error(e):
+            print(f"❌ Salesforce unavailable, {len(logs)} {status} logs will retry: {e}")
+            sf_breaker.record_failure(e)
+            logs_col.bulk_write([
+                UpdateOne(claimed(log, status), {"$set": sync_failure_fields(log, e, now, counted=False)}) for log in logs
+            ], ordered=False)
+            return 0
+        if len(logs) > 1:
+            mid = len(logs) // 2
+            return reconcile_batch(logs[:mid], status, now) + reconcile_batch(logs[mid:], status, now)
+        outcomes = [(logs[0], False, e)]
+    else:
+        sf_breaker.record_success()
+
+    ops = []
+    for log, ok, error in outcomes:
+        if not ok:
+            print(f"❌ Salesforce sync FAILED for {log.get('employee_name', 'User')} on {log.get('date')}: {error}")
+            ops.append(UpdateOne(claimed(log, status), {"$set": sync_failure_fields(log, error, now)}))
+        elif status == "queued":
+            ops.append(outbox_done_op(log, now))
+        else:
+            ops.append(UpdateOne(claimed(log, status),
+                                 {"$set": {"sync_status": "synced", "last_sync_attempt": now, **SYNC_SUCCESS_FIELDS}}))
+    if ops:
+        logs_col.bulk_write(ops, ordered=False)
+    if status == "queued":
+        for log in (log for log, ok, _ in outcomes if ok):  # Kiosk replays now answer "synced"
+            day_state.outbox_done(log.get("date"), log.get("employee_name"), {e["id"] for e in log.get("sync_outbox") or []})
+    return sum(ok for _, ok, _ in outcomes)
+
+def drain_outbox():
+    """
+    Reconcile due queued logs in leased batches while Salesforce is up. A
+    failing log backs off on its own; the others keep going. Returns the number of logs synced.
+    """
+    synced = 0
+    while sf_breaker.online:
+        now = datetime.datetime.now(datetime.timezone.utc)
+        logs = claim_queued_logs(now)
+        if not logs:
+            break
+        synced += reconcile_batch(logs, "queued", now)
+    if synced:
+        print(f"✅ Outbox: {synced} queued logs synced to Salesforce.")
+    return synced
+
+def sync_scheduler_loop():
+    """
+    The one background sync loop, started with the app. Wakes as soon as work
+    is enqueued (or Salesforce recovers), otherwise every SYNC_IDLE_SECONDS,
+    and runs the outbox push and the pending-log reconciliation.
+    """
+    print("📢 Sync Scheduler: Active.")
+    while True:
+        sync_wakeup.wait(SYNC_IDLE_SECONDS)
+        sync_wakeup.clear()
+        if not sf_breaker.online:
+            continue  # The health monitor's half-open trial wakes us when Salesforce is back
+        try:
+            drain_outbox()
+            sync_pending_logs()
+        except Exception as e:
+            print(f"⚠️ Sync scheduler error: {e}")
+
+def record_attendance_many(people, action):
+    """
+    Apply the same action for several recognized people (e.g. everyone in one
+    frame): today's logs come from the day-state cache (one query for anyone
+    not cached) and the accepted actions go out as guarded atomic writes (one
+    bulk_write for several people) that also queue their Salesforce pushes;
+    nothing here waits on Salesforce.
+    people is a list of (name, owner_id); returns [(response_dict, http_status)] in the same order.
+    A person who got an answer for the same action within MIN_DEBOUNCE_SECONDS
+    gets that answer again, without touching Mongo or Salesforce.
+    """
+    # 2b. Time Setup (Standardized Beirut Time)
+    timestamp_beirut = datetime.datetime.now(BEIRUT_TZ)
+    today_str = timestamp_beirut.strftime("%Y-%m-%d")
+
+    # 3. Debounce (repeat frames of someone still standing at the kiosk)
+    now = time.monotonic()
+    results = [debounced_response(name, owner_id, action, now, today_str) for name, owner_id in people]
+    pending = [i for i, r in enumerate(results) if r is None]
+    if not pending:
+        return results
+
+    # 4. Logic Restrictions & Auto-Mode (today's state from the day cache; one read for anyone not cached yet)
+    names = [people[i][0] for i in pending]
+    dailies, loaded = day_state.get_many(today_str, names, load_day_logs)
+
+    # 5. Local Database Persistence (guarded atomic writes: one round trip for one person, one bulk_write for several)
+    accepted = []
+    outcomes = apply_attendance_many([people[i] for i in pending], action, dailies, loaded, today_str, timestamp_beirut)
+    for i, (applied, refusal) in zip(pending, outcomes):
+        name, owner_id = people[i]
+        if refusal:
+            results[i] = refusal
+            continue
+        accepted.append((i, name, owner_id, *applied))
+
+    # 6. Salesforce Sync: queued in the same write, pushed by the outbox worker (status from the written log)
+    for i, name, owner_id, final_action, updates, scheduled_checkout_dt in accepted:
+        results[i] = ({
+            "status": log_sync_status(today_str, name),
+            "name": name,
+            "action": final_action,
+            "message": SF_SUCCESS_MESSAGES.get(final_action, "Attendance Recorded")
+        }, 200)
+    if accepted:
+        sync_wakeup.set()
+
+    for i in pending:
+        name, owner_id = people[i]
+        remember_response(name, owner_id, action, results[i], now)
+
+    return results
+
+def record_attendance(name, owner_id, action):
+    """
+    Apply one recognized person's action (checkin, checkout, breakin, breakout,
+    auto, switch_remote) to today's log and sync it to Salesforce.
+    Returns (response_dict, http_status) so single-frame and batch endpoints share it.
+    """
+    return record_attendance_many([(name, owner_id)], action)[0]
+
 # ======================================
 # 🔹 FULL REWRITTEN PROCESS_FACE (FINAL)
 # ======================================
 def process_face(action):
-    global sync_thread_started
-    global recent_cache_lock
-
     print("\n" + "="*40)
     print(f"🚀 TERMINAL START | Action: {action}")
     print("="*40)
 
     try:
-        # 1. Parse Image
-        data = request.get_json()
-        if not data or "image" not in data:
+        # 1. Parse Image (raw JPEG body, multipart upload, or legacy JSON data URL)
+        image_bytes, data = read_frame_upload()
+        if not image_bytes:
             return jsonify({"status": "error", "message": "No image data provided"}), 400
 
-        image_data = data["image"].split(",")[1]
-        image_bytes = base64.b64decode(image_data)
-        np_arr = np.frombuffer(image_bytes, np.uint8)
-        frame = cv2.imdecode(np_arr, cv2.IMREAD_COLOR)
-        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        multi_face = str(data.get("multi_face", MULTI_FACE_DEFAULT)).lower() in ("1", "true")
 
-        # 2. Recognition Logic
-        face_locations = face_recognition.face_locations(rgb_frame, model="hog")
+        # 2. Recognition Logic (detect on a downscaled copy, encode at full resolution, in a pool worker;
+        #    a face seen moments ago by the same camera reuses its cached encoding/match)
+        max_faces = MULTI_FACE_MAX if multi_face else 1
+        camera_id = request.headers.get("X-Camera-Id") or data.get("camera_id") or request.remote_addr
+        face_locations, matches = recognize_kiosk_frame(camera_id, image_bytes, max_faces)
+        if face_locations is None:
+            return jsonify({"status": "error", "message": "Invalid image data"}), 400
         if not face_locations:
             return jsonify({"status": "error", "message": "No face detected"}), 400
 
-        encodings = face_recognition.face_encodings(rgb_frame, face_locations)
-        if not encodings:
-            return jsonify({"status": "error", "message": "Encoding failed"}), 400
-        
-        face_encoding = encodings[0]
-        name, owner_id, threshold = "Unknown", None, 0.45
+        if multi_face:
+            return process_faces_in_frame(matches, action)
 
-        for i, known in enumerate(known_face_encodings):
-            dist = np.linalg.norm(face_encoding - known)
-            if dist < threshold:
-                name = known_face_names[i]
-                owner_id = known_face_owner_ids[i]
-                threshold = dist
+        match = matches[0]
 
-        if name == "Unknown":
+        if match is None:
             return jsonify({"status": "error", "message": "Face not recognized"}), 401
 
-        # 3. Time Setup (Standardized Beirut Time)
-        timestamp_beirut = datetime.datetime.now(BEIRUT_TZ)
-        today_str = timestamp_beirut.strftime("%Y-%m-%d")
-
-        # 4. Logic Restrictions & Auto-Mode
-        final_action = action
-        daily = logs_col.find_one({"employee_name": name, "date": today_str})
-
-        if action == "auto":
-            if not daily or not daily.get("check_in"):
-                final_action = "checkin"
-            elif not daily.get("check_out"):
-                last_in = daily["check_in"]
-                if last_in.tzinfo is None:
-                    last_in = pytz.utc.localize(last_in).astimezone(BEIRUT_TZ)
-                
-                elapsed = (timestamp_beirut - last_in).total_seconds()
-                
-                if elapsed < COOLDOWN_AFTER_CHECKIN_SECONDS:
-                    remaining = int(COOLDOWN_AFTER_CHECKIN_SECONDS - elapsed)
-                    return jsonify({
-                        "status": "cooldown_wait", 
-                        "name": name, 
-                        "message": f"Locked: Try again in {remaining}s."
-                    })
-                final_action = "checkout"
-            else:
-                 return jsonify({"status": "already_done", "name": name, "message": "Attendance complete today."})
+        name, owner_id = match.name, match.owner_id
 
-        # --- RESTRICTION GUARDS ---
-        
-        # Check In Guard
-        if final_action == "checkin" and daily and daily.get("check_in"):
-            return jsonify({"status": "already_done", "name": name, "message": "Already checked in."})
-        
-        # Check Out / Remote Guard (NEW: Added check for previous check-in)
-        if final_action in ["checkout", "switch_remote"]:
-            if not daily or not daily.get("check_in"):
-                return jsonify({"status": "error", "message": "Must Check In first!"})
-            if daily.get("check_out"):
-                return jsonify({"status": "already_done", "name": name, "message": "Already checked out."})
-        
-        # Break In Guards
-        if final_action == "breakin":
-            if not daily or not daily.get("check_in"):
-                 return jsonify({"status": "error", "message": "Must Check In first!"})
-            if daily.get("break_in"):
-                 return jsonify({"status": "already_done", "name": name, "message": "Already started your break today."})
-
-        # Break Out Guards
-        if final_action == "breakout":
-            if not daily or not daily.get("check_in"):
-                 return jsonify({"status": "error", "message": "Must Check In first!"})
-            if not daily.get("break_in"):
-                 return jsonify({"status": "error", "message": "You haven't started a break yet!"})
-            if daily.get("break_out"):
-                 return jsonify({"status": "already_done", "name": name, "message": "Already ended your break today."})
-
-        # 5. Local Database Persistence
-        if not daily:
-            daily_data = {
-                "employee_name": name, "OwnerId": owner_id, "date": today_str,
-                "check_in": None, "break_in": None, "break_out": None, "check_out": None,
-                "check_in_source": None, "sync_status": "pending"
-            }
-            logs_col.insert_one(daily_data)
-            daily = logs_col.find_one({"employee_name": name, "date": today_str})
-
-        updates = {}
-        scheduled_checkout_dt = None
-
-        if final_action == "checkin":
-            updates["check_in"] = timestamp_beirut
-            updates["check_in_source"] = "office"
-        elif final_action == "breakin":
-            updates["break_in"] = timestamp_beirut
-        elif final_action == "breakout":
-            updates["break_out"] = timestamp_beirut
-        elif final_action == "checkout":
-            updates["check_out"] = timestamp_beirut
-            updates["check_in_source"] = "office"
-        elif final_action == "switch_remote":
-            # Remote Handoff Logic
-            emp = employees_col.find_one({"name": name}) or {}
-            sched = emp.get("schedule", {}).get("weekly", {}).get(timestamp_beirut.strftime("%A"), {"end": "17:00"})
-            try:
-                h, m = map(int, sched.get("end", "17:00").split(":"))
-                scheduled_checkout_dt = timestamp_beirut.replace(hour=h, minute=m, second=0, microsecond=0)
-                updates["check_out"] = max(scheduled_checkout_dt, timestamp_beirut)
-            except:
-                updates["check_out"] = timestamp_beirut.replace(hour=17, minute=0)
-            updates["check_in_source"] = "continue_working_from_home"
-
-        # --- FIX: Auto-fill Break Out if missing during Checkout ---
-        if final_action in ["checkout", "switch_remote"]:
-            # If user has a break_in recorded BUT no break_out yet
-            if daily and daily.get("break_in") and not daily.get("break_out"):
-                updates["break_out"] = updates.get("check_out")
-        
-        updates["sync_status"] = "pending"
-        logs_col.update_one({"_id": daily["_id"]}, {"$set": updates})
+        payload, code = record_attendance(name, owner_id, action)
+        return jsonify(payload), code
 
-        # 6. Network Handling & Salesforce Sync
-        def is_online():
-            try:
-                socket.create_connection(("8.8.8.8", 53), timeout=2)
-                return True
-            except: return False
+    except PoolBusy:
+        return jsonify({"status": "error", "message": "Server busy, please retry"}), 503
+    except Exception as e:
+        traceback.print_exc()
+        return jsonify({"status": "error", "message": "Terminal Error"}), 500
 
-        active_online = is_online()
-        sync_status = "offline"
-        user_message = f"Local: {final_action.replace('_', ' ').capitalize()} recorded offline."
+def process_faces_in_frame(matches, action):
+    """
+    Multi-face mode: run the attendance state machine for every recognized
+    person in the frame (one bulk write). matches has one entry per face.
+    """
 
-        if active_online:
-            try:
-                sf = get_sf_connection()
-                query = f"SELECT Id, Check_In__c, Check_Out__c FROM Daily_Report__c WHERE OwnerId = '{owner_id}' AND Date__c = {today_str} LIMIT 1"
-                results = sf.query(query)
-
-                def fmt_time(ts):
-                    return ts.astimezone(BEIRUT_TZ).strftime("%H:%M:%S.000Z")
-
-                time_str_sf = fmt_time(scheduled_checkout_dt if (final_action == "switch_remote") else timestamp_beirut)
-
-                up_payload = {}
-                if results["totalSize"] > 0:
-                    record = results["records"][0]
-                    record_id = record["Id"]
-                    sf_in = record.get("Check_In__c")
-
-                    if final_action in ["checkout", "switch_remote"]:
-                        current_in = sf_in or (fmt_time(timestamp_beirut) if final_action == "checkin" else None)
-                        if current_in and time_str_sf <= current_in:
-                            corrected_dt = timestamp_beirut + datetime.timedelta(minutes=1)
-                            time_str_sf = fmt_time(corrected_dt)
-                        
-                        up_payload["Check_Out__c"] = time_str_sf
-                        
-                        # Sync the auto-filled break_out to Salesforce
-                        if updates.get("break_out"):
-                            up_payload["Break_Out__c"] = fmt_time(updates["break_out"])
-                    
-                    elif final_action == "checkin": up_payload["Check_In__c"] = time_str_sf
-                    elif final_action == "breakin": up_payload["Break_In__c"] = time_str_sf
-                    elif final_action == "breakout": up_payload["Break_Out__c"] = time_str_sf
+    people, seen = [], set()
+    for match in matches:
+        if match is not None and match.name not in seen:  # The same person twice in one frame counts once
+            seen.add(match.name)
+            people.append((match.name, match.owner_id))
+    unrecognized = sum(m is None for m in matches)
 
-                    if up_payload:
-                        sf.Daily_Report__c.update(record_id, up_payload)
-                else:
-                    new_rec = {"OwnerId": owner_id, "Date__c": today_str}
-                    if final_action == "checkin": new_rec["Check_In__c"] = time_str_sf
-                    else: new_rec["Check_Out__c"] = time_str_sf
-                    sf.Daily_Report__c.create(new_rec)
-                
-                logs_col.update_one({"_id": daily["_id"]}, {"$set": {"sync_status": "synced"}})
-                sync_status = "synced"
+    if not people:
+        return jsonify({"status": "error", "message": "Face not recognized", "faces": len(matches)}), 401
 
-                msg_map = {
-                    "checkin": "Welcome!", "checkout": "Goodbye!",
-                    "breakin": "Enjoy your break!", "breakout": "Welcome back!",
-                    "switch_remote": "Remote Mode Enabled"
-                }
-                user_message = msg_map.get(final_action, "Attendance Recorded")
+    results = []
+    for (name, _), (payload, code) in zip(people, record_attendance_many(people, action)):
+        results.append({"name": name, **payload, "code": code})
 
-            except Exception as e:
-                print(f"⚠️ SF Live Sync failed: {e}")
-                active_online = False
+    return jsonify({
+        "status": "success",
+        "faces": len(matches),
+        "unrecognized": unrecognized,
+        "results": results
+    })
 
-        if not active_online:
-            if not sync_thread_started:
-                threading.Thread(target=sync_pending_logs, daemon=True).start()
-                sync_thread_started = True
+# ======================================
+# 🔹 Embedding Cache (repeat kiosk frames)
+# ======================================
+embedding_cache = EmbeddingCache()
 
-        return jsonify({
-            "status": sync_status,
-            "name": name,
-            "action": final_action,
-            "message": user_message
-        })
+def recognize_kiosk_frame(camera_id, image_bytes, max_faces):
+    """
+    (boxes, matches) for one kiosk frame; boxes is None if the image is invalid.
+    Faces whose crop hash matches one this camera saw within the cache TTL skip
+    the encoder; their cached match is reused unless the gallery changed since,
+    in which case only the cached encoding is re-matched.
+    """
+    gallery, generation = gallery_store.snapshot_with_generation()
+    cached = embedding_cache.candidates(camera_id)
+    args = (image_bytes, max_faces, [(h, e.box) for h, e in cached.items()], EMBED_HASH_MAX_DISTANCE, EMBED_MIN_IOU)
+    if recognition_pool is not None:
+        boxes, hashes, encodings, hits = recognition_pool.analyze_cached(*args)
+    else:
+        boxes, hashes, encodings, hits = analyze_frame_cached(*args)
+    if boxes is None:
+        return None, []
+
+    matches = [None] * len(boxes)
+    fresh = list(encodings)  # Encoded this frame
+    stale = []               # Cache hits computed against an older gallery
+    for i, h in hits.items():
+        entry = cached[h]
+        if entry.generation == generation:
+            matches[i] = entry.match
+            embedding_cache.touch(camera_id, h)
+        else:
+            encodings[i] = entry.encoding
+            stale.append((i, entry))
+    embedding_cache.record(len(hits), len(fresh), len(hits) - len(stale))
+
+    to_match = fresh + [i for i, _ in stale]
+    if to_match:
+        for i, match in zip(to_match, gallery.best_matches([encodings[i] for i in to_match])):
+            matches[i] = match
+        for i in fresh:
+            embedding_cache.store(camera_id, hashes[i], boxes[i], encodings[i], matches[i], generation)
+        for i, entry in stale:  # Re-matched, but the encoding keeps its original expiry
+            embedding_cache.store(camera_id, entry.hash, entry.box, entry.encoding, matches[i], generation,
+                                  expires=entry.expires)
+    return boxes, matches
+
+RAW_IMAGE_TYPES = ("image/jpeg", "image/png", "application/octet-stream")
+
+def read_frame_upload():
+    """
+    The uploaded frame as raw image bytes plus its options dict, from any of:
+    - a raw body (Content-Type: image/jpeg), options in the query string,
+    - multipart/form-data with an "image" file, options in the form fields,
+    - the original JSON body {"image": "data:image/jpeg;base64,..."}.
+    The binary paths skip JSON parsing and base64 decoding entirely.
+    Returns (None, {}) if no image was sent.
+    """
+    if request.mimetype in RAW_IMAGE_TYPES:
+        return request.get_data(cache=False), request.args.to_dict()
 
+    if request.mimetype == "multipart/form-data":
+        upload = request.files.get("image")
+        options = {**request.args.to_dict(), **request.form.to_dict()}
+        return (upload.read() if upload else None), options
+
+    data = request.get_json(silent=True)
+    if not data or "image" not in data:
+        return None, {}
+    return image_bytes_from_data_url(data["image"]), data
+
+def image_bytes_from_data_url(image_str):
+    """
+    Raw image bytes from a "data:image/jpeg;base64,..." URL (or bare base64).
+    """
+    if "," in image_str:
+        image_str = image_str.split(",", 1)[1]
+    return base64.b64decode(image_str)
+
+# ======================================
+# 🔹 Live Feed (continuous camera streams with face tracking)
+# ======================================
+LIVE_FEED_ACTION = "auto"              # Action recorded when a tracked face is first identified
+LIVE_STREAM_MIMETYPE = "application/x-frame-stream"  # Body: repeated [4-byte big-endian length][JPEG bytes]
+LIVE_MAX_FRAME_BYTES = 5 * 1024 * 1024
+
+live_trackers = TrackerRegistry()
+
+def live_feed_step(tracker, image_bytes):
+    """
+    One frame of a camera stream. Detection runs every frame; face_encodings and
+    the gallery match only run for new tracks or tracks whose identity is due
+    for re-checking (unknown, near the threshold, or periodically).
+    """
+    gallery = gallery_store.snapshot()
+    with tracker.lock:
+        prev_boxes, due = tracker.plan(gallery.threshold)
+        if recognition_pool is not None:
+            boxes, assignment, encodings = recognition_pool.analyze_tracked(image_bytes, prev_boxes, due)
+        else:
+            boxes, assignment, encodings = analyze_tracked_frame(image_bytes, prev_boxes, due)
+        if boxes is None:
+            return {"status": "error", "message": "Invalid image data"}
+
+        # One vectorized match for every face that was (re-)encoded this frame
+        encoded_idx = list(encodings)
+        matches = gallery.best_matches([encodings[i] for i in encoded_idx])
+        tracks = tracker.update(boxes, assignment, dict(zip(encoded_idx, matches)))
+        frame_no = tracker.frame_count
+
+        to_record = []
+        for track, _, _ in tracks:
+            if track.name and not track.recorded:
+                track.recorded = True
+                to_record.append(track)
+
+    attendance = {}
+    if to_record:
+        people = [(t.name, t.owner_id) for t in to_record]
+        for track, (payload, _) in zip(to_record, record_attendance_many(people, LIVE_FEED_ACTION)):
+            attendance[track.id] = payload
+
+    return {
+        "status": "success",
+        "frame": frame_no,
+        "encoded": len(encoded_idx),
+        "tracks": [{
+            "track_id": track.id,
+            "box": list(track.box),
+            "name": track.name,
+            "distance": track.distance,
+            "encoded": was_encoded,
+            "new": is_new,
+            **({"attendance": attendance[track.id]} if track.id in attendance else {})
+        } for track, was_encoded, is_new in tracks]
+    }
+
+def read_stream_frames(stream):
+    """
+    Yield frames from a length-prefixed body as they arrive (zero length or EOF ends it).
+    """
+    while True:
+        header = stream.read(4)
+        if len(header) < 4:
+            return
+        (size,) = struct.unpack(">I", header)
+        if size == 0 or size > LIVE_MAX_FRAME_BYTES:
+            return
+        frame = stream.read(size)
+        if len(frame) < size:
+            return
+        yield frame
+
+def process_live_feed():
+    """
+    POST /live_feed. Camera id comes from the X-Camera-Id header or ?camera_id=.
+    - Content-Type application/x-frame-stream: a chunked stream of length-prefixed
+      JPEG frames; the response streams one NDJSON result line per frame.
+    - Any single-frame upload (raw JPEG, multipart, JSON): one result, tracks kept
+      between requests of the same camera.
+    """
+    camera_id = request.headers.get("X-Camera-Id") or request.args.get("camera_id") or request.remote_addr
+    tracker = live_trackers.get(camera_id)
+
+    try:
+        if request.mimetype == LIVE_STREAM_MIMETYPE:
+            stream = request.stream
+
+            def generate():
+                for image_bytes in read_stream_frames(stream):
+                    try:
+                        result = live_feed_step(tracker, image_bytes)
+                    except PoolBusy:
+                        result = {"status": "busy", "message": "Frame skipped, server busy"}
+                    yield json.dumps(result, default=str) + "\n"
+
+            return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
+        image_bytes, _ = read_frame_upload()
+        if not image_bytes:
+            return jsonify({"status": "error", "message": "No image data provided"}), 400
+        result = live_feed_step(tracker, image_bytes)
+        return jsonify(result), (400 if result["status"] == "error" else 200)
+
+    except PoolBusy:
+        return jsonify({"status": "error", "message": "Server busy, please retry"}), 503
+    except Exception as e:
+        traceback.print_exc()
+        return jsonify({"status": "error", "message": "Terminal Error"}), 500
+
+# ======================================
+# 🔹 Batch Recognition (multi-frame / multi-camera gateways)
+# ======================================
+BATCH_MAX_FRAMES = 32  # Upper bound on frames per batch request
+BATCH_ACTIONS = ["checkin", "checkout", "breakin", "breakout", "auto", "switch_remote"]
+
+frame_executor = ThreadPoolExecutor(max_workers=os.cpu_count() or 4)  # Fallback when the process pool is disabled
+
+# dlib detection/encoding is CPU-bound and holds the GIL, so it runs in a pool of
+# long-lived worker processes (models loaded once per worker at startup)
+recognition_pool = RecognitionPool() if RECOGNITION_POOL_SIZE and not (WORKER_IMPORT or is_pool_worker()) else None
+
+def analyze_frames(frames_bytes, max_faces=None):
+    """
+    (boxes, encodings) for each frame, analyzed in parallel. A None entry in
+    frames_bytes (undecodable upload) comes back as (None, []).
+    Raises PoolBusy when the recognition queue is full.
+    """
+    valid = [i for i, b in enumerate(frames_bytes) if b is not None]
+    if recognition_pool is not None:
+        analyzed = recognition_pool.analyze_many([frames_bytes[i] for i in valid], max_faces)
+    else:
+        analyzed = list(frame_executor.map(lambda i: analyze_frame(frames_bytes[i], max_faces), valid))
+
+    results = [(None, [])] * len(frames_bytes)
+    for i, result in zip(valid, analyzed):
+        results[i] = result
+    return results
+
+@app.route("/batch_recognize", methods=["POST"])
+def batch_recognize():
+    """
+    Recognize N frames in one request, either as JSON:
+    {"action": "auto", "frames": [{"image": "<data url>", "camera_id": "gate-1", "action": "checkin"?}, ...]}
+    or as multipart/form-data with one "frames" file per frame and optional
+    parallel "camera_id" / "frame_action" fields (binary, no base64).
+
+    Frames are analyzed in parallel, every resulting encoding is matched in one
+    vectorized gallery call, and each recognized person then goes through the
+    same attendance state machine as process_face. Results come back per frame.
+    """
+    try:
+        if request.mimetype == "multipart/form-data":
+            uploads = request.files.getlist("frames")
+            camera_ids = request.form.getlist("camera_id")
+            actions = request.form.getlist("frame_action")
+            frames = [{
+                "camera_id": camera_ids[i] if i < len(camera_ids) else None,
+                **({"action": actions[i]} if i < len(actions) else {})
+            } for i in range(len(uploads))]
+            default_action = request.form.get("action", "auto")
+        else:
+            data = request.get_json(silent=True) or {}
+            uploads = None
+            frames = data.get("frames") or []
+            default_action = data.get("action", "auto")
+
+        if not frames:
+            return jsonify({"status": "error", "message": "No frames provided"}), 400
+        if len(frames) > BATCH_MAX_FRAMES:
+            return jsonify({"status": "error", "message": f"At most {BATCH_MAX_FRAMES} frames per batch"}), 400
+
+        # 1. Decode / detect / encode all frames in parallel (recognition pool workers)
+        def frame_bytes(i):
+            if uploads is not None:
+                return uploads[i].read() or None
+            try:
+                return image_bytes_from_data_url(frames[i].get("image", ""))
+            except (ValueError, TypeError):
+                return None  # Bad base64
+
+        analyzed = analyze_frames([frame_bytes(i) for i in range(len(frames))], max_faces=1)
+
+        # 2. One vectorized gallery match for every frame that produced an encoding
+        encoded = [i for i, (_, encs) in enumerate(analyzed) if encs]
+        matches = gallery_store.snapshot().best_matches([analyzed[i][1][0] for i in encoded])
+        match_by_frame = dict(zip(encoded, matches))
+
+        # 3. Attendance state machine per frame (once per person+action within the batch)
+        results = []
+        decided = {}
+        for i, frame in enumerate(frames):
+            action = frame.get("action", default_action)
+            boxes, encodings = analyzed[i]
+            result = {"index": i, "camera_id": frame.get("camera_id")}
+
+            if action not in BATCH_ACTIONS:
+                payload, code = {"status": "error", "message": "Invalid action"}, 400
+            elif boxes is None:
+                payload, code = {"status": "error", "message": "Invalid image data"}, 400
+            elif not boxes:
+                payload, code = {"status": "error", "message": "No face detected"}, 400
+            elif not encodings:
+                payload, code = {"status": "error", "message": "Encoding failed"}, 400
+            elif match_by_frame.get(i) is None:
+                payload, code = {"status": "error", "message": "Face not recognized"}, 401
+            else:
+                match = match_by_frame[i]
+                key = (match.name, action)
+                if key not in decided:  # Same person on two cameras: record once, report to both frames
+                    decided[key] = record_attendance(match.name, match.owner_id, action)
+                payload, code = decided[key]
+
+            result.update(payload)
+            result["code"] = code
+            results.append(result)
+
+        return jsonify({"status": "success", "results": results})
+
+    except PoolBusy:
+        return jsonify({"status": "error", "message": "Server busy, please retry"}), 503
     except Exception as e:
         traceback.print_exc()
         return jsonify({"status": "error", "message": "Terminal Error"}), 500
+
+@app.route("/stats", methods=["GET"])
+def get_stats():
+    """
+    Runtime counters for the recognition hot path.
+    """
+    return jsonify({
+        "embedding_cache": embedding_cache.stats(),
+        "debounce": {
+            "suppressed": debounce_stats["suppressed"],
+            "evicted": debounce_stats["evicted"],
+            "entries": len(recent_action_cache),
+            "window_seconds": MIN_DEBOUNCE_SECONDS
+        },
+        "live_cameras": len(live_trackers),
+        "salesforce": sf_breaker.stats(),
+        "gallery_version": gallery_store.version,
+        "directory": {"employees": len(employee_directory), "version": employee_directory.version}
+    })
+
+SYNC_PASS_MAX_LOGS = 2000  # Pending logs reconciled per pass (bounds memory after a long outage)
+
 def sync_pending_logs():
     """
-    Background sync for all attendance actions.
+    One reconciliation pass over due logs left "pending" by older versions
+    (new actions go through the outbox): one bulk pass fetches the matching
+    Daily_Report__c rows with chunked SOQL (OwnerId IN ... and the date range)
+    and writes only the missing fields back through composite create/update
+    calls (reconcile_batch). Returns the number of logs synced.
     Standardized to Beirut Time strings to fix 'Check out > Check in' validation error.
     """
-    print("📢 Background Sync Thread: Active.")
-    while True:
-        try:
-            # 1. Connectivity Guard
-            def is_online():
-                try:
-                    socket.create_connection(("8.8.8.8", 53), timeout=3)
-                    return True
-                except OSError:
-                    return False
-
-            if not is_online():
-                time.sleep(60)
-                continue
-
-            # 2. Fetch Pending Records
-            pending_logs = list(logs_col.find({"sync_status": "pending"}))
-            if not pending_logs:
-                time.sleep(60)
-                continue
-
-            for log in pending_logs:
-                try:
-                    sf = get_sf_connection()
-                    owner_id = log["OwnerId"]
-                    log_date = log["date"] # YYYY-MM-DD
-                    emp_name = log.get("employee_name", "User")
-
-                    # 3. Standardized Formatter (Fixed: Raw Beirut time string)
-                    def fmt_time(ts):
-                        if not ts: return None
-                        if isinstance(ts, str):
-                            ts = datetime.datetime.fromisoformat(ts.replace("Z", "+00:00"))
-                        return ts.astimezone(BEIRUT_TZ).strftime("%H:%M:%S.000Z")
-
-                    # 4. Query SF
-                    query = f"SELECT Id, Check_In__c, Check_Out__c, Break_In__c, Break_Out__c FROM Daily_Report__c WHERE OwnerId = '{owner_id}' AND Date__c = {log_date} LIMIT 1"
-                    results = sf.query(query)
-
-                    update_data = {}
-                    if results["totalSize"] > 0:
-                        record = results["records"][0]
-                        record_id = record["Id"]
-                        sf_in_str = record.get('Check_In__c')
-
-                        # Map all fields if present in Mongo but missing in SF
-                        if log.get("check_in") and not sf_in_str:
-                            update_data["Check_In__c"] = fmt_time(log["check_in"])
-                        
-                        if log.get("break_in") and not record.get("Break_In__c"):
-                            update_data["Break_In__c"] = fmt_time(log["break_in"])
-                        
-                        if log.get("break_out") and not record.get("Break_Out__c"):
-                            update_data["Break_Out__c"] = fmt_time(log["break_out"])
-
-                        if log.get("check_out") and not record.get("Check_Out__c"):
-                            out_str = fmt_time(log["check_out"])
-                            current_in = update_data.get("Check_In__c") or sf_in_str
-                            # FORCE VALIDATION: Ensure string Out > In
-                            if current_in and out_str <= current_in:
-                                corrected_dt = log["check_out"] + datetime.timedelta(minutes=2)
-                                out_str = fmt_time(corrected_dt)
-                            update_data["Check_Out__c"] = out_str
-
-                        if update_data:
-                            sf.Daily_Report__c.update(record_id, update_data)
-                    else:
-                        # New Record Logic
-                        new_rec = {"OwnerId": owner_id, "Date__c": log_date}
-                        if log.get("check_in"): new_rec["Check_In__c"] = fmt_time(log["check_in"])
-                        if log.get("check_out"): new_rec["Check_Out__c"] = fmt_time(log["check_out"])
-                        if log.get("break_in"): new_rec["Break_In__c"] = fmt_time(log["break_in"])
-                        if log.get("break_out"): new_rec["Break_Out__c"] = fmt_time(log["break_out"])
-                        sf.Daily_Report__c.create(new_rec)
-
-                    # 5. Finalize Local Record
-                    logs_col.update_one({"_id": log["_id"]}, {
-                        "$set": {
-                            "sync_status": "synced",
-                            "last_sync_attempt": datetime.datetime.now(BEIRUT_TZ)
-                        }
-                    })
-                    print(f"✅ Background Sync SUCCESS for {emp_name}")
-
-                except Exception as e:
-                    print(f"❌ Background Sync FAILED for {emp_name}: {e}")
-                    logs_col.update_one({"_id": log["_id"]}, {"$set": {"last_sync_attempt": datetime.datetime.now(BEIRUT_TZ)}})
-
-            time.sleep(60)
-        except Exception as e:
-            time.sleep(60)
+    now = datetime.datetime.now(datetime.timezone.utc)
+    pending_logs = list(logs_col.find(
+        {"sync_status": "pending", "$or": [{"next_sync_at": None}, {"next_sync_at": {"$lte": now}}]}
+    ).limit(SYNC_PASS_MAX_LOGS))
+    if not pending_logs:
+        return 0
+
+    # Bulk Reconcile (a handful of API calls for the whole batch) + per-record write-back
+    synced = reconcile_batch(pending_logs, "pending", now)
+    print(f"✅ Background Sync: {synced}/{len(pending_logs)} pending logs reconciled.")
+    return synced
+
+@app.route("/sync/dead_letters", methods=["GET"])
+def get_dead_letters():
+    """
+    Logs whose Salesforce sync gave up after SYNC_MAX_ATTEMPTS, newest day first.
+    """
+    try:
+        cursor = logs_col.find({"sync_status": "dead_letter"}, {
+            "employee_name": 1, "OwnerId": 1, "date": 1, "sync_attempts": 1,
+            "sync_error": 1, "last_sync_attempt": 1, "sync_outbox": 1
+        }).sort("date", -1).limit(500)
+
+        dead_letters = []
+        for log in cursor:
+            dead_letters.append({
+                "id": str(log["_id"]),
+                "employee_name": log.get("employee_name"),
+                "OwnerId": log.get("OwnerId"),
+                "date": log.get("date"),
+                "attempts": log.get("sync_attempts", 0),
+                "error": log.get("sync_error"),
+                "last_attempt": log["last_sync_attempt"].isoformat() if log.get("last_sync_attempt") else None,
+                "unsent_actions": [e.get("action") for e in log.get("sync_outbox") or []]
+            })
+        return jsonify({"status": "success", "count": len(dead_letters), "dead_letters": dead_letters})
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+TODAY_LOG_FIELDS = {"employee_name": 1, "check_in": 1, "break_in": 1, "break_out": 1, "check_out": 1}
 
 @app.route("/attendance/today", methods=["GET"])
 def get_today_attendance():
@@ -483,33 +1211,33 @@ def get_today_attendance():
         today_beirut = datetime.datetime.now(BEIRUT_TZ).date()
         today_str = today_beirut.strftime("%Y-%m-%d")
 
-        # Fetch today's logs
-        logs_cursor = logs_col.find({"date": today_str})
-        
+        # Fetch today's logs (only the fields the board shows)
+        logs = list(logs_col.find({"date": today_str}, TODAY_LOG_FIELDS))
+
+        # 1. Departments come from the in-memory employee directory (no employee queries)
+
+        # Helper to force Beirut Timezone conversion (Timing logic kept unchanged)
+        def fmt_time(val):
+            if not val: return None
+            try:
+                if isinstance(val, datetime.datetime):
+                    dt = val
+                else:
+                    dt = datetime.datetime.fromisoformat(str(val).replace("Z", "+00:00"))
+                
+                if dt.tzinfo is None:
+                    dt = pytz.utc.localize(dt)
+                
+                return dt.astimezone(BEIRUT_TZ).isoformat()
+            except Exception as e:
+                print(f"Time format error: {e}")
+                return None
+
         output = []
-        for row in logs_cursor:
-            # 1. NEW: Fetch Department from the Employees collection
-            # We look up the employee by name to get their specific department
-            employee = employees_col.find_one({"name": row.get("employee_name")})
+        for row in logs:
+            employee = employee_directory.get(row.get("employee_name"))
             emp_dept = employee.get("department", "Unassigned") if employee else "Unassigned"
 
-            # Helper to force Beirut Timezone conversion (Timing logic kept unchanged)
-            def fmt_time(val):
-                if not val: return None
-                try:
-                    if isinstance(val, datetime.datetime):
-                        dt = val
-                    else:
-                        dt = datetime.datetime.fromisoformat(str(val).replace("Z", "+00:00"))
-                    
-                    if dt.tzinfo is None:
-                        dt = pytz.utc.localize(dt)
-                    
-                    return dt.astimezone(BEIRUT_TZ).isoformat()
-                except Exception as e:
-                    print(f"Time format error: {e}")
-                    return None
-
             # 2. ADDED "department" to the response dictionary
             output.append({
                 "id": str(row["_id"]),
@@ -538,20 +1266,21 @@ def delete_attendance(record_id):
         # 2. Try to Delete from Salesforce
         sf_deleted = False
         try:
-            sf = get_sf_connection() # Your SF connection helper
             
             # Query to find the specific Salesforce ID
             query = f"SELECT Id FROM Daily_Report__c WHERE OwnerId = '{owner_id}' AND Date__c = {log_date} LIMIT 1"
-            results = sf.query(query)
+            results = sf_call_guarded(lambda sf: sf.query(query))
             
             if results["totalSize"] > 0:
                 sf_id = results["records"][0]["Id"]
-                sf.Daily_Report__c.delete(sf_id)
+                sf_call_guarded(lambda sf: sf.Daily_Report__c.delete(sf_id))
                 print(f"✅ Deleted from Salesforce: {sf_id}")
                 sf_deleted = True
             else:
                 print("⚠️ Record not found in Salesforce, skipping remote delete.")
 
+        except CircuitOpen:
+            print("⚠️ Salesforce offline, skipping remote delete.")
         except Exception as e:
             print(f"⚠️ Salesforce Delete Failed (Offline?): {e}")
             # We continue to delete locally even if SF fails, 
@@ -559,6 +1288,7 @@ def delete_attendance(record_id):
 
         # 3. Delete from MongoDB
         logs_col.delete_one({"_id": ObjectId(record_id)})
+        day_state.invalidate(log.get("employee_name"), log_date)
 
         msg = "Deleted locally & from Salesforce" if sf_deleted else "Deleted locally (SF unavailable)"
         return jsonify({"status": "success", "message": msg}), 200
@@ -617,18 +1347,18 @@ def edit_attendance(record_id):
 
         # 4. Update MongoDB
         logs_col.update_one({"_id": ObjectId(record_id)}, {"$set": mongo_updates})
+        day_state.invalidate(log.get("employee_name"), log_date)
 
         # 5. Update Salesforce
         sf_status = "Skipped"
         try:
-            sf = get_sf_connection()
             # Find the SF ID first
             query = f"SELECT Id FROM Daily_Report__c WHERE OwnerId = '{owner_id}' AND Date__c = {log_date} LIMIT 1"
-            results = sf.query(query)
+            results = sf_call_guarded(lambda sf: sf.query(query))
 
             if results["totalSize"] > 0:
                 sf_id = results["records"][0]["Id"]
-                sf.Daily_Report__c.update(sf_id, sf_updates)
+                sf_call_guarded(lambda sf: sf.Daily_Report__c.update(sf_id, sf_updates))
                 sf_status = "Updated"
                 print(f"✅ Updated Salesforce Record: {sf_id}")
             else:
@@ -636,6 +1366,9 @@ def edit_attendance(record_id):
                 print("⚠️ SF Record not found, cannot update remote.")
                 sf_status = "Not Found on SF"
 
+        except CircuitOpen:
+            print("⚠️ Salesforce offline, skipping remote update.")
+            sf_status = "Skipped (Offline)"
         except Exception as e:
             print(f"⚠️ Salesforce Update Failed: {e}")
             sf_status = "Failed (Offline)"
@@ -665,104 +1398,20 @@ def get_attendance_report():
     try:
         print(f"\n--- 🗓️ ANALYTICS DEBUG: {start_str} to {end_str} ---")
 
-        # 1. Fetch Data
-        all_employees = list(employees_col.find({}, {"name": 1, "department": 1, "schedule": 1}))
-        range_logs = list(logs_col.find({"date": {"$gte": start_str, "$lte": end_str}}))
-        
-        print(f"📊 Found {len(range_logs)} total logs in this range.")
-
-        now_beirut = datetime.datetime.now(BEIRUT_TZ)
-        report = []
-
-        # 2. Date Parsing
+        # 1. Date Parsing
         start_date = datetime.datetime.strptime(start_str, "%Y-%m-%d").date()
         end_date = datetime.datetime.strptime(end_str, "%Y-%m-%d").date()
-        delta = end_date - start_date
 
-        for i in range(delta.days + 1):
-            current_date = start_date + timedelta(days=i)
-            current_date_str = current_date.strftime("%Y-%m-%d")
-            day_name = current_date.strftime("%A")
+        # 2. Fetch Data
+        all_employees = employee_directory.all()
+        range_logs = list(logs_col.find({"date": {"$gte": start_str, "$lte": end_str}}))
 
-            for emp in all_employees:
-                emp_name_db = emp.get("name", "").strip()
-                
-                # --- FIX 1: CASE-INSENSITIVE MATCHING ---
-                # This finds the log regardless of "Samir" vs "samir"
-                emp_log = next((x for x in range_logs if 
-                                x.get("employee_name", "").strip().lower() == emp_name_db.lower() and 
-                                x.get("date") == current_date_str), None)
-                
-                # --- FIX 2: SUPPORT ALL FIELD VARIATIONS ---
-                check_in_val = None
-                if emp_log:
-                    # Tries 'check_in' then 'checkin' then 'timestamp'
-                    check_in_val = emp_log.get("check_in") or emp_log.get("checkin") or emp_log.get("timestamp")
-
-                status = "Unknown"
-                check_in_time = None
-                minutes_late = 0
-                minutes_early = 0
-
-                # Schedule Setup
-                schedule = emp.get("schedule", {}).get("weekly", {})
-                default_day = {"active": True, "start": "09:00", "end": "17:00"}
-                if day_name in ["Saturday", "Sunday"]: default_day["active"] = False
-                day_config = schedule.get(day_name, default_day)
-                shift_start_str = day_config.get("start", "09:00")
-
-                if check_in_val:
-                    status = "Present"
-                    try:
-                        # Convert to Beirut Aware Datetime
-                        if isinstance(check_in_val, str):
-                            dt = datetime.datetime.fromisoformat(check_in_val.replace("Z", "+00:00"))
-                        else:
-                            dt = check_in_val
-                        
-                        if dt.tzinfo is None:
-                            check_in_time = pytz.utc.localize(dt).astimezone(BEIRUT_TZ)
-                        else:
-                            check_in_time = dt.astimezone(BEIRUT_TZ)
-
-                        # Calculate Lateness
-                        sh_h, sh_m = map(int, shift_start_str.split(":"))
-                        shift_start_dt = BEIRUT_TZ.localize(datetime.datetime.combine(current_date, datetime.time(sh_h, sh_m)))
-
-                        if check_in_time > shift_start_dt:
-                            diff = (check_in_time - shift_start_dt).total_seconds() / 60
-                            minutes_late = int(diff) if diff > 5 else 0
-                        else:
-                            minutes_early = int((shift_start_dt - check_in_time).total_seconds() / 60)
-
-                    except Exception as e:
-                        print(f"⚠️ Time Calc Error for {emp_name_db}: {e}")
-                else:
-                    # Absent Logic
-                    is_today = current_date == now_beirut.date()
-                    if current_date > now_beirut.date():
-                        status = "Scheduled"
-                    elif not day_config.get("active", True):
-                        status = "Off Day"
-                    else:
-                        if is_today:
-                            sh_h, sh_m = map(int, shift_start_str.split(":"))
-                            shift_start_dt = BEIRUT_TZ.localize(datetime.datetime.combine(current_date, datetime.time(sh_h, sh_m)))
-                            status = "Absent" if now_beirut > shift_start_dt else "Scheduled"
-                        else:
-                            status = "Absent"
-
-                report.append({
-                    "id": f"{str(emp['_id'])}_{current_date_str}",
-                    "date": current_date_str,
-                    "name": emp_name_db,
-                    "department": emp.get("department", "Unassigned"),
-                    "status": status,
-                    "shift": f"{shift_start_str} - {day_config.get('end', '17:00')}",
-                    "check_in": check_in_time.isoformat() if check_in_time else None,
-                    "minutes_late": minutes_late,
-                    "minutes_early": minutes_early
-                })
+        print(f"📊 Found {len(range_logs)} total logs in this range.")
+
+        # 3. Build (hash-indexed logs, per-employee weekly shifts: linear in rows)
+        report = build_attendance_report(
+            all_employees, range_logs, start_date, end_date, datetime.datetime.now(BEIRUT_TZ), BEIRUT_TZ
+        )
 
         return jsonify({"status": "success", "data": report})
 
@@ -777,27 +1426,20 @@ def get_attendance_report():
 @app.route("/employees", methods=["GET"])
 def get_employees():
     try:
-        # Fetch names and sort them
-        employees = list(employees_col.find({}, {"name": 1, "_id": 0}).sort("name", 1))
-        employee_names = [e["name"] for e in employees]
+        # Names from the employee directory, sorted
+        employee_names = employee_directory.names()
         return jsonify({"status": "success", "employees": employee_names})
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
 
-from datetime import timedelta
-import pytz
-
 # 🔹 REGISTRATION & MANAGEMENT ENDPOINTS
 # ======================================
 
 @app.route("/get_employee", methods=["GET"])
 def get_employee():
     try:
-        cursor = employees_col.find({}, {
-            "_id": 1, "name": 1, "OwnerId": 1, "department": 1
-        })
         employees = []
-        for doc in cursor:
+        for doc in employee_directory.all():
             employees.append({
                 "id": str(doc["_id"]),
                 "name": doc.get("name", "Unknown"),
@@ -809,99 +1451,139 @@ def get_employee():
         print(f"❌ Error fetching employees: {e}")
         return jsonify({"status": "error", "message": str(e)}), 500
 
-@app.route("/attendance/filter", methods=["GET"])
-def filter_attendance():
-  try:
-    emp_name_filter = request.args.get("employee_name", "all")
+FILTER_LOG_FIELDS = {
+    "_id": 0, "employee_name": 1, "date": 1, "check_in": 1, "check_out": 1,
+    "break_in": 1, "break_out": 1, "check_in_source": 1, "source": 1
+}
+
+# Paginated JSON (?limit=&cursor=) and the streaming export
+FILTER_PAGE_MAX = 1000      # Largest ?limit= page
+EXPORT_CHUNK_ROWS = 500     # Rows per chunk written to the export stream
+EXPORT_FORMATS = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+
+def encode_filter_cursor(row):
+    """
+    Opaque keyset cursor: the (date, employee_name) of the last row on a page.
+    """
+    return base64.urlsafe_b64encode(json.dumps([row["date"], row["employee_name"]]).encode("utf-8")).decode("ascii")
+
+def decode_filter_cursor(token):
+    date_str, name = json.loads(base64.urlsafe_b64decode(token.encode("ascii")).decode("utf-8"))
+    datetime.datetime.strptime(date_str, "%Y-%m-%d")  # Rejects a tampered cursor
+    return date_str, name
+
+def filter_rows(emp_name_filter, start_date, end_date, after=None):
+    """
+    Generator of /attendance/filter rows, date by date, employees sorted by name.
+    Logs stream from a date-sorted cursor (the (employee_name, date) index for
+    one employee, the date index otherwise), so only one day is held in memory.
+    after=(date, name) resumes right after that row.
+    """
+    # Employees from the in-memory directory; never the face encodings
+    if emp_name_filter == "all":
+        employees = sorted(employee_directory.all(), key=lambda emp: emp["name"])
+    else:
+        employee = employee_directory.get(emp_name_filter)
+        employees = [employee] if employee else []
+
+    after_name = None
+    if after is not None:
+        after_date = datetime.datetime.strptime(after[0], "%Y-%m-%d").date()
+        if after_date >= start_date:
+            start_date, after_name = after_date, after[1]
+
+    log_query = {"date": {"$gte": start_date.strftime("%Y-%m-%d"), "$lte": end_date.strftime("%Y-%m-%d")}}
+    if emp_name_filter != "all":
+        log_query["employee_name"] = emp_name_filter
+    cursor = logs_col.find(log_query, FILTER_LOG_FIELDS).sort("date", 1)
+    try:
+        yield from iter_filter_rows(employees, cursor, start_date, end_date, BEIRUT_TZ, after_name)
+    finally:
+        cursor.close()  # Pages stop early: don't leave the server-side cursor open
+
+def parse_filter_args():
+    """
+    (employee_name, start_date, end_date) from the query string, or raises ValueError.
+    """
     start_str = request.args.get("start_date")
     end_str = request.args.get("end_date")
-
     if not start_str or not end_str:
-      return jsonify({"status": "error", "message": "Dates are required"}), 400
-
-    # 1. Date Range Setup
+        raise ValueError("Dates are required")
     start_date = datetime.datetime.strptime(start_str, "%Y-%m-%d").date()
     end_date = datetime.datetime.strptime(end_str, "%Y-%m-%d").date()
-    delta = end_date - start_date
-    date_list = [(start_date + timedelta(days=i)).strftime("%Y-%m-%d") for i in range(delta.days + 1)]
+    return request.args.get("employee_name", "all"), start_date, end_date
 
-    # 2. Fetch Data
-    all_employees = list(employees_col.find({}))
-    # Fetch logs based on the 'date' string field
-    range_logs = list(logs_col.find({"date": {"$gte": start_str, "$lte": end_str}}))
-
-    summaries = []
-
-    # 3. Main Loop (APK Logic adaptation)
-    for current_date in date_list:
-      day_name = datetime.datetime.strptime(current_date, "%Y-%m-%d").strftime("%A")
+@app.route("/attendance/filter", methods=["GET"])
+def filter_attendance():
+    """
+    Without ?limit= the whole range as one list (as before). With ?limit=N, one
+    page plus next_cursor (null on the last page); pass it back as ?cursor=.
+    """
+    try:
+        try:
+            emp_name_filter, start_date, end_date = parse_filter_args()
+            limit = request.args.get("limit")
+            cursor = request.args.get("cursor")
+            after = decode_filter_cursor(cursor) if cursor else None
+            limit = None if limit is None else max(1, min(int(limit), FILTER_PAGE_MAX))
+        except (ValueError, TypeError) as e:
+            return jsonify({"status": "error", "message": str(e) or "Invalid filter parameters"}), 400
+
+        rows = filter_rows(emp_name_filter, start_date, end_date, after)
+        if limit is None:
+            return jsonify({"status": "success", "logs": list(rows)})
+
+        page = list(itertools.islice(rows, limit + 1))
+        rows.close()
+        next_cursor = encode_filter_cursor(page[limit - 1]) if len(page) > limit else None
+        return jsonify({"status": "success", "logs": page[:limit], "next_cursor": next_cursor})
 
-      for emp in all_employees:
-        name = emp.get("name")
-        if emp_name_filter != "all" and name != emp_name_filter:
-          continue
+    except Exception as e:
+        print(f"Filter error: {e}")
+        return jsonify({"status": "error", "message": str(e)}), 500
 
-        # Get Schedule Config
-        schedule = emp.get("schedule", {}).get("weekly", {})
-        day_cfg = schedule.get(day_name, {"active": True, "is_remote": False})
-        
-        # Default off if weekend and not in schedule
-        if day_name in ["Saturday", "Sunday"] and day_name not in schedule:
-          day_cfg = {"active": False, "is_remote": False}
+@app.route("/attendance/export", methods=["GET"])
+def export_attendance():
+    """
+    Stream the filter rows as a download: ?format=csv (spreadsheet columns) or
+    ?format=ndjson (one filter row per line). Rows are written as the log cursor
+    advances, so memory stays flat for any range.
+    """
+    export_format = request.args.get("format", "csv").lower()
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({"status": "error", "message": f"Unsupported format: {export_format}"}), 400
+    try:
+        emp_name_filter, start_date, end_date = parse_filter_args()
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+
+    def generate():
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        if export_format == "csv":
+            writer.writerow(EXPORT_CSV_HEADER)
+        try:
+            for count, row in enumerate(filter_rows(emp_name_filter, start_date, end_date), 1):
+                if export_format == "csv":
+                    writer.writerow(export_csv_row(row, BEIRUT_TZ))
+                else:
+                    buf.write(json.dumps(row) + "\n")
+                if count % EXPORT_CHUNK_ROWS == 0:
+                    yield buf.getvalue()
+                    buf.seek(0)
+                    buf.truncate(0)
+            yield buf.getvalue()
+        except Exception as e:
+            # Headers are already sent: log it and end the stream (the download comes up short)
+            print(f"❌ Export error: {e}")
 
-        is_active = day_cfg.get("active", True)
-        is_remote_sched = day_cfg.get("is_remote", False)
-        
-        # Find log
-        log = next((l for l in range_logs if l["employee_name"] == name and l["date"] == current_date), None)
-
-        # 4. DETERMINE WORKED METHOD (The critical logic)
-        worked_method = "Absent"
-        if not is_active:
-          worked_method = "OFF"
-        elif log:
-          # Retrieve the source metadata we saved during check-in/out
-          # We check for both 'check_in_source' and 'source' just in case
-          log_source = log.get("check_in_source") or log.get("source") or ""
-          
-          if "continue_working_from_home" in log_source or "remote" in log_source:
-            worked_method = "Continued From Home"
-          elif log.get("check_in"):
-            worked_method = "Office"
-        elif is_remote_sched:
-          worked_method = "Scheduled Remote Day"
-
-        # 5. Time Formatter (Beirut Time Fix)
-        def fmt(key):
-          val = log.get(key) if log else None
-          if not val: return None
-          try:
-            if isinstance(val, datetime.datetime):
-              # Convert UTC Mongo Object to Beirut Time
-              if val.tzinfo is None:
-                val = pytz.utc.localize(val)
-              return val.astimezone(BEIRUT_TZ).isoformat()
-            return val # Return as is if already string
-          except:
-            return None
+    filename = f"Attendance_Summary_{start_date}_to_{end_date}.{export_format}"
+    return Response(
+        stream_with_context(generate()),
+        mimetype=EXPORT_FORMATS[export_format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
 
-        summaries.append({
-          "employee_name": name,
-          "date": current_date,
-          "check_in": fmt("check_in"),
-          "check_out": fmt("check_out"),
-          "break_in": fmt("break_in"),
-          "break_out": fmt("break_out"),
-          "is_remote_today": is_remote_sched or (worked_method == "Continued From Home"),
-          "is_off_today": not is_active,
-          "worked_method": worked_method,
-        })
-
-    return jsonify({"status": "success", "logs": summaries})
-
-  except Exception as e:
-    print(f"Filter error: {e}")
-    return jsonify({"status": "error", "message": str(e)}), 500
 @app.route("/schedule", methods=["GET"])
 def get_schedule():
     name = request.args.get("name")
@@ -910,7 +1592,7 @@ def get_schedule():
 
     print(f"🔎 Fetching schedule for: {name}") # LOG
 
-    employee = employees_col.find_one({"name": name}, {"_id": 0, "schedule": 1, "department": 1})
+    employee = employee_directory.get(name)
     
     if not employee:
         return jsonify({"status": "error", "message": "Employee not found"}), 404
@@ -951,18 +1633,24 @@ def update_schedule():
         print(json.dumps(new_schedule, indent=2)) 
         # ---------------------
 
-        result = employees_col.update_one(
+        updated = employees_col.find_one_and_update(
             {"name": name},
             {"$set": {
                 "schedule": new_schedule,
                 "department": department
-            }}
+            }},
+            projection=DIRECTORY_FIELDS,
+            return_document=ReturnDocument.AFTER
         )
 
-        if result.matched_count == 0:
+        if updated is None:
             print(f"❌ Employee {name} not found in DB")
             return jsonify({"status": "error", "message": "Employee not found"}), 404
 
+        # Update this process's directory now, and tell the other processes
+        employee_directory.upsert(updated)
+        publish_employee_change("meta", name)
+
         print("✅ Update Success")
         return jsonify({"status": "success", "message": "Profile updated successfully"})
     except Exception as e:
@@ -975,7 +1663,7 @@ def update_schedule():
 def delete_employee():
     """
     Deletes employee by Mongo _id + removes their face encoding.
-    Refreshes all face encodings after deletion.
+    Removes just that identity from the gallery and publishes the change to other processes.
     """
     try:
         data = request.json
@@ -985,16 +1673,18 @@ def delete_employee():
         if not emp_id:
             return jsonify({"status": "error", "message": "No employee ID provided"}), 400
 
-        # Delete from MongoDB
-        result = employees_col.delete_one({"_id": ObjectId(emp_id)})
+        # Delete from MongoDB (returning the stored name, which is the gallery key)
+        deleted = employees_col.find_one_and_delete({"_id": ObjectId(emp_id)}, {"name": 1})
 
-        if result.deleted_count == 0:
+        if not deleted:
             return jsonify({"status": "error", "message": "Employee not found"}), 404
 
         print(f"🗑 Deleted employee: {emp_name} ({emp_id})")
 
-        # Refresh loaded encodings
-        reload_face_data()
+        # Drop just this identity here, and tell the other processes
+        gallery_store.remove(deleted["name"])
+        employee_directory.remove(deleted["name"])
+        publish_employee_change("remove", deleted["name"])
 
         return jsonify({"status": "success", "message": f"{emp_name} deleted successfully"}), 200
 
@@ -1002,26 +1692,171 @@ def delete_employee():
         print(f"❌ Delete Error: {e}")
         return jsonify({"status": "error", "message": str(e)}), 500
 def reload_face_data():
-    global known_face_encodings, known_face_names, known_face_owner_ids
+    """
+    Full rebuild of the gallery from MongoDB. Only used as a fallback when the
+    change log cannot be replayed; normal edits go through apply_employee_changes.
+    """
+    # Read the stamp before the documents, so anything written during the load is re-applied by the poller
+    version = get_employees_version()
+    gallery_store.replace(build_face_gallery(employees_col.find({}, GALLERY_FACE_FIELDS)), version)
+    save_gallery_snapshot()
+
+    print(f"🔄 Refreshed face encodings: {len(gallery_store.snapshot())} employees loaded.")
+
+def save_gallery_snapshot():
+    try:
+        save_snapshot(gallery_store.snapshot(), GALLERY_SNAPSHOT_DIR, gallery_store.version)
+    except OSError as e:
+        print(f"⚠️ Could not write gallery snapshot: {e}")
+
+def load_face_gallery():
+    """
+    Startup load. Memory-maps the newest on-disk snapshot (shared page cache
+    across workers on this host) and replays the change log on top of it;
+    the full MongoDB scan only happens when there is no usable snapshot.
+    """
+    current = get_employees_version()
+    matcher, snap_version = load_snapshot(
+        GALLERY_SNAPSHOT_DIR, reduce=GALLERY_TEMPLATE_REDUCE, index=GALLERY_INDEX_MODE, nprobe=GALLERY_IVF_NPROBE
+    )
+
+    if matcher is not None and snap_version <= current:
+        gallery_store.replace(matcher, snap_version)
+        if snap_version == current or (apply_employee_changes() and gallery_store.version == current):
+            if gallery_store.version != snap_version:
+                save_gallery_snapshot()  # Next worker starts straight from this version
+            print(f"✅ Loaded {len(gallery_store.snapshot())} known faces from snapshot v{gallery_store.version}.")
+            return
+
+    reload_face_data()  # No snapshot, or it is too far behind the change log: rebuild and save one
+
+def read_employee_changes(local_version):
+    """
+    Change entries after local_version, oldest first, and whether that is all of them.
+    Only the contiguous prefix is returned; a writer may have bumped the stamp but not logged its entry yet.
+    """
+    changes = list(employee_changes_col.find({"version": {"$gt": local_version}}).sort("version", 1))
+    applied = []
+    for change in changes:
+        if change["version"] != local_version + len(applied) + 1:
+            break
+        applied.append(change)
+    return applied, len(applied) == len(changes)
+
+def apply_employee_changes(current=None):
+    """
+    Bring this process's gallery up to the shared version stamp by replaying
+    only the logged changes: one query for the change entries, one for the
+    affected employee documents.
+    """
+    local_version = gallery_store.version
+    if (get_employees_version() if current is None else current) <= local_version:
+        return True
+
+    applied, complete = read_employee_changes(local_version)
+    if not applied:
+        return False  # Entry not written yet, or the log was pruned past our version
+
+    # "meta" changes (schedule/department) leave the faces alone: just move the version
+    names = list({c["name"] for c in applied if c.get("op") != "meta"})
+    if not names:
+        gallery_store.advance(applied[-1]["version"])
+        return complete
+    docs = {d["name"]: d for d in employees_col.find({"name": {"$in": names}}, GALLERY_FACE_FIELDS)}
+
+    def edit(matcher):
+        # The document's current state wins, so replaying an older "upsert" after a delete is harmless
+        for name in names:
+            doc = docs.get(name)
+            if doc:
+                matcher = matcher.with_identity(name, doc.get("OwnerId"), templates_from_document(doc))
+            else:
+                matcher = matcher.without_identity(name)
+        return matcher
 
-    known_face_encodings = []
-    known_face_names = []
-    known_face_owner_ids = []
+    gallery_store.apply(edit, applied[-1]["version"])
+    print(f"🔄 Gallery v{applied[-1]['version']}: applied {len(applied)} change(s).")
+    return complete  # False if we stopped at a gap
 
-    for emp in employees_col.find({}):
-        encoding = pickle.loads(emp["face_encoding"])
-        known_face_encodings.append(encoding)
-        known_face_names.append(emp["name"])
-        known_face_owner_ids.append(emp.get("OwnerId"))
+# ======================================
+# 🔹 Employee Directory Sync
+# ======================================
+def load_employee_directory():
+    """
+    Full load of the employee directory (no face data, so this is cheap).
+    Used at startup and as the fallback when the change log cannot be replayed.
+    """
+    # Read the stamp before the documents, so anything written during the load is re-applied by the poller
+    version = get_employees_version()
+    employee_directory.replace(employees_col.find({}, DIRECTORY_FIELDS), version)
+    print(f"📇 Employee directory v{version}: {len(employee_directory)} employees.")
+
+def apply_directory_changes(current=None):
+    """
+    Bring the employee directory up to the shared version stamp: every change
+    op (including "meta") re-reads just the affected employees.
+    """
+    local_version = employee_directory.version
+    if (get_employees_version() if current is None else current) <= local_version:
+        return True
+
+    applied, complete = read_employee_changes(local_version)
+    if not applied:
+        return False
 
-    print(f"🔄 Refreshed face encodings: {len(known_face_encodings)} employees loaded.")
+    names = list({c["name"] for c in applied})
+    docs = {d["name"]: d for d in employees_col.find({"name": {"$in": names}}, DIRECTORY_FIELDS)}
+    employee_directory.apply(names, docs, applied[-1]["version"])
+    return complete
+
+def gallery_sync_loop():
+    """
+    Background poller: picks up employee changes made by other server processes
+    (faces and directory). One version stamp read per poll when nothing changed.
+    """
+    stalled_polls = 0
+    stalled_directory_polls = 0
+    while True:
+        time.sleep(GALLERY_POLL_SECONDS)
+        try:
+            current = get_employees_version()
+            stalled_polls = 0 if apply_employee_changes(current) else stalled_polls + 1
+            if stalled_polls >= GALLERY_GAP_MAX_POLLS:
+                print("⚠️ Gallery change log has a gap, doing a full reload.")
+                reload_face_data()
+                stalled_polls = 0
+
+            stalled_directory_polls = 0 if apply_directory_changes(current) else stalled_directory_polls + 1
+            if stalled_directory_polls >= GALLERY_GAP_MAX_POLLS:
+                print("⚠️ Directory change log has a gap, doing a full reload.")
+                load_employee_directory()
+                stalled_directory_polls = 0
+        except Exception as e:
+            print(f"⚠️ Gallery sync failed: {e}")
+
+def start_server_services():
+    """
+    Import-time startup of a server process (skipped in recognition workers).
+    """
+    # Indexes for every hot query (idempotent). The unique (employee_name, date) index
+    # also makes a concurrent second check-in fail instead of inserting a duplicate day log,
+    # so startup stops (MissingUniqueIndex) if it cannot be built.
+    ensure_indexes(db)
+    load_face_gallery()
+    load_employee_directory()
+    threading.Thread(target=gallery_sync_loop, daemon=True).start()
+    threading.Thread(target=run_health_monitor, args=(sf_breaker, probe_salesforce), daemon=True).start()
+    threading.Thread(target=sync_scheduler_loop, daemon=True).start()  # Outbox pushes + pending-log reconciliation
+
+if not WORKER_IMPORT:
+    start_server_services()
 
 # ... (Keep register_new_employee and others) ...
 @app.route("/register_new_employee", methods=["POST"])
 def register_new_employee():
     """
     Registers a new employee with:
-    1. Face Encodings (averaged from 5 photos)
+    1. Face Templates (one per usable photo, stored as raw float32)
     2. Salesforce OwnerId
     3. Department
     4. Default Professional Schedule
@@ -1061,7 +1896,8 @@ def register_new_employee():
         if not all_encodings:
             return jsonify({"status": "error", "message": "No faces detected. Please retake photos."}), 400
 
-        # 3. Average Encodings
+        # 3. Keep every photo as a template (capped), plus the legacy averaged encoding
+        templates = select_templates(all_encodings)
         mean_encoding = np.mean(all_encodings, axis=0)
         
         # 4. Define Default Professional Schedule
@@ -1075,14 +1911,21 @@ def register_new_employee():
         }
 
         # 5. Insert into MongoDB
-        employees_col.insert_one({
+        employee_doc = {
             "name": name,
-            "face_encoding": pickle.dumps(mean_encoding),
+            "face_encoding": pickle.dumps(mean_encoding),  # Legacy single encoding for older readers
+            "face_templates": encode_templates(templates),  # (T, 128) float32 bytes used by the matcher
+            "template_count": len(templates),
             "OwnerId": owner_id,
             "department": department, # <--- STORE DEPARTMENT
             "schedule": default_schedule
-        })
-        reload_face_data()
+        }
+        employees_col.insert_one(employee_doc)  # Sets employee_doc["_id"]
+
+        # Add just this identity here, and tell the other processes
+        gallery_store.upsert(name, owner_id, templates)
+        employee_directory.upsert({k: employee_doc[k] for k in DIRECTORY_FIELDS})
+        publish_employee_change("upsert", name)
 
         print(f"✅ Registered {name} successfully.")
         return jsonify({"status": "success", "message": "Employee registered successfully!"}), 200
@@ -1096,5 +1939,7 @@ def register_new_employee():
 # 🔹 Start Flask Server
 # ======================================
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=5000)
+    if recognition_pool is not None:
+        recognition_pool.start()  # Spawn workers and load dlib models before the first kiosk frame
+    app.run(host="0.0.0.0", port=5000, threaded=True)
 
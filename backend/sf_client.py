@@ -0,0 +1,153 @@
+import threading  # Single-flight token refresh
+import time  # Token age
+
+import jwt  # PyJWT for the JWT bearer assertion
+import requests  # Pooled keep-alive HTTP session
+from requests.adapters import HTTPAdapter
+from simple_salesforce import Salesforce
+from simple_salesforce.exceptions import SalesforceError, SalesforceExpiredSession
+
+# ======================================
+# 🔹 Salesforce Client Settings
+# ======================================
+SF_POOL_SIZE = 10                 # Keep-alive connections to the Salesforce instance (one per concurrent caller)
+SF_SESSION_SECONDS = 2 * 60 * 60  # Org session timeout; the JWT bearer flow does not return one
+SF_REFRESH_MARGIN = 0.1           # Refresh once 90% of the session lifetime has passed
+SF_TOKEN_TIMEOUT_SECONDS = 10     # Token endpoint request timeout
+SF_REQUEST_TIMEOUT_SECONDS = 30   # Default (connect, read) timeout for every REST call on the pooled session
+
+
+class SalesforceAuthError(Exception):
+    """
+    The JWT bearer token request was refused.
+    """
+
+
+def is_availability_error(error):
+    """
+    True when an error means Salesforce itself cannot be used right now (network,
+    timeouts, 5xx, authentication, refused/limit-exceeded requests), as opposed to
+    a problem with the records sent (validation, malformed request, bad local data).
+    Only availability errors should count toward the circuit breaker.
+    """
+    if isinstance(error, (requests.exceptions.RequestException, SalesforceAuthError)):
+        return True
+    if isinstance(error, SalesforceError):
+        return error.status >= 500 or error.status in (401, 403)
+    return False
+
+
+class TimeoutSession(requests.Session):
+    """
+    requests.Session with a default timeout: simple_salesforce sends its REST
+    calls without one, so a dead connection would otherwise block forever.
+    A call that passes its own timeout keeps it.
+    """
+
+    def __init__(self, timeout):
+        super().__init__()
+        self.timeout = timeout
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        return super().request(method, url, **kwargs)
+
+
+class SalesforceClient:
+    """
+    One long-lived, thread-safe Salesforce connection for the whole process:
+    every call reuses the same pooled HTTP session, the private key is loaded
+    once, and the access token is refreshed shortly before it expires or when
+    Salesforce answers 401. Concurrent callers that find the token stale wait
+    for a single refresh instead of each authenticating.
+    """
+
+    def __init__(self, client_id, username, login_url, private_key_file,
+                 session_seconds=SF_SESSION_SECONDS, pool_size=SF_POOL_SIZE, timeout=SF_REQUEST_TIMEOUT_SECONDS):
+        self.client_id = client_id
+        self.username = username
+        self.login_url = login_url.rstrip("/")
+        self.private_key_file = private_key_file
+        self.session_seconds = session_seconds
+
+        self.http = TimeoutSession(timeout)
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=pool_size)
+        self.http.mount("https://", adapter)
+        self.http.mount("http://", adapter)
+
+        self._private_key = None
+        self._sf = None
+        self._issued_at = 0.0
+        self._lock = threading.Lock()
+        self.refreshes = 0
+
+    def _signing_key(self):
+        """
+        The private key, read and parsed on first use only.
+        """
+        if self._private_key is None:
+            with open(self.private_key_file, "rb") as f:
+                pem = f.read()
+            try:
+                from cryptography.hazmat.primitives.serialization import load_pem_private_key
+                self._private_key = load_pem_private_key(pem, password=None)
+            except ImportError:
+                self._private_key = pem  # PyJWT parses the PEM itself on every signature
+        return self._private_key
+
+    def _authenticate(self):
+        """
+        JWT bearer flow: returns (access_token, instance_url).
+        """
+        payload = {
+            "iss": self.client_id,  # Issuer: Salesforce client ID
+            "sub": self.username,  # Subject: Salesforce username
+            "aud": self.login_url,  # Audience: Salesforce login URL
+            "exp": int(time.time()) + 300  # Expiration: 5 minutes from now
+        }
+        assertion = jwt.encode(payload, self._signing_key(), algorithm="RS256")
+        response = self.http.post(
+            f"{self.login_url}/services/oauth2/token",
+            data={"grant_type": "urn:ietf:params:oauth:grant-type:jwt-bearer", "assertion": assertion},
+            timeout=SF_TOKEN_TIMEOUT_SECONDS
+        ).json()
+
+        if "access_token" not in response:
+            raise SalesforceAuthError(f"❌ JWT Authentication failed: {response}")
+        return response["access_token"], response["instance_url"]
+
+    def _fresh(self):
+        return self._sf is not None and time.time() - self._issued_at < self.session_seconds * (1 - SF_REFRESH_MARGIN)
+
+    def refresh(self, stale=None):
+        """
+        Authenticate again unless another thread already replaced the stale connection.
+        """
+        with self._lock:
+            if self._sf is not None and self._sf is not stale and self._fresh():
+                return self._sf
+            token, instance_url = self._authenticate()
+            self._sf = Salesforce(instance_url=instance_url, session_id=token, session=self.http)
+            self._issued_at = time.time()
+            self.refreshes += 1
+            print("✅ Salesforce JWT authentication successful!")
+            return self._sf
+
+    def connection(self):
+        """
+        The shared Salesforce API object, refreshed first if the token is about to expire.
+        """
+        sf = self._sf
+        if sf is not None and self._fresh():
+            return sf
+        return self.refresh(stale=sf)
+
+    def call(self, fn):
+        """
+        Run fn(sf); if the session expired anyway (401), refresh once and retry.
+        """
+        sf = self.connection()
+        try:
+            return fn(sf)
+        except SalesforceExpiredSession:
+            return fn(self.refresh(stale=sf))
@@ -0,0 +1,142 @@
+import threading  # Breaker state shared by request threads and the monitor
+import time  # Open/half-open timers
+
+# ======================================
+# 🔹 Salesforce Health Settings
+# ======================================
+BREAKER_FAILURE_THRESHOLD = 3   # Consecutive failures before the circuit opens
+BREAKER_OPEN_SECONDS = 30       # How long calls are skipped before a half-open trial
+HEALTH_CHECK_SECONDS = 30       # Monitor probe interval while healthy (skipped if real traffic just succeeded)
+
+CLOSED = "closed"        # Salesforce healthy: calls go through
+OPEN = "open"            # Salesforce down: calls are skipped, work stays queued locally
+HALF_OPEN = "half_open"  # One trial call decides whether to close again
+
+
+class CircuitOpen(Exception):
+    """
+    Raised instead of calling Salesforce while the circuit is open.
+    """
+
+
+class CircuitBreaker:
+    """
+    Online/offline state for Salesforce that request handlers read without any
+    network I/O. Repeated failures open the circuit; after BREAKER_OPEN_SECONDS
+    a single trial call (from a request or from the monitor) is let through and
+    closes it again on success.
+    """
+
+    def __init__(self, failure_threshold=BREAKER_FAILURE_THRESHOLD, open_seconds=BREAKER_OPEN_SECONDS, on_recover=None):
+        self.failure_threshold = failure_threshold
+        self.on_recover = on_recover  # Called (outside the lock) when the circuit closes again
+        self.open_seconds = open_seconds
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trial_started = 0.0
+        self.last_success = 0.0
+        self.last_error = None
+        self.skipped = 0
+        self._lock = threading.Lock()
+
+    def allow_request(self):
+        """
+        Whether a Salesforce call should be attempted now. In half-open state only
+        one caller gets True (the trial) until it reports back.
+        """
+        if self.state == CLOSED:
+            return True
+        now = time.monotonic()
+        with self._lock:
+            if self.state == OPEN and now - self.opened_at >= self.open_seconds:
+                self.state = HALF_OPEN
+                self.trial_started = now
+                return True
+            if self.state == HALF_OPEN and now - self.trial_started >= self.open_seconds:
+                self.trial_started = now  # The previous trial never reported back
+                return True
+            if self.state == CLOSED:
+                return True
+            self.skipped += 1
+            return False
+
+    def call(self, fn, is_outage):
+        """
+        fn() behind the breaker, for callers that must not wait on a dead
+        Salesforce: raises CircuitOpen without any I/O while the circuit is open,
+        and reports the outcome (is_outage(error) decides which errors count).
+        """
+        if not self.allow_request():
+            raise CircuitOpen("Salesforce is offline")
+        try:
+            result = fn()
+        except Exception as e:
+            if is_outage(e):
+                self.record_failure(e)
+            else:
+                self.record_success()  # Salesforce answered; the request itself was refused
+            raise
+        self.record_success()
+        return result
+
+    def record_success(self):
+        with self._lock:
+            recovered = self.state != CLOSED
+            if recovered:
+                print("✅ Salesforce reachable again: circuit closed.")
+            self.state = CLOSED
+            self.failures = 0
+            self.last_success = time.monotonic()
+        if recovered and self.on_recover:
+            self.on_recover()
+
+    def record_failure(self, error=None):
+        with self._lock:
+            self.failures += 1
+            self.last_error = str(error) if error else None
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    print(f"⚠️ Salesforce unreachable ({self.failures} failures): circuit open.")
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+
+    @property
+    def online(self):
+        return self.state == CLOSED
+
+    def stats(self):
+        with self._lock:
+            return {
+                "state": self.state,
+                "consecutive_failures": self.failures,
+                "skipped_calls": self.skipped,
+                "last_error": self.last_error,
+                "seconds_since_success": round(time.monotonic() - self.last_success, 1) if self.last_success else None,
+            }
+
+
+def run_health_monitor(breaker, probe, interval=HEALTH_CHECK_SECONDS):
+    """
+    Background loop: probe() -> bool checks Salesforce itself (not just the
+    network). While closed it only probes when no real call succeeded recently;
+    while open it runs the half-open trial as soon as the breaker allows one,
+    so recovery is noticed even with no kiosk traffic.
+    """
+    while True:
+        now = time.monotonic()
+        if breaker.state == CLOSED:
+            due = now - breaker.last_success >= interval
+        else:
+            due = breaker.state == OPEN and now - breaker.opened_at >= breaker.open_seconds
+        if due and breaker.allow_request():
+            try:
+                ok = probe()
+                error = None
+            except Exception as e:
+                ok, error = False, e
+            if ok:
+                breaker.record_success()
+            else:
+                breaker.record_failure(error)
+        time.sleep(interval if breaker.state == CLOSED else 1)
@@ -0,0 +1,155 @@
+import datetime
+import re
+
+# ======================================
+# 🔹 Bulk Reconciliation Settings
+# ======================================
+SOQL_OWNER_CHUNK = 100    # OwnerIds per SOQL IN (...) query (keeps the query well under the length limit)
+COMPOSITE_BATCH = 200     # Records per composite/sobjects call (Salesforce maximum)
+SF_OBJECT = "Daily_Report__c"
+REPORT_FIELDS = ["Check_In__c", "Break_In__c", "Break_Out__c", "Check_Out__c"]
+LOG_FIELDS = {"Check_In__c": "check_in", "Break_In__c": "break_in", "Break_Out__c": "break_out", "Check_Out__c": "check_out"}
+OWNER_ID_RE = re.compile(r"[a-zA-Z0-9]{15}(?:[a-zA-Z0-9]{3})?")
+DATE_RE = re.compile(r"\d{4}-\d{2}-\d{2}")
+
+
+class InvalidSyncRecord(ValueError):
+    """
+    A log that can never be synced as stored (no usable OwnerId or date).
+    """
+
+
+def invalid_log_reason(log):
+    """
+    Why a log cannot go into a SOQL filter or a composite record, or None if it can.
+    Checked before any call so one bad log cannot break the query for its whole chunk.
+    """
+    owner_id = log.get("OwnerId")
+    if not isinstance(owner_id, str) or not OWNER_ID_RE.fullmatch(owner_id):
+        return f"Invalid OwnerId {owner_id!r}"
+    if not isinstance(log.get("date"), str) or not DATE_RE.fullmatch(log["date"]):
+        return f"Invalid date {log.get('date')!r}"
+    return None
+
+
+def report_key(owner_id, date_str):
+    """
+    15-character OwnerIds are the case-sensitive prefix of the 18-character form Salesforce returns.
+    """
+    return (str(owner_id)[:15], str(date_str))
+
+
+def chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def report_diff(log, record, fmt):
+    """
+    What Salesforce is missing for one day log: ("create", fields),
+    ("update", fields), or (None, {}) when the report is already complete.
+    Only fields set locally and empty in Salesforce are written, and
+    Check_Out__c is nudged past Check_In__c to satisfy the org's validation rule.
+    """
+    if record is None:
+        new_rec = {"OwnerId": log["OwnerId"], "Date__c": log["date"]}
+        for sf_field, log_field in LOG_FIELDS.items():
+            if log.get(log_field):
+                new_rec[sf_field] = fmt(log[log_field])
+        return "create", new_rec
+
+    update_data = {}
+    for sf_field in ["Check_In__c", "Break_In__c", "Break_Out__c"]:
+        log_field = LOG_FIELDS[sf_field]
+        if log.get(log_field) and not record.get(sf_field):
+            update_data[sf_field] = fmt(log[log_field])
+
+    if log.get("check_out") and not record.get("Check_Out__c"):
+        out_str = fmt(log["check_out"])
+        current_in = update_data.get("Check_In__c") or record.get("Check_In__c")
+        # FORCE VALIDATION: Ensure string Out > In
+        if current_in and out_str <= current_in:
+            out_str = fmt(log["check_out"] + datetime.timedelta(minutes=2))
+        update_data["Check_Out__c"] = out_str
+
+    if not update_data:
+        return None, {}
+    return "update", {"Id": record["Id"], **update_data}
+
+
+def fetch_reports(sf_call, logs):
+    """
+    Existing Daily_Report__c rows for the logs, keyed by report_key: one SOQL
+    query per chunk of OwnerIds, bounded by the chunk's date range.
+    """
+    by_owner = {}
+    for log in logs:
+        by_owner.setdefault(str(log["OwnerId"]), []).append(log["date"])
+
+    reports = {}
+    owners = sorted(by_owner)
+    for owner_chunk in chunks(owners, SOQL_OWNER_CHUNK):
+        dates = [d for owner in owner_chunk for d in by_owner[owner]]
+        ids = ", ".join(f"'{owner}'" for owner in owner_chunk)
+        query = (f"SELECT Id, OwnerId, Date__c, {', '.join(REPORT_FIELDS)} FROM {SF_OBJECT} "
+                 f"WHERE OwnerId IN ({ids}) AND Date__c >= {min(dates)} AND Date__c <= {max(dates)}")
+        for record in sf_call(lambda sf: sf.query_all(query))["records"]:
+            reports[report_key(record["OwnerId"], record["Date__c"])] = record
+    return reports
+
+
+def composite_write(sf_call, method, records):
+    """
+    Create (POST) or update (PATCH) records through composite/sobjects with
+    allOrNone false. Returns one (success, error message) per record, in order.
+    """
+    outcomes = []
+    for batch in chunks(records, COMPOSITE_BATCH):
+        body = {
+            "allOrNone": False,
+            "records": [{"attributes": {"type": SF_OBJECT}, **record} for record in batch]
+        }
+        # A failed call (network, auth, limits) raises: nothing is recorded and the next
+        # pass re-queries Salesforce, so records created by earlier batches are not duplicated
+        results = sf_call(lambda sf: sf.restful("composite/sobjects", method=method, json=body))
+        for result in results:
+            errors = result.get("errors") or []
+            outcomes.append((bool(result.get("success")), "; ".join(err.get("message", "") for err in errors) or None))
+    return outcomes
+
+
+def reconcile_logs(sf_call, logs, fmt):
+    """
+    Bring Salesforce up to date with the given day logs in bulk.
+    Returns [(log, success, error)] for every log, including logs that needed
+    no write (reported as successful). Logs failing invalid_log_reason are not
+    sent at all; their error is an InvalidSyncRecord.
+    """
+    outcomes, valid = [], []
+    for log in logs:
+        reason = invalid_log_reason(log)
+        if reason:
+            outcomes.append((log, False, InvalidSyncRecord(reason)))
+        else:
+            valid.append(log)
+    if not valid:
+        return outcomes
+    logs = valid
+
+    reports = fetch_reports(sf_call, logs)
+
+    creates, updates = [], []
+    for log in logs:
+        op, fields = report_diff(log, reports.get(report_key(log["OwnerId"], log["date"])), fmt)
+        if op == "create":
+            creates.append((log, fields))
+        elif op == "update":
+            updates.append((log, fields))
+        else:
+            outcomes.append((log, True, None))
+
+    for method, pending in (("POST", creates), ("PATCH", updates)):
+        if pending:
+            results = composite_write(sf_call, method, [fields for _, fields in pending])
+            outcomes.extend((log, ok, error) for (log, _), (ok, error) in zip(pending, results))
+    return outcomes
@@ -0,0 +1,323 @@
+import datetime
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+from urllib.parse import parse_qs, urlparse
+
+import requests
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from simple_salesforce import Salesforce
+from simple_salesforce.exceptions import SalesforceExpiredSession
+
+from sf_client import SalesforceClient, is_availability_error
+from sf_reconcile import COMPOSITE_BATCH, SOQL_OWNER_CHUNK, InvalidSyncRecord, reconcile_logs
+
+# ======================================
+# 🔹 Bulk Reconciliation vs a Local Mock Salesforce
+# ======================================
+# Usage: python -m unittest test_sf_reconcile   (from backend/)
+#
+# A small HTTP server speaks the REST endpoints the reconciler uses (query
+# and composite/sobjects) over an in-memory Daily_Report__c table, plus the
+# JWT token endpoint for SalesforceClient, and a real simple_salesforce
+# client talks to it.
+
+SOQL_RE = re.compile(r"OwnerId IN \((?P<ids>[^)]*)\) AND Date__c >= (?P<start>\S+) AND Date__c <= (?P<end>\S+)")
+REJECTED_OWNER = "005REJECT000001"  # Composite writes for this owner fail validation
+
+
+class MockSalesforce:
+    def __init__(self):
+        self.records = {}  # Id -> record
+        self.calls = []    # (method, endpoint)
+        self.fail_next = 0  # Answer that many requests with fail_status
+        self.fail_status = 500
+        self.instance_url = None  # Set by serve()
+        self.token_requests = 0
+        self.token_delay = 0.0  # Seconds the token endpoint takes to answer
+        self.query_delay = 0.0  # Seconds a query takes to answer
+        self.authorizations = []  # Authorization header of every REST call
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    def new_id(self):
+        self._next_id += 1
+        return f"a01{self._next_id:015d}"
+
+    def handle(self, method, path, query, body, authorization=None):
+        if path == "/services/oauth2/token":
+            time.sleep(self.token_delay)
+            with self._lock:
+                self.token_requests += 1
+                return 200, {"access_token": f"token-{self.token_requests}", "instance_url": self.instance_url}
+        if path.endswith("/query/"):
+            time.sleep(self.query_delay)
+        with self._lock:
+            self.authorizations.append(authorization)
+            endpoint = "query" if path.endswith("/query/") else path.rsplit("/services/data/", 1)[-1].split("/", 1)[-1]
+            self.calls.append((method, endpoint))
+            if self.fail_next:
+                self.fail_next -= 1
+                code = "INVALID_SESSION_ID" if self.fail_status == 401 else "FAILED"
+                return self.fail_status, [{"errorCode": code, "message": f"Mock {self.fail_status}"}]
+            if endpoint == "query":
+                return 200, self.query(query["q"][0])
+            if endpoint == "composite/sobjects":
+                return 200, [self.write(method, record) for record in body["records"]]
+            return 404, [{"errorCode": "NOT_FOUND", "message": path}]
+
+    def query(self, soql):
+        match = SOQL_RE.search(soql)
+        owners = {owner.strip().strip("'") for owner in match.group("ids").split(",")}
+        rows = [dict(r, OwnerId=r["OwnerId"] + "AAA") for r in self.records.values()  # 18-character OwnerIds
+                if r["OwnerId"] in owners and match.group("start") <= r["Date__c"] <= match.group("end")]
+        return {"totalSize": len(rows), "done": True, "records": rows}
+
+    def write(self, method, record):
+        record = {k: v for k, v in record.items() if k != "attributes"}
+        if method == "POST":
+            if record.get("OwnerId") == REJECTED_OWNER:
+                return {"success": False, "errors": [{"message": "Owner is inactive"}]}
+            record["Id"] = self.new_id()
+            self.records[record["Id"]] = record
+        else:
+            self.records[record["Id"]].update(record)
+        return {"id": record["Id"], "success": True, "errors": []}
+
+
+def serve(mock):
+    class Handler(BaseHTTPRequestHandler):
+        def _respond(self):
+            url = urlparse(self.path)
+            length = int(self.headers.get("Content-Length") or 0)
+            raw = self.rfile.read(length) if length else b""
+            if not raw:
+                body = None
+            elif "json" in (self.headers.get("Content-Type") or ""):
+                body = json.loads(raw)
+            else:
+                body = parse_qs(raw.decode("utf-8"))  # The form-encoded token request
+            status, payload = mock.handle(self.command, url.path, parse_qs(url.query), body,
+                                          self.headers.get("Authorization"))
+            data = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        do_GET = do_POST = do_PATCH = _respond
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    mock.instance_url = f"http://127.0.0.1:{server.server_port}"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def http_salesforce(**kwargs):
+    sf = Salesforce(**kwargs)
+    sf.base_url = sf.base_url.replace("https://", "http://")  # simple_salesforce always builds https URLs
+    return sf
+
+
+def fmt(ts):
+    return ts.strftime("%H:%M:%S.000Z")
+
+
+def log_for(owner, date_str, hour_in=8, hour_out=None):
+    log = {"OwnerId": owner, "date": date_str, "employee_name": owner,
+           "check_in": datetime.datetime(2025, 1, 1, hour_in, 0)}
+    if hour_out is not None:
+        log["check_out"] = datetime.datetime(2025, 1, 1, hour_out, 0)
+    return log
+
+
+class ReconcileAgainstMockSalesforceTest(unittest.TestCase):
+    def setUp(self):
+        self.mock = MockSalesforce()
+        self.server = serve(self.mock)
+        sf = http_salesforce(instance_url=self.mock.instance_url, session_id="test-session")
+        self.sf_call = lambda fn: fn(sf)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_backlog_is_written_in_chunks(self):
+        owners = [f"005OWNER{i:07d}" for i in range(SOQL_OWNER_CHUNK + 30)]
+        logs = [log_for(owner, "2025-01-02") for owner in owners] + [log_for(owners[0], "2025-01-03", 8, 17)]
+
+        outcomes = reconcile_logs(self.sf_call, logs, fmt)
+
+        self.assertTrue(all(ok for _, ok, _ in outcomes))
+        self.assertEqual(len(self.mock.records), len(logs))
+        queries = [c for c in self.mock.calls if c[1] == "query"]
+        posts = [c for c in self.mock.calls if c == ("POST", "composite/sobjects")]
+        self.assertEqual(len(queries), 2)  # One SOQL query per SOQL_OWNER_CHUNK owners
+        self.assertEqual(len(posts), -(-len(logs) // COMPOSITE_BATCH))
+        self.assertNotIn(("PATCH", "composite/sobjects"), self.mock.calls)
+
+    def test_only_missing_fields_are_patched(self):
+        self.mock.records["a01X"] = {"Id": "a01X", "OwnerId": "005OWNER0000001", "Date__c": "2025-01-02",
+                                     "Check_In__c": "08:00:00.000Z", "Check_Out__c": None}
+        log = log_for("005OWNER0000001", "2025-01-02", 9, 8)  # Local check-out before Salesforce's check-in
+
+        [(_, ok, error)] = reconcile_logs(self.sf_call, [log], fmt)
+
+        self.assertTrue(ok, error)
+        record = self.mock.records["a01X"]
+        self.assertEqual(record["Check_In__c"], "08:00:00.000Z")  # Existing value kept
+        self.assertEqual(record["Check_Out__c"], "08:02:00.000Z")  # Nudged past Check_In__c
+        self.assertIn(("PATCH", "composite/sobjects"), self.mock.calls)
+
+    def test_complete_record_needs_no_write(self):
+        self.mock.records["a01Y"] = {"Id": "a01Y", "OwnerId": "005OWNER0000002", "Date__c": "2025-01-02",
+                                     "Check_In__c": "08:00:00.000Z"}
+
+        [(_, ok, _)] = reconcile_logs(self.sf_call, [log_for("005OWNER0000002", "2025-01-02")], fmt)
+
+        self.assertTrue(ok)
+        self.assertEqual([c[1] for c in self.mock.calls], ["query"])
+
+    def test_record_errors_do_not_fail_the_batch(self):
+        logs = [log_for("005OWNER0000003", "2025-01-02"), log_for(REJECTED_OWNER, "2025-01-02")]
+
+        outcomes = {log["OwnerId"]: (ok, error) for log, ok, error in reconcile_logs(self.sf_call, logs, fmt)}
+
+        self.assertEqual(outcomes["005OWNER0000003"], (True, None))
+        self.assertEqual(outcomes[REJECTED_OWNER], (False, "Owner is inactive"))
+
+    def test_failed_call_raises(self):
+        self.mock.fail_next = 1
+        with self.assertRaises(Exception) as raised:
+            reconcile_logs(self.sf_call, [log_for("005OWNER0000004", "2025-01-02")], fmt)
+        self.assertEqual(self.mock.records, {})
+        self.assertTrue(is_availability_error(raised.exception))  # 5xx: Salesforce is down, trip the breaker
+
+    def test_refused_call_is_not_an_availability_error(self):
+        self.mock.fail_next, self.mock.fail_status = 1, 400
+        with self.assertRaises(Exception) as raised:
+            reconcile_logs(self.sf_call, [log_for("005OWNER0000005", "2025-01-02")], fmt)
+        self.assertFalse(is_availability_error(raised.exception))  # Record-level: backoff, not the breaker
+
+    def test_invalid_logs_are_not_sent(self):
+        good = log_for("005OWNER0000006", "2025-01-02")
+        missing = {"date": "2025-01-02", "check_in": good["check_in"]}
+        bad = [dict(good, OwnerId=None), dict(good, OwnerId="005' OR Id != '"), dict(good, date=None), missing]
+
+        outcomes = reconcile_logs(self.sf_call, [good] + bad, fmt)
+
+        self.assertEqual(outcomes[0][0], bad[0])
+        for _, ok, error in outcomes[:len(bad)]:
+            self.assertFalse(ok)
+            self.assertIsInstance(error, InvalidSyncRecord)
+        self.assertEqual(outcomes[-1], (good, True, None))
+        self.assertEqual(len(self.mock.records), 1)
+
+
+class SalesforceClientAgainstMockSalesforceTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        with tempfile.NamedTemporaryFile("wb", suffix=".key", delete=False) as f:
+            f.write(key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                                      serialization.NoEncryption()))
+        cls.key_file = f.name
+
+    @classmethod
+    def tearDownClass(cls):
+        os.unlink(cls.key_file)
+
+    def setUp(self):
+        self.mock = MockSalesforce()
+        self.server = serve(self.mock)
+        patcher = mock.patch("sf_client.Salesforce", http_salesforce)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def client(self, **kwargs):
+        return SalesforceClient("client-id", "user@example.com", self.mock.instance_url, self.key_file, **kwargs)
+
+    def query(self, sf):
+        return sf.query("SELECT Id FROM Daily_Report__c WHERE OwnerId IN ('005OWNER0000001') "
+                        "AND Date__c >= 2025-01-01 AND Date__c <= 2025-01-31")
+
+    def test_concurrent_callers_share_one_refresh(self):
+        client = self.client()
+        self.mock.token_delay = 0.2  # Every caller arrives while the first refresh is in flight
+        start = threading.Barrier(8)
+        connections = []
+
+        def connect():
+            start.wait()
+            connections.append(client.connection())
+
+        threads = [threading.Thread(target=connect) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(self.mock.token_requests, 1)
+        self.assertEqual(client.refreshes, 1)
+        self.assertEqual(len({id(sf) for sf in connections}), 1)
+
+    def test_token_is_refreshed_near_expiry(self):
+        client = self.client(session_seconds=100)
+        first = client.connection()
+
+        client._issued_at -= 85  # 85% of the session used: still fresh
+        self.assertIs(client.connection(), first)
+        self.assertEqual(self.mock.token_requests, 1)
+
+        client._issued_at -= 6  # Past 90%: refreshed before Salesforce expires it
+        second = client.connection()
+        self.assertIsNot(second, first)
+        self.assertEqual(self.mock.token_requests, 2)
+        client.call(self.query)
+        self.assertEqual(self.mock.authorizations[-1], "Bearer token-2")
+
+    def test_expired_session_is_retried_once(self):
+        client = self.client()
+        client.call(self.query)
+        self.mock.fail_next, self.mock.fail_status = 1, 401
+
+        result = client.call(self.query)
+
+        self.assertEqual(result["totalSize"], 0)
+        self.assertEqual(self.mock.token_requests, 2)
+        self.assertEqual(self.mock.authorizations, ["Bearer token-1", "Bearer token-1", "Bearer token-2"])
+
+        self.mock.fail_next = 2  # Still refused after the refresh: no second retry
+        with self.assertRaises(SalesforceExpiredSession):
+            client.call(self.query)
+        self.assertEqual(self.mock.token_requests, 3)
+
+    def test_rest_calls_time_out(self):
+        client = self.client(timeout=0.5)
+        self.mock.query_delay = 2
+
+        started = time.monotonic()
+        with self.assertRaises(requests.exceptions.Timeout) as raised:
+            client.call(self.query)
+
+        self.assertLess(time.monotonic() - started, 1.5)
+        self.assertTrue(is_availability_error(raised.exception))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,164 @@
+import itertools  # Track ids
+import threading  # Per-camera locks
+import time  # Idle eviction
+
+# ======================================
+# 🔹 Tracker Settings
+# ======================================
+TRACK_MIN_IOU = 0.3            # Box overlap needed to say "same face as last frame"
+TRACK_MAX_MISSES = 5           # Frames a track survives without a detection
+REVERIFY_CONFIDENT_FRAMES = 30 # Re-encode a confidently identified track every N frames (guards against ID swaps)
+REVERIFY_UNCERTAIN_FRAMES = 5  # ...or every N frames if the match was close to the threshold / unknown
+UNCERTAIN_MARGIN = 0.05        # A match within this distance of the threshold counts as uncertain
+CAMERA_IDLE_SECONDS = 60       # Drop a camera's tracker after this long without frames
+
+_track_ids = itertools.count(1)
+
+
+# ======================================
+# 🔹 Box Association
+# ======================================
+def iou(a, b):
+    """
+    Intersection over union of two (top, right, bottom, left) boxes.
+    """
+    top, right = max(a[0], b[0]), min(a[1], b[1])
+    bottom, left = min(a[2], b[2]), max(a[3], b[3])
+    inter = max(0, right - left) * max(0, bottom - top)
+    if inter == 0:
+        return 0.0
+    area_a = (a[1] - a[3]) * (a[2] - a[0])
+    area_b = (b[1] - b[3]) * (b[2] - b[0])
+    return inter / float(area_a + area_b - inter)
+
+
+def associate(prev_boxes, boxes, min_iou=TRACK_MIN_IOU):
+    """
+    Greedy IoU matching. For each new box, the index of the previous box it
+    continues, or -1 for a new face.
+    """
+    pairs = sorted(
+        ((iou(p, b), pi, bi) for pi, p in enumerate(prev_boxes) for bi, b in enumerate(boxes)),
+        reverse=True
+    )
+    assignment = [-1] * len(boxes)
+    used = set()
+    for score, pi, bi in pairs:
+        if score < min_iou:
+            break
+        if pi in used or assignment[bi] != -1:
+            continue
+        assignment[bi] = pi
+        used.add(pi)
+    return assignment
+
+
+# ======================================
+# 🔹 Per-Camera Tracker
+# ======================================
+class Track:
+    def __init__(self, box):
+        self.id = next(_track_ids)
+        self.box = box
+        self.name = None          # None = not (yet) recognized
+        self.owner_id = None
+        self.distance = None
+        self.frames_since_encode = 0
+        self.misses = 0
+        self.recorded = False     # Attendance already recorded for this track's identity
+
+    def due_for_encoding(self, threshold):
+        """
+        Whether the next sighting of this track should pay for face_encodings + matching.
+        """
+        if self.name is None or self.distance is None or self.distance > threshold - UNCERTAIN_MARGIN:
+            return self.frames_since_encode >= REVERIFY_UNCERTAIN_FRAMES
+        return self.frames_since_encode >= REVERIFY_CONFIDENT_FRAMES
+
+
+class CameraTracker:
+    """
+    Follows face boxes across one camera's frames so the encoder and gallery
+    match only run when a new face appears or an identity needs re-checking.
+    """
+
+    def __init__(self):
+        self.tracks = []
+        self.frame_count = 0
+        self.last_seen = time.time()
+        self.lock = threading.Lock()  # Frames of one camera are processed in order
+
+    def plan(self, threshold):
+        """
+        (previous boxes, due flags) handed to the frame analysis step so it only
+        encodes new or due faces.
+        """
+        return [t.box for t in self.tracks], [t.due_for_encoding(threshold) for t in self.tracks]
+
+    def update(self, boxes, assignment, encoded):
+        """
+        Advance the tracker with this frame's boxes. encoded maps box index -> Match
+        (or None if the face was encoded but not recognized).
+        Returns the live tracks as (track, was_encoded, is_new).
+        """
+        self.frame_count += 1
+        self.last_seen = time.time()
+
+        results = []
+        seen = set()
+        for bi, box in enumerate(boxes):
+            pi = assignment[bi]
+            is_new = pi < 0
+            track = Track(box) if is_new else self.tracks[pi]
+            if not is_new:
+                seen.add(pi)
+                track.box = box
+                track.misses = 0
+
+            if bi in encoded:
+                match = encoded[bi]
+                new_name = match.name if match else None
+                if new_name != track.name:
+                    track.recorded = False  # Identity changed (or first identified): attendance is due again
+                track.name = new_name
+                track.owner_id = match.owner_id if match else None
+                track.distance = match.distance if match else None
+                track.frames_since_encode = 0
+            else:
+                track.frames_since_encode += 1
+            results.append((track, bi in encoded, is_new))
+
+        # Keep unmatched old tracks alive for a few frames (brief occlusion / missed detection)
+        survivors = [t for t, _, _ in results]
+        for pi, track in enumerate(self.tracks):
+            if pi not in seen:
+                track.misses += 1
+                track.frames_since_encode += 1
+                if track.misses <= TRACK_MAX_MISSES:
+                    survivors.append(track)
+        self.tracks = survivors
+        return results
+
+
+class TrackerRegistry:
+    """
+    One CameraTracker per camera id, evicted after CAMERA_IDLE_SECONDS of silence.
+    """
+
+    def __init__(self):
+        self._trackers = {}
+        self._lock = threading.Lock()
+
+    def get(self, camera_id):
+        now = time.time()
+        with self._lock:
+            for cid in [c for c, t in self._trackers.items() if now - t.last_seen > CAMERA_IDLE_SECONDS]:
+                del self._trackers[cid]
+            tracker = self._trackers.get(camera_id)
+            if tracker is None:
+                tracker = self._trackers[camera_id] = CameraTracker()
+            tracker.last_seen = now
+            return tracker
+
+    def __len__(self):
+        return len(self._trackers)
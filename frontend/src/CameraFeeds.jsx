@@ -183,13 +183,14 @@ const CameraFeed = () => {
     return () => cancelAnimationFrame(id);
   }, [cameraOn]);
 
-  const captureImage = () => {
+  // Resolves to a JPEG Blob, uploaded as a raw binary body (no base64 / JSON wrapping)
+  const captureImage = () => new Promise((resolve) => {
     const v = videoRef.current;
     const c = document.createElement("canvas");
     c.width = v.videoWidth; c.height = v.videoHeight;
     c.getContext("2d").drawImage(v, 0, 0);
-    return c.toDataURL("image/jpeg", 0.9);
-  };
+    c.toBlob(resolve, "image/jpeg", 0.9);
+  });
 
   const drawHUD = (ctx, t) => {
     const { x, y, w, h, dominantEmotion, currentQuote, smileScore, alpha, isRecognizing, label } = t;
@@ -237,7 +238,7 @@ const CameraFeed = () => {
     const trk = trackingData.current;
     trk.isRecognizing = false;
     
-    if (data.status === "synced" || data.status === "offline") {
+    if (data.status === "queued" || data.status === "synced" || data.status === "offline") {
       const actionTxt = data.action === "checkin" ? "CHECKED IN" : "CHECKED OUT";
       trk.label = `${data.name} • ${actionTxt}`;
       setStatus({ text: `${data.message} (${data.name})`, severity: "success", icon: <CheckCircle /> });
@@ -252,7 +253,8 @@ const CameraFeed = () => {
     if (!videoRef.current) return;
     if (!isAuto) setProcessing(true);
     try {
-      const res = await axios.post(`http://localhost:5000/${action}`, { image: img || captureImage() });
+      const frame = await (img || captureImage());
+      const res = await axios.post(`http://localhost:5000/${action}`, frame, { headers: { "Content-Type": "image/jpeg" } });
       handleResponse(res.data);
     } catch { setStatus({ text: "Connection Failed", severity: "error" }); setOpenSnackbar(true); }
     finally {
@@ -8,9 +8,13 @@ import {
 import { TableView, FilterAlt, Download, HomeWork, EventBusy } from "@mui/icons-material";
 import * as XLSX from "xlsx";
 
+const API_URL = "http://localhost:5000";
+const PAGE_SIZE = 200; // Rows per /attendance/filter page; the download streams the full range
+
 const ExportPanel = () => {
   const [employees, setEmployees] = useState([]);
   const [logs, setLogs] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
   const [loading, setLoading] = useState(false);
 
   const [filters, setFilters] = useState({
@@ -25,22 +29,28 @@ const ExportPanel = () => {
 
   const fetchEmployees = async () => {
     try {
-      const res = await axios.get("http://localhost:5000/employees");
+      const res = await axios.get(`${API_URL}/employees`);
       if (res.data.status === "success") setEmployees(res.data.employees);
     } catch (err) { console.error("Load failed", err); }
   };
 
-  const handleFilter = async () => {
+  const filterParams = () => ({
+    employee_name: filters.employee,
+    start_date: filters.startDate,
+    end_date: filters.endDate
+  });
+
+  // First page on "Run Filter"; "Load More" passes the cursor to append the next page
+  const handleFilter = async (cursor = null) => {
     setLoading(true);
     try {
-      const res = await axios.get("http://localhost:5000/attendance/filter", {
-        params: {
-          employee_name: filters.employee,
-          start_date: filters.startDate,
-          end_date: filters.endDate
-        }
-      });
-      if (res.data.status === "success") setLogs(res.data.logs);
+      const params = { ...filterParams(), limit: PAGE_SIZE };
+      if (cursor) params.cursor = cursor;
+      const res = await axios.get(`${API_URL}/attendance/filter`, { params });
+      if (res.data.status === "success") {
+        setLogs((prev) => (cursor ? [...prev, ...res.data.logs] : res.data.logs));
+        setNextCursor(res.data.next_cursor);
+      }
     } catch (err) { console.error("Filter failed", err); }
     setLoading(false);
   };
@@ -54,37 +64,38 @@ const ExportPanel = () => {
     });
   };
 
-  const exportToExcel = () => {
-    if (logs.length === 0) return;
-
-    const exportData = logs.map((log) => ({
-      "Staff Member": log.employee_name,
-      "Date": log.date,
-      "Clock In": log.check_in ? formatTime(log.check_in) : "—",
-      "Clock Out": log.check_out ? formatTime(log.check_out) : "—",
-      "Break Start": log.break_in ? formatTime(log.break_in) : "—",
-      "Break End": log.break_out ? formatTime(log.break_out) : "—",
-      "Worked Method": log.worked_method, 
-      "Remote Status": log.is_remote_today ? "Yes" : "No",
-      "Holiday/Off": log.is_off_today ? "Yes" : "No"
-    }));
-
-    const ws = XLSX.utils.json_to_sheet(exportData);
-    ws['!cols'] = [
-        { wch: 20 }, { wch: 12 }, { wch: 12 }, { wch: 12 }, 
-        { wch: 12 }, { wch: 12 }, { wch: 25 }, { wch: 15 }, { wch: 15 }
-    ];
-
-    const wb = XLSX.utils.book_new();
-    XLSX.utils.book_append_sheet(wb, ws, "Attendance Data");
-    XLSX.writeFile(wb, `Attendance_Summary_${filters.startDate}_to_${filters.endDate}.xlsx`);
+  // Streamed by the server as the rows are built, so large ranges download without loading them here
+  const exportToCsv = () => {
+    const query = new URLSearchParams({ ...filterParams(), format: "csv" });
+    window.location.href = `${API_URL}/attendance/export?${query}`;
+  };
+
+  // Same streamed CSV (every page, same columns), converted to a workbook in the browser
+  const exportToExcel = async () => {
+    setLoading(true);
+    try {
+      const res = await axios.get(`${API_URL}/attendance/export`, {
+        params: { ...filterParams(), format: "csv" }, responseType: "text"
+      });
+      const csvBook = XLSX.read(res.data, { type: "string", raw: true });
+      const ws = csvBook.Sheets[csvBook.SheetNames[0]];
+      ws['!cols'] = [
+          { wch: 20 }, { wch: 12 }, { wch: 12 }, { wch: 12 }, 
+          { wch: 12 }, { wch: 12 }, { wch: 25 }, { wch: 15 }, { wch: 15 }
+      ];
+
+      const wb = XLSX.utils.book_new();
+      XLSX.utils.book_append_sheet(wb, ws, "Attendance Data");
+      XLSX.writeFile(wb, `Attendance_Summary_${filters.startDate}_to_${filters.endDate}.xlsx`);
+    } catch (err) { console.error("Excel export failed", err); }
+    setLoading(false);
   };
 
   return (
     <Card elevation={0} sx={{ borderRadius: 4, border: "1px solid #E2E8F0" }}>
       <CardHeader
         title={<Typography variant="h6" fontWeight={800}>Data Export Center</Typography>}
-        subheader="Generate comprehensive Excel reports for payroll and monitoring."
+        subheader="Generate comprehensive Excel or CSV reports for payroll and monitoring."
         sx={{ borderBottom: '1px solid #F1F5F9', p: 3 }}
       />
       <Box sx={{ p: 3, bgcolor: "#F8FAFC" }}>
@@ -113,17 +124,25 @@ const ExportPanel = () => {
             onChange={(e) => setFilters({ ...filters, endDate: e.target.value })}
           />
 
-          <Button variant="contained" startIcon={<FilterAlt />} onClick={handleFilter} disabled={loading}>
+          <Button variant="contained" startIcon={<FilterAlt />} onClick={() => handleFilter()} disabled={loading}>
             Run Filter
           </Button>
           
           <Button 
             variant="outlined" color="success" startIcon={<Download />} 
-            onClick={exportToExcel} disabled={logs.length === 0}
+            onClick={exportToExcel} disabled={logs.length === 0 || loading}
             sx={{ ml: 'auto !important', fontWeight: 700 }}
           >
             Download Excel
           </Button>
+
+          <Button 
+            variant="outlined" color="success" startIcon={<Download />} 
+            onClick={exportToCsv} disabled={logs.length === 0}
+            sx={{ fontWeight: 700 }}
+          >
+            Download CSV
+          </Button>
         </Stack>
       </Box>
 
@@ -179,6 +198,14 @@ const ExportPanel = () => {
           </TableBody>
         </Table>
       </TableContainer>
+
+      {nextCursor && (
+        <Box sx={{ p: 2, textAlign: "center", borderTop: "1px solid #F1F5F9" }}>
+          <Button size="small" onClick={() => handleFilter(nextCursor)} disabled={loading}>
+            Load More
+          </Button>
+        </Box>
+      )}
     </Card>
   );
 };